@@ -0,0 +1,2 @@
+"""Benchmarks for fyda. Run ``python -m benchmark.run --help`` from the
+repository root."""
@@ -0,0 +1,237 @@
+"""Synthetic data roots for the benchmarks."""
+import gzip
+import json
+import os
+import pickle
+import random
+import zipfile
+
+import numpy as np
+import pandas as pd
+import yaml
+
+
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+# Extensions of the small files making up discovery roots
+ROOT_EXTENSIONS = ('.csv', '.json', '.txt')
+
+# Formats written for withdraw benchmarks, by the shortcut they get
+FORMATS = ('csv', 'csv_gz', 'csv_zip', 'json', 'jsonl', 'txt', 'yaml', 'npy',
+           'pickle', 'parquet', 'feather')
+
+# Formats needing pyarrow
+_ARROW_FORMATS = ('parquet', 'feather')
+
+
+# -----------------------------------------------------------------------------
+# Module-level library
+# -----------------------------------------------------------------------------
+def _directories(depth, fanout):
+    """Relative paths of a folder tree ``depth`` levels deep, with
+    ``fanout`` subfolders per folder, root included as ``''``."""
+
+    dirs = ['']
+    level = ['']
+
+    for d in range(depth):
+        level = [os.path.join(parent, 'd{}_{}'.format(d, i))
+                 for parent in level for i in range(fanout)]
+        dirs.extend(level)
+
+    return dirs
+
+
+def _frame(rows, seed):
+    """Mixed-type DataFrame of ``rows`` rows."""
+
+    rng = np.random.RandomState(seed)
+
+    return pd.DataFrame({
+        'id': np.arange(rows),
+        'value': rng.rand(rows),
+        'count': rng.randint(0, 1000, rows),
+        'label': rng.choice(['alpha', 'beta', 'gamma', 'delta'], rows),
+        'day': pd.date_range('2020-01-01', periods=rows, freq='min')
+        .strftime('%Y-%m-%d %H:%M:%S')})
+
+
+def _has_pyarrow():
+    """Whether Parquet and Feather files can be written."""
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+
+    return True
+
+
+def _write(path, frame, fmt):
+    """Write ``frame`` to ``path`` in the format ``fmt``."""
+
+    if fmt == 'csv':
+        frame.to_csv(path, index=False)
+    elif fmt == 'csv_gz':
+        with gzip.open(path, 'wb', compresslevel=6) as fileobj:
+            fileobj.write(frame.to_csv(index=False).encode('utf-8'))
+    elif fmt == 'csv_zip':
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('csv_zip.csv', frame.to_csv(index=False))
+    elif fmt == 'json':
+        with open(path, 'w') as fileobj:
+            json.dump(frame.to_dict('records'), fileobj)
+    elif fmt == 'jsonl':
+        frame.to_json(path, orient='records', lines=True)
+    elif fmt == 'txt':
+        with open(path, 'w') as fileobj:
+            fileobj.write(frame.to_csv(index=False, sep=' '))
+    elif fmt == 'yaml':
+        with open(path, 'w') as fileobj:
+            yaml.safe_dump(frame.to_dict('records'), fileobj)
+    elif fmt == 'npy':
+        np.save(path, frame[['id', 'value', 'count']].to_numpy())
+    elif fmt == 'pickle':
+        with open(path, 'wb') as fileobj:
+            pickle.dump(frame, fileobj, protocol=pickle.HIGHEST_PROTOCOL)
+    elif fmt == 'parquet':
+        frame.to_parquet(path, index=False)
+    elif fmt == 'feather':
+        frame.to_feather(path)
+    else:
+        raise ValueError('Format "{}" not understood.'.format(fmt))
+
+
+# -----------------------------------------------------------------------------
+# Public library
+# -----------------------------------------------------------------------------
+def available_formats(formats=None):
+    """Formats among ``formats`` (by default :data:`FORMATS`) whose writers
+    are installed."""
+
+    arrow = _has_pyarrow()
+
+    return [fmt for fmt in (FORMATS if formats is None else formats)
+            if arrow or fmt not in _ARROW_FORMATS]
+
+
+def file_name(fmt):
+    """Name of the file holding the format ``fmt``, whose shortcut is
+    ``fmt``."""
+
+    extension = {'csv_gz': '.csv.gz', 'csv_zip': '.zip', 'pickle': '.pkl'}
+
+    return fmt + extension.get(fmt, '.' + fmt)
+
+
+def make_formats(path, rows=10000, formats=None, seed=0):
+    """
+    Write the same table in several formats.
+
+    Parameters
+    ----------
+    path : str
+        Folder to write to, created if necessary.
+    rows : int, (optional)
+        Number of rows in the table.
+    formats : list, (optional)
+        Formats to write, out of :data:`FORMATS`. Defaults to all of those
+        that can be written.
+    seed : int, (optional)
+        Seed for the table's values.
+
+    Returns
+    -------
+    paths : dict
+        Paths of the files written, by format.
+    """
+
+    os.makedirs(path, exist_ok=True)
+    frame = _frame(rows, seed)
+    paths = {}
+
+    for fmt in available_formats(formats):
+        paths[fmt] = os.path.join(path, file_name(fmt))
+        _write(paths[fmt], frame, fmt)
+
+    return paths
+
+
+def make_root(path, files=1000, depth=3, fanout=4, collision_rate=0.1,
+              group_size=4, extensions=ROOT_EXTENSIONS, seed=0):
+    """
+    Create a folder tree of small files for discovery benchmarks.
+
+    Parameters
+    ----------
+    path : str
+        Folder to create the tree in, created if necessary.
+    files : int, (optional)
+        Number of files.
+    depth : int, (optional)
+        Number of folder levels below ``path``.
+    fanout : int, (optional)
+        Number of subfolders per folder.
+    collision_rate : float, (optional)
+        Fraction of files sharing their name, without extension, with other
+        files, so that their default shortcuts collide.
+    group_size : int, (optional)
+        Average number of files sharing each colliding name.
+    extensions : tuple, (optional)
+        Extensions to pick from for each file.
+    seed : int, (optional)
+        Seed for file names and placement.
+
+    Returns
+    -------
+    paths : list
+        Absolute paths of the files created.
+    """
+
+    rng = random.Random(seed)
+    dirs = _directories(depth, fanout)
+    shared = int(round(files * collision_rate))
+    groups = max(1, shared // max(1, group_size))
+
+    if shared and shared > len(dirs) * len(extensions) * groups:
+        raise ValueError('Not enough folders to hold {} colliding files.'
+                         .format(shared))
+
+    taken = set()
+    paths = []
+
+    for i in range(files):
+
+        name = 's{}'.format(i % groups) if i < shared else 'f{}'.format(i)
+        extension = rng.choice(extensions)
+        rel = os.path.join(rng.choice(dirs), name + extension)
+
+        while rel in taken:  # Only colliding names can land twice
+            extension = rng.choice(extensions)
+            rel = os.path.join(rng.choice(dirs), name + extension)
+
+        taken.add(rel)
+        paths.append(os.path.abspath(os.path.join(path, rel)))
+
+    for d in dirs:
+        os.makedirs(os.path.join(path, d), exist_ok=True)
+
+    for filepath in paths:
+        with open(filepath, 'w') as fileobj:
+            fileobj.write('a\n1\n')
+
+    return paths
+
+
+def write_fydarc(directory, root):
+    """Write a ``.fydarc`` in ``directory`` with ``root`` as its data root,
+    returning its path."""
+
+    path = os.path.join(directory, '.fydarc')
+
+    with open(path, 'w') as fileobj:
+        yaml.safe_dump({'directories': {'root': os.path.abspath(root)},
+                        'data': {}}, fileobj)
+
+    return path
@@ -0,0 +1,544 @@
+"""
+Benchmarks for DataBank discovery, shortcut resolution and loading.
+
+Results are written as JSON, one record per benchmark case with timing
+statistics in seconds and the peak memory traced by :mod:`tracemalloc`
+while running the case once more. Passing ``--compare`` with an earlier
+results file reports the cases that got slower or hungrier by more than
+``--tolerance`` and exits with status 1 if there are any.
+
+Usage::
+
+    python -m benchmark.run --output results.json
+    python -m benchmark.run --compare results.json --only construction
+"""
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import fyda
+from fyda import options
+from fyda.base import _default_shortcut
+from fyda.s3 import clear_clients
+
+from .generate import available_formats, file_name, make_formats, \
+    make_root, write_fydarc
+
+
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+BENCHMARKS = ('construction', 'rebase', 'determine_path', 'withdraw', 's3')
+
+# Shortcuts resolved per timing of _determine_path
+_LOOKUPS = 200
+
+# Bucket and region used with moto
+_BUCKET = 'fyda-benchmark'
+_REGION = 'us-east-1'
+
+
+# -----------------------------------------------------------------------------
+# Module-level library
+# -----------------------------------------------------------------------------
+@contextlib.contextmanager
+def _config(directory, root):
+    """Point fyda at a fresh ``.fydarc`` for ``root`` in ``directory``."""
+
+    previous = options.CONFIG_LOCATION
+    options.CONFIG_LOCATION = write_fydarc(directory, root)
+
+    try:
+        yield options.CONFIG_LOCATION
+    finally:
+        options.CONFIG_LOCATION = previous
+        fyda.invalidate()
+
+
+def _measure(name, case, func, repeat, setup=None, params=None, per=1):
+    """
+    Time ``func`` ``repeat`` times, then trace its peak memory once.
+
+    Parameters
+    ----------
+    name, case : str
+        Benchmark and case the result is recorded under.
+    func : callable
+        Called with the result of ``setup``, or without arguments.
+    repeat : int
+        Number of timed calls.
+    setup : callable, (optional)
+        Untimed preparation before each call.
+    params : dict, (optional)
+        Parameters to record with the result.
+    per : int, (optional)
+        Number of operations each call performs; times are divided by it.
+
+    Returns
+    -------
+    result : dict
+    """
+
+    times = []
+
+    for _ in range(repeat):
+        args = None if setup is None else setup()
+        gc.collect()
+        start = time.perf_counter()
+        if setup is None:
+            func()
+        else:
+            func(args)
+        times.append((time.perf_counter() - start) / per)
+
+    args = None if setup is None else setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        if setup is None:
+            func()
+        else:
+            func(args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'benchmark': name,
+        'case': case,
+        'params': params or {},
+        'seconds': {
+            'min': min(times),
+            'median': statistics.median(times),
+            'mean': statistics.mean(times),
+            'repeat': repeat},
+        'peak_bytes': peak}
+
+
+def _peak_rss():
+    """Peak resident memory of the process in bytes, or None where it can't
+    be read."""
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def _versions():
+    """Versions of the interpreter and the libraries being measured."""
+
+    versions = {'python': platform.python_version(),
+                'numpy': np.__version__,
+                'pandas': pd.__version__}
+
+    for module in ('pyarrow', 'boto3', 'moto'):
+        try:
+            versions[module] = __import__(module).__version__
+        except ImportError:
+            pass
+
+    return versions
+
+
+# -----------------------------------------------------------------------------
+# Benchmarks
+# -----------------------------------------------------------------------------
+def bench_construction(workdir, args):
+    """DataBank construction from a full scan, with several scan workers,
+    from a warm index, and lazily followed by a first lookup."""
+
+    params = {'files': args.files, 'depth': args.depth,
+              'fanout': args.fanout, 'collision_rate': args.collision_rate}
+    root = os.path.join(workdir, 'data')
+    paths = make_root(root, args.files, args.depth, args.fanout,
+                      args.collision_rate, args.group_size, seed=args.seed)
+    target = _default_shortcut(paths[-1])
+    results = []
+
+    with _config(workdir, root):
+
+        results.append(_measure(
+            'construction', 'scan',
+            lambda: fyda.DataBank(index=False), args.repeat, params=params))
+
+        results.append(_measure(
+            'construction', 'scan_workers_{}'.format(args.workers),
+            lambda: fyda.DataBank(index=False, workers=args.workers),
+            args.repeat, params=dict(params, workers=args.workers)))
+
+        fyda.DataBank(index=True)  # Write the index
+        results.append(_measure(
+            'construction', 'index',
+            lambda: fyda.DataBank(index=True), args.repeat, params=params))
+
+        results.append(_measure(
+            'construction', 'lazy_first_lookup',
+            lambda: fyda.DataBank(index=False, lazy=True)._determine_path(
+                target), args.repeat, params=params))
+
+    return results
+
+
+def bench_determine_path(workdir, args):
+    """Latency of resolving shortcuts and relative paths to files."""
+
+    params = {'files': args.files, 'depth': args.depth,
+              'fanout': args.fanout, 'collision_rate': args.collision_rate,
+              'lookups': _LOOKUPS}
+    root = os.path.join(workdir, 'data')
+    make_root(root, args.files, args.depth, args.fanout, args.collision_rate,
+              args.group_size, seed=args.seed)
+    results = []
+
+    with _config(workdir, root):
+
+        db = fyda.DataBank(index=False)
+        shortcuts = sorted(db.shortcuts)
+        step = max(1, len(shortcuts) // _LOOKUPS)
+        sample = (shortcuts[::step] * _LOOKUPS)[:_LOOKUPS]
+        relative = [os.path.relpath(db.shortcuts[s], root) for s in sample]
+
+        def resolve(bank, names):
+            for name in names:
+                bank._determine_path(name)
+
+        results.append(_measure(
+            'determine_path', 'shortcut',
+            lambda: resolve(db, sample), args.repeat, params=params,
+            per=_LOOKUPS))
+
+        results.append(_measure(
+            'determine_path', 'relative_path',
+            lambda: resolve(db, relative), args.repeat, params=params,
+            per=_LOOKUPS))
+
+        # Fewer lookups, since each one searches the tree
+        searched = sample[:20]
+        results.append(_measure(
+            'determine_path', 'lazy_search',
+            lambda bank: resolve(bank, searched), args.repeat,
+            setup=lambda: fyda.DataBank(index=False, lazy=True),
+            params=dict(params, lookups=len(searched)), per=len(searched)))
+
+    return results
+
+
+def bench_rebase(workdir, args):
+    """Assigning shortcuts when every file shares the same name, so each new
+    file may push the whole group to a deeper encoding level."""
+
+    files = args.collision_files
+    params = {'files': files, 'depth': args.depth, 'fanout': args.fanout}
+    root = os.path.join(workdir, 'collide')
+    empty = os.path.join(workdir, 'empty')
+    os.makedirs(empty)
+    paths = make_root(root, files, args.depth, args.fanout, 1.0, files,
+                      seed=args.seed)
+    # Collides with the last file up to its grandparent folder
+    newcomer = os.path.join(root, 'elsewhere', os.path.relpath(paths[-1],
+                                                               root))
+    results = []
+
+    with _config(workdir, empty):
+
+        def deposit_each(bank):
+            for filepath in paths:
+                bank.deposit(filepath)
+
+        results.append(_measure(
+            'rebase', 'deposit', deposit_each, args.repeat,
+            setup=lambda: fyda.DataBank(index=False), params=params))
+
+        results.append(_measure(
+            'rebase', 'deposit_many',
+            lambda bank: bank.deposit_many(paths), args.repeat,
+            setup=lambda: fyda.DataBank(index=False), params=params))
+
+        def filled():
+            bank = fyda.DataBank(index=False)
+            bank.deposit_many(paths)
+            return bank
+
+        results.append(_measure(
+            'rebase', 'rebase_shortcuts',
+            lambda bank: bank.rebase_shortcuts(newcomer), args.repeat,
+            setup=filled, params=params))
+
+        def forget_each(bank):
+            for filepath in paths[::-1]:
+                bank._forget(filepath)
+
+        results.append(_measure(
+            'rebase', 'forget', forget_each, args.repeat, setup=filled,
+            params=params))
+
+    return results
+
+
+def bench_s3(workdir, args):
+    """load_s3 and S3 data roots against a moto mock of S3. Skipped if moto
+    isn't installed. Absolute times include moto's overhead, so they are
+    mostly useful compared with earlier runs."""
+
+    try:
+        from moto import mock_aws
+    except ImportError:
+        return [{'benchmark': 's3', 'case': 'skipped',
+                 'params': {'reason': 'moto is not installed'}}]
+
+    import boto3
+
+    for name, value in (('AWS_ACCESS_KEY_ID', 'benchmark'),
+                        ('AWS_SECRET_ACCESS_KEY', 'benchmark'),
+                        ('AWS_DEFAULT_REGION', _REGION)):
+        os.environ.setdefault(name, value)
+
+    params = {'rows': args.rows}
+    formats = make_formats(os.path.join(workdir, 'formats'), args.rows,
+                           ['csv', 'parquet', 'npy'], seed=args.seed)
+    root = os.path.join(workdir, 'data')
+    make_root(root, args.s3_files, args.depth, args.fanout,
+              args.collision_rate, args.group_size, seed=args.seed)
+    results = []
+    part_size = options.S3_PART_SIZE
+
+    with mock_aws(), _config(workdir, root):
+
+        clear_clients()
+        client = boto3.client('s3', region_name=_REGION)
+        client.create_bucket(Bucket=_BUCKET)
+
+        for fmt, path in formats.items():
+            client.upload_file(path, _BUCKET, 'formats/' + file_name(fmt))
+        for folder, _, names in os.walk(root):
+            for name in names:
+                key = os.path.relpath(os.path.join(folder, name), root)
+                client.upload_file(os.path.join(folder, name), _BUCKET,
+                                   'data/' + key.replace(os.sep, '/'))
+
+        try:
+            for fmt in formats:
+                key = 'formats/' + file_name(fmt)
+                results.append(_measure(
+                    's3', 'load_' + fmt,
+                    lambda key=key: fyda.load_s3(key, _BUCKET, cache=False),
+                    args.repeat, params=params))
+
+            # Small parts, so that the object is fetched in many ranges
+            options.S3_PART_SIZE = 64 * 2 ** 10
+            results.append(_measure(
+                's3', 'load_csv_ranged',
+                lambda: fyda.load_s3('formats/csv.csv', _BUCKET, cache=False),
+                args.repeat, params=dict(params,
+                                         part_size=options.S3_PART_SIZE)))
+            options.S3_PART_SIZE = part_size
+
+            results.append(_measure(
+                's3', 'stream_csv',
+                lambda: sum(len(chunk) for chunk in fyda.load_s3(
+                    'formats/csv.csv', _BUCKET, cache=False,
+                    chunksize=max(1, args.rows // 10))),
+                args.repeat, params=params))
+
+            results.append(_measure(
+                's3', 'root_construction',
+                lambda: fyda.DataBank('s3://{}/data'.format(_BUCKET),
+                                      index=False),
+                args.repeat, params={'files': args.s3_files}))
+        finally:
+            options.S3_PART_SIZE = part_size
+            clear_clients()
+
+    return results
+
+
+def bench_withdraw(workdir, args):
+    """Latency of withdrawing the same table stored in each format, without
+    and with the result cache."""
+
+    params = {'rows': args.rows}
+    root = os.path.join(workdir, 'formats')
+    formats = make_formats(root, args.rows, args.formats, seed=args.seed)
+    results = []
+
+    with _config(workdir, root):
+
+        db = fyda.DataBank(index=False, archives=True, cache_bytes=0)
+
+        for fmt in formats:
+            results.append(_measure(
+                'withdraw', fmt,
+                lambda fmt=fmt: db.withdraw(fmt, cache=False), args.repeat,
+                params=params))
+
+        results.append(_measure(
+            'withdraw', 'csv_stream',
+            lambda: sum(len(chunk) for chunk in db.withdraw(
+                'csv', chunksize=max(1, args.rows // 10))),
+            args.repeat, params=params))
+
+        results.append(_measure(
+            'withdraw', 'csv_pushdown',
+            lambda: db.withdraw('csv', cache=False, columns=['id', 'value'],
+                                filters=[('count', '<', 100)]),
+            args.repeat, params=params))
+
+        cached = fyda.DataBank(index=False, cache_bytes=2 ** 30)
+        cached.withdraw('csv')
+        results.append(_measure(
+            'withdraw', 'csv_cached', lambda: cached.withdraw('csv'),
+            args.repeat, params=params))
+
+    return results
+
+
+# -----------------------------------------------------------------------------
+# Public library
+# -----------------------------------------------------------------------------
+def compare(results, baseline, tolerance=0.25):
+    """
+    Cases of ``results`` that regressed from ``baseline``.
+
+    A case regresses if its median time or its peak memory exceeds that of
+    the same benchmark and case in ``baseline`` by more than the fraction
+    ``tolerance``. Cases missing from either are ignored.
+
+    Returns
+    -------
+    regressions : list
+        Human-readable descriptions of the regressions.
+    """
+
+    before = {(r['benchmark'], r['case']): r for r in baseline['results']}
+    regressions = []
+
+    for result in results['results']:
+
+        old = before.get((result['benchmark'], result['case']))
+        if old is None or 'seconds' not in old or 'seconds' not in result:
+            continue
+
+        checks = (('median time', old['seconds']['median'],
+                   result['seconds']['median']),
+                  ('peak memory', old['peak_bytes'], result['peak_bytes']))
+
+        for what, was, now in checks:
+            if was and now > was * (1 + tolerance):
+                regressions.append('{}/{}: {} {:.4g} -> {:.4g} ({:+.0%})'
+                                   .format(result['benchmark'],
+                                           result['case'], what, was, now,
+                                           now / was - 1))
+
+    return regressions
+
+
+def run(args):
+    """Run the benchmarks selected by the parsed command line ``args``,
+    returning the results document."""
+
+    runners = {'construction': bench_construction,
+               'rebase': bench_rebase,
+               'determine_path': bench_determine_path,
+               'withdraw': bench_withdraw,
+               's3': bench_s3}
+    results = []
+    started = time.time()
+
+    for name in args.only or BENCHMARKS:
+        workdir = tempfile.mkdtemp(prefix='fyda-benchmark-')
+        try:
+            results.extend(runners[name](workdir, args))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'meta': {
+            'started': started,
+            'elapsed': time.time() - started,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'versions': _versions(),
+            'peak_rss_bytes': _peak_rss(),
+            'args': {k: v for k, v in vars(args).items()
+                     if k not in ('output', 'compare')}},
+        'results': results}
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark fyda and write the results as JSON.')
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS,
+                        help='benchmarks to run (default: all)')
+    parser.add_argument('--files', type=int, default=2000,
+                        help='files in discovery roots')
+    parser.add_argument('--depth', type=int, default=3,
+                        help='folder levels in discovery roots')
+    parser.add_argument('--fanout', type=int, default=4,
+                        help='subfolders per folder in discovery roots')
+    parser.add_argument('--collision-rate', type=float, default=0.1,
+                        help='fraction of files with colliding names')
+    parser.add_argument('--group-size', type=int, default=4,
+                        help='average files per colliding name')
+    parser.add_argument('--collision-files', type=int, default=200,
+                        help='files sharing one name in the rebase benchmark')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='scan workers for the threaded scan case')
+    parser.add_argument('--rows', type=int, default=10000,
+                        help='rows of the table in withdraw benchmarks')
+    parser.add_argument('--formats', nargs='+',
+                        choices=available_formats(),
+                        help='formats for withdraw benchmarks (default: all)')
+    parser.add_argument('--s3-files', type=int, default=200,
+                        help='objects under the S3 data root')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='timed runs per case')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='file to write results to '
+                        '(default: standard output)')
+    parser.add_argument('--compare', help='earlier results to check for '
+                        'regressions against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='fraction by which a case may get worse')
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    text = json.dumps(results, indent=2, sort_keys=True)
+
+    if args.output:
+        with open(args.output, 'w') as fileobj:
+            fileobj.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, 'r') as fileobj:
+            regressions = compare(results, json.load(fileobj),
+                                  args.tolerance)
+        for line in regressions:
+            print('Regression: ' + line, file=sys.stderr)
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
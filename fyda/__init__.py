@@ -1,4 +1,7 @@
 """fyda - the interface for your data"""
 from .base import DataBank, ProjectConfig
 from .base import load, load_s3, data_path, dir_path, load_config
+from .base import load_many, aload, aload_s3
+from .base import refresh, invalidate
+from .readers import register_reader, unregister_reader
 from . import options
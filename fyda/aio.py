@@ -0,0 +1,117 @@
+"""Running blocking loads from asyncio code."""
+import asyncio
+import threading
+import weakref
+
+from . import options
+from .cache import protect
+
+
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+# Per event loop state, as asyncio primitives belong to a single loop
+_LOOPS = weakref.WeakKeyDictionary()
+_LOOPS_LOCK = threading.Lock()
+
+
+# -----------------------------------------------------------------------------
+# Classes
+# -----------------------------------------------------------------------------
+class _Call:
+    """A load in flight, and the number of callers waiting on it."""
+
+    def __init__(self):
+        self.task = None
+        self.callers = 0
+
+
+class _LoopState:
+    """Loads in flight on one event loop, and the limit on how many run at
+    once."""
+
+    def __init__(self):
+        self.inflight = {}
+        self.semaphore = asyncio.Semaphore(options.ASYNC_CONCURRENCY)
+
+
+# -----------------------------------------------------------------------------
+# Module-level library
+# -----------------------------------------------------------------------------
+def _loop_state(loop):
+    """State for ``loop``, created on first use."""
+
+    with _LOOPS_LOCK:
+        try:
+            return _LOOPS[loop]
+        except KeyError:
+            state = _LOOPS[loop] = _LoopState()
+            return state
+
+
+# -----------------------------------------------------------------------------
+# Public library
+# -----------------------------------------------------------------------------
+async def run_blocking(func, *args):
+    """Run ``func(*args)`` in the loop's default executor."""
+
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, func, *args)
+
+
+async def run_coalesced(key, func, *args, mode='copy'):
+    """
+    Run the blocking call ``func(*args)`` in the loop's default executor,
+    sharing it with any other caller passing the same ``key`` meanwhile.
+    Callers sharing a call each receive their own protected version of the
+    result, so that none of them sees changes made by another.
+
+    At most ``fyda.options.ASYNC_CONCURRENCY`` calls run at once per event
+    loop. Cancelling one caller does not cancel a call others are waiting on.
+
+    Parameters
+    ----------
+    key : hashable or None
+        Identity of the resource being loaded. Calls with a None key are
+        never shared.
+    func : callable
+        Blocking function to run.
+    args
+        Positional arguments for ``func``.
+    mode : str, {'copy', 'readonly'}, (optional)
+        How the result is protected when the call is shared; see
+        :func:`fyda.cache.protect`.
+
+    Returns
+    -------
+    result
+        Return value of ``func``, or a protected version of it if the call
+        was shared.
+    """
+
+    loop = asyncio.get_event_loop()
+    state = _loop_state(loop)
+    call = None if key is None else state.inflight.get(key)
+
+    if call is None:
+        call = _Call()
+
+        async def run():
+            try:
+                async with state.semaphore:
+                    return await loop.run_in_executor(None, func, *args)
+            finally:  # Nobody joins once the result is handed out
+                if key is not None and state.inflight.get(key) is call:
+                    del state.inflight[key]
+
+        call.task = loop.create_task(run())
+        if key is not None:
+            state.inflight[key] = call
+
+    call.callers += 1
+    result = await asyncio.shield(call.task)
+
+    if call.callers == 1:
+        return result
+
+    return protect(result, mode)
@@ -0,0 +1,379 @@
+"""Reading files inside zip and tar archives without extracting them."""
+import io
+import os
+import posixpath
+import shutil
+import tarfile
+import tempfile
+import threading
+import zipfile
+import zlib
+
+from . import options
+from .arrays import _LOCAL_HEADER
+
+
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2',
+                      '.tar.xz', '.txz')
+
+# Archive path -> (stamp, members), so that each version of an archive is
+# only listed once per process
+_LISTINGS = {}
+_LISTINGS_LOCK = threading.Lock()
+
+# Bytes read from an archive at a time when inflating a member
+_CHUNK_SIZE = 2 ** 16
+
+
+# -----------------------------------------------------------------------------
+# Classes
+# -----------------------------------------------------------------------------
+class _Slice(io.RawIOBase):
+    """Seekable, read-only view of ``size`` bytes of an open file, starting
+    at ``start``. The file is closed along with the view."""
+
+    def __init__(self, fileobj, start, size):
+        super().__init__()
+        self._fileobj = fileobj
+        self._start = start
+        self._size = size
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+
+        n = min(len(b), self._size - self._pos)
+        if n <= 0:
+            return 0
+
+        self._fileobj.seek(self._start + self._pos)
+        n = self._fileobj.readinto(memoryview(b)[:n])
+        self._pos += n
+
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._size
+
+        self._pos = max(offset, 0)
+
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def close(self):
+        if not self.closed:
+            self._fileobj.close()
+        super().close()
+
+
+class _Inflate(io.RawIOBase):
+    """Read-only stream of a deflated zip member, checked against its CRC
+    once fully read. ``raw`` is closed along with the stream."""
+
+    def __init__(self, raw, crc):
+        super().__init__()
+        self._raw = raw
+        self._crc = crc
+        self._running = 0
+        self._inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+
+        while not self._inflater.eof:
+            data = self._inflater.unconsumed_tail or \
+                self._raw.read(_CHUNK_SIZE)
+            if not data:
+                raise zipfile.BadZipFile('Truncated zip member')
+            out = self._inflater.decompress(data, len(b))
+            if out:
+                b[:len(out)] = out
+                self._running = zlib.crc32(out, self._running)
+                if self._inflater.eof and self._running != self._crc:
+                    raise zipfile.BadZipFile('Bad CRC-32 in zip member')
+                return len(out)
+
+        return 0
+
+    def close(self):
+        if not self.closed:
+            self._raw.close()
+        super().close()
+
+
+# -----------------------------------------------------------------------------
+# Module-level library
+# -----------------------------------------------------------------------------
+def _clean(name):
+    """Normalized member name, or None for names reaching outside the
+    archive."""
+
+    name = posixpath.normpath(name.replace('\\', '/'))
+
+    if name.startswith(('/', '../')) or name in ('.', '..'):
+        return None
+
+    return name
+
+
+def _list_tar(path):
+    """Members of a tar archive. Uncompressed archives are read header by
+    header, seeking over the data; compressed ones have to be decompressed
+    in full, and their members can only be read by streaming through the
+    archive again."""
+
+    members = {}
+
+    with tarfile.open(path, 'r:*') as archive:
+        seekable = isinstance(archive.fileobj, io.BufferedReader)
+        for member in archive:
+            name = _clean(member.name)
+            if name is None or not member.isfile():
+                continue
+            if seekable:
+                members[name] = ['tar', member.offset_data, member.size]
+            else:
+                members[name] = ['tarstream', member.size]
+
+    return members
+
+
+def _list_zip(path):
+    """Members of a zip archive, from its central directory."""
+
+    members = {}
+
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            name = _clean(info.filename)
+            if name is None or info.is_dir():
+                continue
+            members[name] = ['zip', info.header_offset, info.compress_type,
+                             info.compress_size, info.file_size, info.CRC]
+
+    return members
+
+
+def _open_tar_stream(archive, name):
+    """Member of a compressed tar archive, found by streaming through it."""
+
+    tar = tarfile.open(archive, 'r|*')
+
+    try:
+        for member in tar:
+            if member.isfile() and _clean(member.name) == name:
+                return _spool(tar.extractfile(member))
+    finally:
+        tar.close()
+
+    raise FileNotFoundError('{} not in {}'.format(name, archive))
+
+
+def _open_zip(archive, name, info):
+    """Member of a zip archive, read from its recorded offset."""
+
+    _, offset, method, compressed, _, crc = info
+
+    if method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+        # Open members keep the archive's file open after it is closed
+        with zipfile.ZipFile(archive) as zf:
+            for entry in zf.infolist():
+                if entry.header_offset == offset:
+                    return zf.open(entry)
+        raise FileNotFoundError('{} not in {}'.format(name, archive))
+
+    fileobj = open(archive, 'rb')
+
+    try:
+        fileobj.seek(offset)
+        header = _LOCAL_HEADER.unpack(fileobj.read(_LOCAL_HEADER.size))
+        if header[0] != zipfile.stringFileHeader:
+            raise zipfile.BadZipFile('Bad local header for {} in {}'
+                                     .format(name, archive))
+        start = offset + _LOCAL_HEADER.size + header[-2] + header[-1]
+    except BaseException:
+        fileobj.close()
+        raise
+
+    raw = _Slice(fileobj, start, compressed)
+
+    if method == zipfile.ZIP_STORED:
+        return io.BufferedReader(raw)
+
+    return io.BufferedReader(_Inflate(raw, crc), _CHUNK_SIZE)
+
+
+def _spool(fileobj):
+    """Copy ``fileobj`` to a seekable file, in memory unless it is larger
+    than ``fyda.options.DECOMPRESS_SPILL_BYTES``."""
+
+    spooled = tempfile.SpooledTemporaryFile(options.DECOMPRESS_SPILL_BYTES)
+
+    with fileobj:
+        shutil.copyfileobj(fileobj, spooled, _CHUNK_SIZE)
+
+    spooled.seek(0)
+
+    return spooled
+
+
+# -----------------------------------------------------------------------------
+# Public library
+# -----------------------------------------------------------------------------
+def archive_stamp(path):
+    """``[mtime_ns, size]`` of an archive, or None if it can't be read."""
+
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+
+    return [st.st_mtime_ns, st.st_size]
+
+
+def is_archive(filename):
+    """Whether ``filename`` has the extension of a supported archive."""
+
+    return os.fspath(filename).lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def list_members(path, stamp=None):
+    """
+    Files in an archive, read from the central directory of a zip file or
+    the headers of a tar file, and cached for as long as the archive is
+    unchanged.
+
+    Parameters
+    ----------
+    path : str
+        Path to the archive.
+    stamp : list, (optional)
+        The archive's :func:`archive_stamp`, if already known.
+
+    Returns
+    -------
+    members : dict
+        Mapping of member names, with ``/`` separators, to the JSON-
+        serializable location of their data in the archive.
+    """
+
+    if stamp is None:
+        stamp = archive_stamp(path)
+
+    with _LISTINGS_LOCK:
+        cached = _LISTINGS.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+    if zipfile.is_zipfile(path):
+        members = _list_zip(path)
+    else:
+        members = _list_tar(path)
+
+    remember_members(path, stamp, members)
+
+    return members
+
+
+def member_path(archive, name):
+    """Path of the member ``name`` of ``archive``, as if the archive were a
+    folder."""
+
+    return os.path.join(archive, *name.split('/'))
+
+
+def open_member(path, sequential=False):
+    """
+    Open a file inside an archive for reading, without extracting the
+    archive.
+
+    Stored and deflated zip members and members of uncompressed tar
+    archives are read straight from their offset in the archive. Members of
+    compressed tar archives are found by decompressing the archive up to
+    them.
+
+    Parameters
+    ----------
+    path : str
+        Path of the member as given by :func:`member_path`.
+    sequential : bool, (optional)
+        Whether the caller reads the file from start to end without seeking.
+        Otherwise, members that can't seek are copied to a temporary file
+        first.
+
+    Returns
+    -------
+    fileobj : file-like
+        Binary file, to be closed by the caller.
+    """
+
+    found = split_member(path)
+    if found is None:
+        raise FileNotFoundError(path)
+
+    archive, name = found
+
+    try:
+        info = list_members(archive)[name]
+    except KeyError:
+        raise FileNotFoundError('{} not in {}'.format(name, archive))
+
+    if info[0] == 'zip':
+        fileobj = _open_zip(archive, name, info)
+    elif info[0] == 'tar':
+        fileobj = io.BufferedReader(_Slice(open(archive, 'rb'), info[1],
+                                           info[2]))
+    else:
+        return _open_tar_stream(archive, name)
+
+    if sequential or fileobj.seekable():
+        return fileobj
+
+    return _spool(fileobj)
+
+
+def remember_members(path, stamp, members):
+    """Cache the members of an archive, e.g. as stored in an index."""
+
+    with _LISTINGS_LOCK:
+        _LISTINGS[path] = (stamp, members)
+
+
+def split_member(path):
+    """
+    Archive and member name of a path inside an archive.
+
+    Returns
+    -------
+    found : tuple or None
+        ``(archive, name)``, or None if ``path`` isn't inside an archive.
+    """
+
+    if not isinstance(path, str):
+        return None
+
+    parts = path.split(os.sep)
+
+    for i in range(1, len(parts)):
+        if is_archive(parts[i - 1]):
+            archive = os.sep.join(parts[:i])
+            if os.path.isfile(archive):
+                return archive, '/'.join(parts[i:])
+
+    return None
@@ -0,0 +1,162 @@
+"""Memory-mapped loading of NumPy files."""
+import os
+import struct
+import threading
+import zipfile
+from collections.abc import Mapping
+
+import numpy as np
+from numpy.lib import format as npformat
+
+from . import options
+
+
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+# Local file header of a zip member, up to the name and extra field lengths
+_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+
+
+# -----------------------------------------------------------------------------
+# Classes
+# -----------------------------------------------------------------------------
+class MappedNpz(Mapping):
+    """
+    Read-only mapping of the arrays in a ``.npz`` file, loaded on first
+    access.
+
+    Members stored without compression (as written by :func:`numpy.savez`)
+    are memory-mapped straight out of the archive; compressed members are
+    read into memory.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the ``.npz`` file.
+    mmap_mode : str, {'r', 'r+', 'c'}
+        Mode for :class:`numpy.memmap`.
+    allow_pickle : bool, (optional)
+        Whether compressed members holding Python objects may be unpickled.
+    """
+
+    def __init__(self, filename, mmap_mode='r', allow_pickle=False):
+        self.filename = filename
+        self.mmap_mode = mmap_mode
+        self.allow_pickle = allow_pickle
+        self._arrays = {}
+        self._lock = threading.Lock()
+
+        with zipfile.ZipFile(filename) as archive:
+            self._members = {_array_name(info.filename): info
+                             for info in archive.infolist()}
+
+    @property
+    def files(self):
+        """Names of the arrays, as in :class:`numpy.lib.npyio.NpzFile`."""
+
+        return list(self._members)
+
+    def close(self):
+        """Drop the references to loaded arrays, as in
+        :meth:`numpy.lib.npyio.NpzFile.close`."""
+
+        with self._lock:
+            self._arrays.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __getitem__(self, name):
+
+        with self._lock:
+            if name not in self._arrays:
+                self._arrays[name] = self._load(self._members[name])
+            return self._arrays[name]
+
+    def __iter__(self):
+        return iter(self._members)
+
+    def __len__(self):
+        return len(self._members)
+
+    def __repr__(self):
+        return '<MappedNpz {!r}: {}>'.format(self.filename,
+                                             ', '.join(self._members))
+
+    def _load(self, info):
+        """Map or read a single member."""
+
+        if info.compress_type == zipfile.ZIP_STORED:
+            with open(self.filename, 'rb') as fileobj:
+                fileobj.seek(info.header_offset)
+                header = _LOCAL_HEADER.unpack(
+                    fileobj.read(_LOCAL_HEADER.size))
+                fileobj.seek(header[-2] + header[-1], 1)  # Name and extra
+                version = npformat.read_magic(fileobj)
+                shape, fortran, dtype = _read_header(fileobj, version)
+                offset = fileobj.tell()
+
+            if not dtype.hasobject:
+                return np.memmap(self.filename, dtype=dtype,
+                                 mode=self.mmap_mode, offset=offset,
+                                 shape=shape, order='F' if fortran else 'C')
+
+        with zipfile.ZipFile(self.filename) as archive:
+            with archive.open(info) as fileobj:
+                return npformat.read_array(fileobj,
+                                           allow_pickle=self.allow_pickle)
+
+
+# -----------------------------------------------------------------------------
+# Module-level library
+# -----------------------------------------------------------------------------
+def _array_name(member):
+    """Array name for an archive member, as used by :func:`numpy.savez`."""
+
+    return member[:-4] if member.endswith('.npy') else member
+
+
+def _read_header(fileobj, version):
+    """Shape, Fortran order and dtype from the header of a ``.npy`` file."""
+
+    if version == (1, 0):
+        return npformat.read_array_header_1_0(fileobj)
+
+    return npformat.read_array_header_2_0(fileobj)
+
+
+# -----------------------------------------------------------------------------
+# Public library
+# -----------------------------------------------------------------------------
+def read_numpy(filename, mmap_mode=None, **kwargs):
+    """
+    Load a ``.npy`` or ``.npz`` file, memory-mapping it if ``mmap_mode`` is
+    set.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the file.
+    mmap_mode : str, {None, 'r', 'r+', 'c'}, (optional)
+        As in :func:`numpy.load`. Defaults to ``fyda.options.MMAP_MODE``.
+        Mapped arrays open without reading the file and share the page cache
+        between processes. For ``.npz`` files a :class:`MappedNpz` is
+        returned.
+    kwargs
+        Additional keyword arguments to pass to :func:`numpy.load`.
+    """
+
+    if mmap_mode is None:
+        mmap_mode = options.MMAP_MODE
+    if not isinstance(filename, (str, os.PathLike)):  # Can't map a stream
+        mmap_mode = None
+
+    if mmap_mode and os.fspath(filename).endswith('.npz'):
+        return MappedNpz(filename, mmap_mode,
+                         kwargs.get('allow_pickle', False))
+
+    return np.load(filename, mmap_mode=mmap_mode, **kwargs)
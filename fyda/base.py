@@ -1,25 +1,47 @@
 """Base module for fyda."""
+import codecs
+import copy
+import functools
+import importlib
+import io
 import json
 import os
 import pickle
+import tarfile
+import threading
 import warnings
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from configparser import ConfigParser
 import yaml
-from io import BytesIO
 
-import numpy as np
 import pandas as pd
 
 from . import options
-from .errorhandling import NoShortcutError
+from .aio import run_blocking, run_coalesced
+from .archives import archive_stamp, is_archive, list_members, member_path, \
+    open_member, remember_members, split_member
+from .cache import DiskCache, ResultCache, _freeze, disk_key, file_stamp, \
+    make_key
+from .compression import open_compressed, split_compression
+from .errorhandling import AmbiguousShortcutError, BatchLoadError, \
+    NoShortcutError
+from .index import DirectorySnapshot, find_files, index_path, read_index, \
+    write_index
+from .pushdown import apply_pushdown, pushdown_kwargs, split_pushdown
+from .readers import _extensions, _picks, _remember_mode, pick_reader, \
+    read_csv, reader_mode
+from .s3 import ObjectCache, S3Snapshot, get_client, is_s3_url, \
+    open_object, split_url
+from .schema import SchemaStore, apply_schema, learn_schema, \
+    schema_kwargs, schema_path
+from .watch import start_watcher
 
 
 # TODO
 # Option values for behavior with duplicates. (Overwrite/keep/rename)
 # Sanity checks for file assignment in .fydarc. Possibly get flexible there.
 # Future idea: some way to search through files/shortcuts; like fuzzy search
-# Integrate cloud-based file loading directly into load(). i.e. point ``root``
-#   to a bucket, and have fyda work its magic from there.
 # Better path handling in .fydarc. e.g. when quotation marks appear in the path
 # Update displayed shortcuts using values from .fydarc
 # Automatic recursive directory shortcuts, much like how files work.
@@ -39,6 +61,30 @@ def _get_conf():  # Allows the user to change configuration path dynamically
 LOCATION = 0     # For accessing filepaths under "data" in config
 KWARGS = 1       # For accessing keyword arguments under "data" in config
 
+# Parsed configuration files, keyed by path, with their (mtime, size) stamp
+_CONFIG_CACHE = {}
+
+# The C-accelerated loader is much faster, but requires libyaml
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+# Arguments to pandas.read_csv that learned schemas can't be combined with,
+# and ones that make a load too partial to learn from
+_SCHEMA_EXCLUSIVE = ('dtype', 'converters', 'parse_dates', 'chunksize',
+                     'iterator')
+_SCHEMA_PARTIAL = ('columns', 'filters', 'usecols', 'nrows', 'skiprows',
+                   'skipfooter', 'header', 'names', 'index_col')
+
+# Readers parsing their input front to back, which can start on an S3 object
+# before it is fully downloaded
+_SEQUENTIAL = (read_csv, pd.read_csv, json.load, pickle.load)
+
+# Shared DataBanks used by the module-level helpers, keyed by (root, config)
+_BANKS = {}
+_BANKS_LOCK = threading.RLock()
+
+# Local S3 object caches by folder, sharing their statistics
+_OBJECT_CACHES = {}
+
 
 # -----------------------------------------------------------------------------
 # Classes
@@ -78,67 +124,204 @@ class DataBank:
     Parameters
     ----------
     root : str
-        Path to root data folder. If none is provided, uses the default from
+        Path to root data folder, or an ``s3://bucket/prefix`` URL to take
+        the files from S3. If none is provided, uses the default from
         ``.fydarc`` given by the ``conf_path`` parameter.
+    error : str, {'ignore', 'raise'}
+        Whether to ignore filetype errors or raise a ``NotImplementedError``
+        when assigning readers.
+    index : bool, (optional)
+        Whether to save shortcuts to an index file next to ``.fydarc`` and
+        reuse them on the next startup, rescanning only the directories that
+        changed in between. Defaults to ``fyda.options.USE_INDEX``.
+    lazy : bool, (optional)
+        If True, skip scanning the root on construction. Shortcuts passed to
+        :meth:`withdraw` are then found with a breadth-first search for a
+        matching file name, and the full scan only happens once
+        :attr:`shortcuts`, :attr:`readers` or :attr:`tree` is requested.
+        Defaults to ``fyda.options.LAZY``.
+    workers : int, (optional)
+        Number of threads listing directories concurrently while scanning,
+        which helps on network-mounted roots where each listing waits on a
+        round trip. Defaults to ``scan_workers`` under ``directories`` in
+        ``.fydarc``, then ``fyda.options.SCAN_WORKERS``, or
+        ``fyda.options.S3_SCAN_WORKERS`` for S3 roots.
+    cache_bytes : int, (optional)
+        Memory budget for keeping the results of :meth:`withdraw`, so that
+        loading an unchanged file again with the same reader and arguments
+        skips parsing it. Least recently used results are evicted first.
+        Defaults to ``fyda.options.CACHE_BYTES``; 0 disables the cache.
+    cache_mode : str, {'copy', 'readonly'}, (optional)
+        How cached results are protected from modification; see
+        :class:`fyda.cache.ResultCache`. Defaults to
+        ``fyda.options.CACHE_MODE``.
+    disk_cache : bool or str, (optional)
+        Whether to store data parsed from slow formats (those in
+        ``fyda.options.DISK_CACHE_EXTENSIONS``) in a binary sidecar file, and
+        read that instead of parsing the file again as long as it is
+        unchanged. A string gives the folder to keep the sidecars in, relative
+        to ``.fydarc``. Defaults to ``disk_cache`` under ``directories`` in
+        ``.fydarc``, then ``fyda.options.DISK_CACHE``.
+    learn_schemas : bool, (optional)
+        Whether to learn compact column types for CSV files on their first
+        full load (categories for repetitive strings, timestamps for ISO
+        dates and downcast integers) and parse them with those types from
+        then on, which is faster and uses less memory. Schemas are stored
+        next to ``.fydarc``; see :meth:`memory_report`. Defaults to
+        ``fyda.options.LEARN_SCHEMAS``.
+    archives : bool, (optional)
+        Whether to give the files inside zip and tar archives under the root
+        shortcuts of their own, in place of the archives. See Notes.
+        Defaults to ``archives`` under ``directories`` in ``.fydarc``, then
+        ``fyda.options.ARCHIVES``.
+
+    Notes
+    -----
+    A lazy search looks through the whole root for the files sharing the
+    shortcut's name, so that it resolves to the same file as in a fully
+    scanned bank. Set ``fyda.options.LAZY_SEARCH_DEPTH`` to bound how deep
+    the search goes, at the cost of missing collisions with deeper files.
+    Lazy banks with ``archives`` scan the root on their first lookup, since
+    members can only be found by listing the archives.
+
+    For an S3 root, shortcuts and the tree are built from a listing of the
+    bucket (see :class:`fyda.s3.S3Snapshot`), which is stored in the index
+    like that of a local root. Objects are then withdrawn as with
+    :func:`load_s3`, and their ETags in the listing stand in for the
+    modification times of local files in the result cache. S3 roots are
+    never lazy, since finding a single object takes a listing anyway, and
+    :meth:`refresh` lists the whole root again.
+
+    Archive members are listed from the central directory of zip files and
+    the headers of tar files, without extracting anything, and are given
+    paths as if the archive were a folder, e.g. ``sales.zip/2020/q1.csv``.
+    Withdrawing a member reads it straight from its offset in the archive
+    (see :func:`fyda.archives.open_member`); members of compressed tar
+    archives can only be reached by decompressing the archive up to them.
+    Listings are stored in the index and read again only when an archive's
+    modification time or size changes. Archives in S3 roots are left as
+    they are.
     """
 
-    def __init__(self, root=None, error='ignore'):
+    def __init__(self, root=None, error='ignore', index=None, lazy=None,
+                 workers=None, cache_bytes=None, cache_mode=None,
+                 disk_cache=None, learn_schemas=None, archives=None):
 
         if root is None:
-            pc = load_config()
+            pc = _cached_config()
 
             try:
-                self.root = os.path.abspath(
-                        os.path.join(os.path.dirname(_get_conf()),
-                                     pc['directories']['root']))
+                self.root = _root_path(pc['directories']['root'])
             except KeyError:
                 self.root = os.path.join(os.getcwd(), 'data')
         else:
             self.root = root
+        if is_s3_url(self.root):
+            self.root = self.root.rstrip('/')
         self._root = self.root  # For legacy API support
         self._data = {}
+        self._paths = {}  # Reverse of _data
         self._reader_map = {}
         self._forbid = {}
-        self._tree = self.root_to_dict(self.root, error=error)
+        self._error = error
+        self._lock = threading.RLock()
+        self._watcher = None
+        self._index = (options.USE_INDEX if index is None else index) and \
+            os.path.exists(_get_conf())
+        self._workers = int(workers or _get_setting(
+            'scan_workers', options.S3_SCAN_WORKERS if is_s3_url(self.root)
+            else options.SCAN_WORKERS))
+        self._snapshot = None  # Only None while a lazy bank is unscanned
+        self._resolved = {}    # Shortcuts found by lazy searches
+        self._cache = None
+        self._disk_cache = None
+        self._schemas = None
+        self._archives = None  # Members by archive path, if enabled
+
+        if archives is None:
+            archives = _get_setting('archives', options.ARCHIVES)
+        if archives and not is_s3_url(self.root):
+            self._archives = {}
+
+        if cache_bytes is None:
+            cache_bytes = options.CACHE_BYTES
+        if cache_bytes:
+            self._cache = ResultCache(cache_bytes,
+                                      cache_mode or options.CACHE_MODE)
+
+        if disk_cache is None:
+            disk_cache = _get_setting('disk_cache', options.DISK_CACHE)
+        if disk_cache:
+            self._disk_cache = DiskCache(_disk_cache_dir(disk_cache),
+                                         options.DISK_CACHE_BYTES)
+
+        if options.LEARN_SCHEMAS if learn_schemas is None else learn_schemas:
+            self._schemas = SchemaStore(
+                schema_path(_get_conf()) if os.path.exists(_get_conf())
+                else None)
+
+        if is_s3_url(self.root) or not (options.LAZY if lazy is None
+                                        else lazy):
+            self._scan()
         # TODO rcusers information to avoid overwriting values set in config
 
     # We access attributes this way because dict is mutable
     # TODO: any way to warn people when they try to change these?
     @property
     def tree(self):
-        """Full tree of data root directory in python dictionary form."""
-        return self.root_to_dict(self.root)
+        """Full tree of data root directory in python dictionary form.
+
+        Directories modified since the last access are rescanned first. The
+        tree is shared with the bank and should not be modified."""
+        if self._snapshot is None:
+            self._ensure_scanned()
+        else:
+            self.refresh()
+        return self._tree
 
     @property
     def shortcuts(self):
         """Mapping of shortcuts to absolute paths."""
         # TODO .fydarc data shortcuts should be in here as well.
+        self._ensure_scanned()
         return self._data.copy()
 
     @property
     def readers(self):
         """Mapping of shortcuts to their respective readers."""
+        self._ensure_scanned()
         return self._reader_map.copy()
 
-    def _determine_path(self, input_string):
+    def _cache_key(self, filename, reader, kwargs, cache):
+        """Key of a resolved file in the result cache, or None if it isn't
+        cached."""
+
+        if not cache or self._cache is None:
+            return None
+
+        return self._make_key(filename, reader, kwargs)
+
+    def _determine_path(self, input_string, config=None):
         """Determine the actual file location, based on input string."""
 
-        pc = load_config()
+        pc = _cached_config() if config is None else config
 
         # .fydarc takes priority
         if input_string in pc['data'].keys():
-            return os.path.abspath(
-                os.path.join(self.root, _get_data_location(
-                    input_string, pc)))
+            return _root_join(self.root, _get_data_location(input_string, pc))
 
         try:  # Second check shortcuts
-            filename = self.shortcuts[input_string]
+            filename = self._lookup(input_string)
         except KeyError:
 
             if os.path.splitext(input_string)[1] == '':
                 raise NoShortcutError(input_string)
 
-            filename = os.path.join(self.root, input_string)
+            filename = _root_join(self.root, input_string)
+
+        # Checked when the object or member is opened
+        if is_s3_url(filename) or split_member(filename) is not None:
+            return filename
 
         try:  # Then see if it is a path relative to data root
             with open(filename):
@@ -149,10 +332,503 @@ class DataBank:
 
         return filename
 
+    def _apply_changes(self, dirs=None):
+        """Update shortcuts for changes on disk without saving the index.
+        ``dirs`` is passed on to :meth:`DirectorySnapshot.refresh`."""
+
+        with self._lock:
+            added, removed = self._snapshot.refresh(dirs)
+
+            if self._archives is not None:
+                added, removed = self._sync_archives(added, removed)
+
+            for filepath in removed:
+                self._forget(filepath)
+
+            self.deposit_many(added, error=self._error)
+
+            self._tree = self._graft_archives(self._snapshot.tree())
+
+        return bool(added or removed)
+
+    def _make_key(self, filename, reader, kwargs):
+        """Key of a load in the result cache, identifying S3 objects by the
+        ETag they were listed with (None if it can't be cached)."""
+
+        if not is_s3_url(filename):
+            return make_key(filename, reader, kwargs)
+
+        etag = self._etag(filename)
+
+        try:
+            key = (filename, etag, reader, _freeze(kwargs))
+            hash(key)
+        except TypeError:
+            return None
+
+        return None if etag is None else key
+
+    def _etag(self, filename):
+        """ETag an S3 object was listed with, or None for local files."""
+
+        if not self._snapshot or not is_s3_url(filename):
+            return None
+
+        return self._snapshot.etag(filename)
+
+    def _ensure_scanned(self):
+        """Scan the root of a lazy bank, if that hasn't happened yet."""
+
+        if self._snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._scan()
+
+    def _expand_archives(self, filepaths):
+        """Replace archives among ``filepaths`` with the paths of their
+        members, recording the members of each."""
+
+        expanded = []
+
+        for filepath in filepaths:
+
+            if self._archives is None or not is_archive(filepath):
+                expanded.append(filepath)
+                continue
+
+            stamp = archive_stamp(filepath)
+
+            try:
+                members = list_members(filepath, stamp)
+            except (OSError, EOFError, zipfile.BadZipFile,
+                    tarfile.TarError) as e:
+                if options.SHOW_WARNINGS:
+                    warnings.warn('Could not list archive "{}", adding it as '
+                                  'a file: {}'.format(filepath, e))
+                expanded.append(filepath)
+                continue
+
+            self._archives[filepath] = {'stamp': stamp, 'members': members}
+            expanded.extend(member_path(filepath, name) for name in members)
+
+        return expanded
+
+    def _forget(self, filepath):
+        """Remove a file from the bank, rebasing the users it leaves behind."""
+
+        shortcut = self._paths.pop(filepath, None)
+        if shortcut is None:
+            return
+
+        del self._data[shortcut]
+        self._reader_map.pop(shortcut, None)
+
+        default = _default_shortcut(filepath)
+        group = self._forbid[default]
+        group['in_use'] = [u for u in group['in_use'] if u != shortcut]
+
+        if not group['in_use']:
+            del self._forbid[default]
+            return
+
+        # The remaining users may be distinguishable at a lower level
+        level = _collision_level([self._data[u] for u in group['in_use']])
+        if level != group['encode_level']:
+            self._rebase_group(default, level)
+
+    def _graft_archives(self, tree):
+        """Tree with the entry of each archive replaced by a branch of its
+        members. Only the nodes on the way to an archive are copied, since the
+        snapshot's tree is shared."""
+
+        if not self._archives:
+            return tree
+
+        tree = dict(tree)
+        copied = {id(tree)}
+
+        for archive, entry in self._archives.items():
+
+            parts = os.path.relpath(archive, self.root).split(os.sep)
+            node = tree
+
+            for name in [os.path.basename(self.root)] + parts[:-1]:
+                child = node.get(name)
+                if not isinstance(child, dict):
+                    break
+                if id(child) not in copied:
+                    child = node[name] = dict(child)
+                    copied.add(id(child))
+                node = child
+            else:
+                if node.get(_default_shortcut(parts[-1])) == parts[-1]:
+                    del node[_default_shortcut(parts[-1])]
+                node[parts[-1]] = _member_tree(entry['members'])
+
+        return tree
+
+    def _lookup(self, shortcut):
+        """
+        Path to the file for an automatically assigned shortcut.
+
+        Lazy banks that haven't been scanned search the root for the files
+        sharing the shortcut's default, remembering the result. The file found
+        is the one a full scan would give the shortcut to.
+
+        Raises
+        ------
+        KeyError
+            If the shortcut doesn't refer to any file.
+        AmbiguousShortcutError
+            If a lazy search finds files of different collision groups that
+            would both be given the shortcut.
+        """
+
+        if self._snapshot is not None:
+            return self._data[shortcut]
+
+        try:
+            return self._resolved[shortcut]
+        except KeyError:
+            pass
+
+        # A path relative to the root needs no search at all
+        direct = os.path.join(self.root, shortcut)
+        if os.path.splitext(shortcut)[1] and os.path.isfile(direct):
+            self._resolved[shortcut] = direct
+            return direct
+
+        if self._archives is not None:
+            # Members can only be found by listing the archives
+            self._ensure_scanned()
+            return self._data[shortcut]
+
+        # Find the whole collision group of every file the shortcut could
+        # refer to, and encode it as a full scan would
+        defaults = {shortcut, _default_shortcut(shortcut)}
+        groups = {}
+
+        found = find_files(self.root,
+                           lambda path: _default_shortcut(path) in defaults,
+                           options.LAZY_SEARCH_DEPTH)
+
+        for path in found:
+            groups.setdefault(_default_shortcut(path), []).append(path)
+
+        matches = []
+
+        for default, paths in groups.items():
+            level = _collision_level(paths)
+            matches.extend(path for path in paths if shortcut == (
+                default if level == 0 else _encode_shortcut(path, level)))
+
+        if not matches:
+            raise KeyError(shortcut)
+        if len(matches) > 1:  # e.g. "a.b" for both a.b.csv and a/a.b
+            raise AmbiguousShortcutError(shortcut, matches)
+
+        self._resolved[shortcut] = matches[0]
+        return matches[0]
+
+    def _prepare(self, data_name, reader, kwarg_update_method, kwargs):
+        """Resolve the file, reader and keyword arguments for withdrawing
+        ``data_name``."""
+
+        pc = _cached_config()
+        filename = self._determine_path(data_name, pc)
+
+        if kwarg_update_method != 'overwrite':
+            try:
+                rckwargs = _get_data_kwargs(data_name, pc)
+            except (IndexError, KeyError):
+                rckwargs = {}
+            if kwarg_update_method == 'update':
+                kwargs.update(rckwargs)
+            elif kwarg_update_method == 'rc':
+                kwargs = dict(rckwargs)
+
+        if reader is None:
+            try:
+                reader = self._reader_map[data_name]
+            except KeyError:
+                reader = _pick_reader(filename)
+
+        return filename, reader, kwargs
+
+    def _prepare_key(self, data_name, reader, kwarg_update_method, kwargs):
+        """As :meth:`_prepare`, adding a key identifying the load for
+        coalescing concurrent requests (None if it can't be shared)."""
+
+        filename, reader, kwargs = self._prepare(
+            data_name, reader, kwarg_update_method, kwargs)
+
+        if kwargs.get('chunksize') is not None:  # Iterators can't be shared
+            return filename, reader, kwargs, None
+
+        return filename, reader, kwargs, self._make_key(filename, reader,
+                                                        kwargs)
+
+    def _read(self, filename, reader, kwargs, cache):
+        """Load a resolved file through the caches, or stream it if a
+        ``chunksize`` is given."""
+
+        if kwargs.get('chunksize') is not None:
+            return _stream(reader, filename, kwargs)
+
+        key = self._cache_key(filename, reader, kwargs, cache)
+        if key is not None:
+            found, data = self._cache.get(key)
+            if found:
+                return data
+
+        data = _decode_cached(reader, filename, kwargs,
+                              self._disk_cache if cache else None,
+                              self._schemas, self._etag(filename))
+
+        if key is not None:
+            return self._cache.put(key, data)
+
+        return data
+
+    def _restore_index(self):
+        """Load shortcuts from the index file, updating them for anything that
+        changed on disk. Returns False if there is no usable index."""
+
+        path = index_path(_get_conf())
+        entry = read_index(path, _root_key(self.root))
+
+        if entry is None or entry.get('error') != self._error:
+            return False
+
+        # Banks with and without archive members have different shortcuts
+        if (entry.get('archives') is None) != (self._archives is None):
+            return False
+
+        # Stored readers are stale once other readers have been registered
+        if entry.get('picks') != _registry_picks():
+            return False
+
+        readers = {}
+        for shortcut, name in entry['readers'].items():
+            if name not in readers:
+                try:
+                    readers[name] = None if name is None else \
+                        _resolve_reader(name)
+                except (ImportError, AttributeError, ValueError):
+                    return False
+            self._reader_map[shortcut] = readers[name]
+
+        self._data = entry['data']
+        self._paths = {path: shortcut
+                       for shortcut, path in self._data.items()}
+        self._forbid = entry['forbid']
+        if self._archives is not None:
+            self._archives = entry['archives']
+            for archive, record in self._archives.items():
+                remember_members(archive, record['stamp'], record['members'])
+        self._snapshot = _take_snapshot(self.root, self._workers,
+                                        entry['snapshot'])
+        self.refresh()
+
+        return True
+
+    def _save_index(self):
+        """Write the current shortcuts to the index file next to .fydarc."""
+
+        names = {}
+        readers = {}
+
+        for shortcut, reader in self._reader_map.items():
+            key = id(reader)
+            if key not in names:
+                names[key] = _reader_name(reader)
+            if names[key] is None and reader is not None:
+                # Custom readers can't be stored, so neither can the bank
+                return
+            readers[shortcut] = names[key]
+
+        write_index(index_path(_get_conf()), _root_key(self.root), {
+            'error': self._error,
+            'data': self._data,
+            'readers': readers,
+            'forbid': self._forbid,
+            'picks': _registry_picks(),
+            'archives': self._archives,
+            'snapshot': self._snapshot.to_dict()})
+
+    def _scan(self):
+        """Assign shortcuts for everything under the root, from the index
+        where possible."""
+
+        if not (self._index and self._restore_index()):
+            self._snapshot = _take_snapshot(self.root, self._workers)
+            self.deposit_many(self._expand_archives(self._snapshot.files()),
+                              error=self._error)
+            if self._index:
+                self._save_index()
+
+        self._tree = self._graft_archives(self._snapshot.tree())
+        self._resolved = {}
+
+    def _sync_archives(self, added, removed):
+        """
+        Bring archive members up to date with the files added and removed by
+        a refresh, and with archives changed in place, which a snapshot can't
+        tell from their folder.
+
+        Returns
+        -------
+        added, removed : list
+            Paths of the files and members to add and remove.
+        """
+
+        gone = []
+
+        for filepath in removed:
+            entry = self._archives.pop(filepath, None)
+            if entry is None:
+                gone.append(filepath)
+            else:
+                gone.extend(member_path(filepath, name)
+                            for name in entry['members'])
+
+        added = self._expand_archives(added)
+
+        for archive, entry in list(self._archives.items()):
+
+            stamp = archive_stamp(archive)
+            if stamp is None or stamp == entry['stamp']:
+                continue
+
+            old = self._archives.pop(archive)['members']
+            expanded = self._expand_archives([archive])
+            new = self._archives.get(archive, {'members': {}})['members']
+
+            if archive not in self._archives:  # No longer readable
+                added.extend(expanded)
+            added.extend(member_path(archive, name) for name in new
+                         if name not in old)
+            gone.extend(member_path(archive, name) for name in old
+                        if name not in new)
+
+        return added, gone
+
     def _kill_check(self, filepath):
         """Use to stop a process if filepath is already in data dict."""
 
-        return os.path.abspath(filepath) in self._data.values()
+        return filepath in self._paths or \
+            os.path.abspath(filepath) in self._paths
+
+    def _assign_group(self, default, new):
+        """
+        Add files to a collision group, rebasing its users if the group now
+        needs a higher encoding level.
+
+        Parameters
+        ----------
+        default : str
+            Default shortcut shared by the group.
+        new : dict
+            Mapping of the files joining the group to their readers.
+        """
+
+        group = self._forbid.get(default)
+
+        if group is None:
+            level = _collision_level(list(new)) if len(new) > 1 else 0
+            group = self._forbid[default] = {'encode_level': level,
+                                             'in_use': []}
+        else:
+            level = _collision_level(
+                [self._data[u] for u in group['in_use']] + list(new))
+            if level != group['encode_level']:
+                self._rebase_group(default, level)
+
+        for filepath, reader in new.items():
+            shortcut = default if level == 0 else \
+                _encode_shortcut(filepath, level)
+            replaced = self._data.get(shortcut)
+            if replaced is not None:  # Taken by a file from another group
+                self._paths.pop(replaced, None)
+            group['in_use'].append(shortcut)
+            self._data[shortcut] = filepath
+            self._paths[filepath] = shortcut
+            self._reader_map[shortcut] = reader
+
+    def _rebase_group(self, default, level):
+        """Re-encode every user of a collision group at ``level``."""
+
+        group = self._forbid[default]
+        users = []
+
+        for user in group['in_use']:
+            filepath = self._data.pop(user)
+            reader = self._reader_map.pop(user, None)
+            shortcut = _encode_shortcut(filepath, level)
+            self._data[shortcut] = filepath
+            self._paths[filepath] = shortcut
+            self._reader_map[shortcut] = reader
+            users.append(shortcut)
+
+        group['encode_level'] = level
+        group['in_use'] = users
+
+    async def awithdraw(self, data_name, reader=None,
+                        kwarg_update_method='update', cache=True, **kwargs):
+        """
+        Asynchronous version of :meth:`withdraw`.
+
+        Resolving and reading the file happen in the event loop's default
+        executor, so the loop is never blocked. Concurrent requests for the
+        same file with the same reader and arguments share a single read,
+        each receiving its own copy of the data, or a read-only view if the
+        bank's ``cache_mode`` is ``'readonly'``. At most
+        ``fyda.options.ASYNC_CONCURRENCY`` reads run at once per loop.
+        """
+
+        filename, reader, kwargs, key = await run_blocking(
+            self._prepare_key, data_name, reader, kwarg_update_method, kwargs)
+
+        if key is not None:
+            key = (id(self), cache) + key
+
+        mode = self._cache.mode if cache and self._cache is not None \
+            else 'copy'
+
+        return await run_coalesced(key, self._read, filename, reader, kwargs,
+                                   cache, mode=mode)
+
+    def cache_clear(self, disk=False):
+        """Empty the :meth:`withdraw` result cache and reset its statistics.
+        If ``disk`` is True, delete the sidecars of the disk cache instead."""
+
+        cache = self._disk_cache if disk else self._cache
+
+        if cache is not None:
+            cache.clear()
+
+    def cache_info(self, disk=False):
+        """
+        Statistics for the :meth:`withdraw` result cache.
+
+        Parameters
+        ----------
+        disk : bool, (optional)
+            If True, describe the disk cache instead.
+
+        Returns
+        -------
+        info : CacheInfo or None
+            Named tuple of ``hits``, ``misses``, ``entries``, ``nbytes`` and
+            ``max_bytes``, or None if the bank has no such cache.
+        """
+
+        cache = self._disk_cache if disk else self._cache
+
+        if cache is None:
+            return None
+
+        return cache.info()
 
     def deposit(self, filepath, shortcut=None, reader=None, error='raise'):
         """
@@ -170,29 +846,35 @@ class DataBank:
             assigned.
         error : str
             If set to 'ignore', ignores any errors when picking a file reader.
+
+        See also
+        --------
+        :meth:`DataBank.deposit_many` : store many files at once
         """
 
+        self._ensure_scanned()
+
         # If we don't check, rebase recursion will ruin everything
         if self._kill_check(filepath):
             warnings.warn('Attempted to add already existing file "{}" to '
                           'DataBank. Killing process.'.format(filepath))
             return
 
-        # Shortcut determination
-        if shortcut is None:
-            shortcut, rebase = self.determine_shortcut(filepath)
-            while rebase:
-                self.rebase_shortcuts(filepath)
-                shortcut, rebase = self.determine_shortcut(filepath)
-        elif shortcut in self.shortcuts.keys():
-            raise ValueError('Shortcut `{}` already in use.'.format(filepath))
+        if shortcut is not None and shortcut in self._data:
+            raise ValueError('Shortcut `{}` already in use.'.format(shortcut))
 
         # Reader determination
         if reader is None:
             reader = _pick_reader(filepath, error=error)
 
-        # Update user list
         default = _default_shortcut(filepath)
+
+        # Shortcut determination
+        if shortcut is None:
+            self._assign_group(default, {filepath: reader})
+            return
+
+        # Update user list
         # TODO make this better?
         if default in self._forbid:
             new_userlist = self._forbid[default]['in_use'] + [shortcut]
@@ -206,6 +888,44 @@ class DataBank:
                 'in_use': new_userlist}})
         self._reader_map.update({shortcut: reader})
         self._data.update({shortcut: filepath})
+        self._paths[filepath] = shortcut
+
+    def deposit_many(self, filepaths, error='raise'):
+        """
+        Store shortcuts and readers for many files at once.
+
+        Each collision group is given its final encoding level in a single
+        step, so the resulting shortcuts are the same as from calling
+        :meth:`DataBank.deposit` on every file, without the repeated
+        rebasing. Files that are already in the bank are skipped.
+
+        Parameters
+        ----------
+        filepaths : iterable
+            Names of the files to store.
+        error : str
+            If set to 'ignore', ignores any errors when picking a file reader.
+        """
+
+        self._ensure_scanned()
+        check = bool(self._paths)  # Nothing to check in an empty bank
+        groups = {}
+        readers = {}  # Readers only depend on the (multi-part) extension
+
+        for filepath in filepaths:
+
+            if check and self._kill_check(filepath):
+                continue
+
+            default = _default_shortcut(filepath)
+            extension = tuple(_extensions(filepath))
+            if extension not in readers:
+                readers[extension] = _pick_reader(filepath, error=error)
+
+            groups.setdefault(default, {})[filepath] = readers[extension]
+
+        for default, new in groups.items():
+            self._assign_group(default, new)
 
     def determine_shortcut(self, filepath):
         """
@@ -226,6 +946,8 @@ class DataBank:
             a new duplicate value.
 
         """
+        self._ensure_scanned()
+
         # Base name without extension
         default = _default_shortcut(filepath)
 
@@ -244,6 +966,7 @@ class DataBank:
     def encoding_level(self, fileref):
         """Get the encoding level for given file reference."""
 
+        self._ensure_scanned()
         default = _default_shortcut(fileref)
 
         if default in self._forbid:
@@ -251,6 +974,34 @@ class DataBank:
 
         return 0
 
+    def memory_report(self):
+        """
+        Memory footprint of the files with learned schemas, as loaded with
+        the default types and with the learned ones.
+
+        Returns
+        -------
+        report : DataFrame
+            One row per file, indexed by shortcut (or path for files without
+            one), with columns ``before`` and ``after`` in bytes and
+            ``ratio``, the fraction of memory saved.
+        """
+
+        rows = {}
+
+        if self._schemas is not None:
+            for path, schema in self._schemas.items():
+                if 'before' not in schema:
+                    continue
+                rows[self._paths.get(path, path)] = (schema['before'],
+                                                     schema['after'])
+
+        report = pd.DataFrame.from_dict(rows, orient='index',
+                                        columns=['before', 'after'])
+        report['ratio'] = 1 - report['after'] / report['before']
+
+        return report.sort_index()
+
     def rebase_shortcuts(self, filepath):
         """
         Detect if the filepath will cause a duplication conflict, and rebase if
@@ -262,35 +1013,51 @@ class DataBank:
             Absolute path to the file in question.
         """
 
+        self._ensure_scanned()
+
         if self._kill_check(filepath):
             warnings.warn('Attempted to add already existing file "{}" to '
                           'DataBank. Killing process.'.format(filepath))
             return
 
-        default = _default_shortcut(filepath)
-        encode_level = self._forbid[default]['encode_level']
-        users = self._forbid[default]['in_use']
-        shortcut = _encode_shortcut(filepath, encode_level)
-        conflict_exists = shortcut in users
-
         # TODO preserve .fydarc users. i.e. don't rebase anything set by the
         #   rc file.
 
-        while conflict_exists:
+        default = _default_shortcut(filepath)
+        group = self._forbid[default]
+        level = _collision_level(
+            [self._data[u] for u in group['in_use']] + [filepath])
+
+        if level > group['encode_level']:
+            self._rebase_group(default, level)
+
+    def refresh(self):
+        """
+        Update shortcuts for files added to or removed from the root.
+
+        Only directories modified since the last scan are listed again.
 
-            encode_level += 1
-            self._forbid[default]['encode_level'] = encode_level
+        Lazy banks that haven't scanned the root yet just forget the
+        shortcuts they have searched for.
+
+        Returns
+        -------
+        changed : bool
+            Whether any files were added or removed.
+        """
 
-            for user in users:
+        if self._snapshot is None:
+            self._resolved = {}
+            return False
 
-                file_string = self._data.pop(user)
-                new_shortcut = _encode_shortcut(file_string, encode_level)
-                self._data[new_shortcut] = file_string
-                users = list(set(users) - {user}) + [new_shortcut]
+        if not self._apply_changes():
+            return False
 
-            conflict_exists = shortcut in users
+        if self._index:
+            with self._lock:
+                self._save_index()
 
-        self._forbid[default]['in_use'] = users
+        return True
 
     def root_to_dict(self, root, auto_deposit=True, error='raise'):
         """
@@ -302,7 +1069,8 @@ class DataBank:
             Path to root folder.
         auto_deposit : bool
             If True, automatically call :meth:`DataBank.deposit` on any files
-            found through the recursion to the ``shortcuts`` dict.
+            found through the recursion that are not already in the
+            ``shortcuts`` dict.
         error : str, {'raise', 'ignore'}
             Whether to ignore filetype errors or raise a
             ``NotImplementedError``.
@@ -314,33 +1082,55 @@ class DataBank:
 
         """
 
-        directory = {}
+        snapshot = _take_snapshot(root, self._workers)
 
-        for root_dir, dirnames, filenames in os.walk(root):
+        if auto_deposit:
+            self.deposit_many(snapshot.files(), error=error)
 
-            # Iterate through objects in this directory...
-            dn = os.path.basename(root_dir)
-            directory[dn] = {}
+        return snapshot.tree()
 
-            # If it's a file, set "basename": "abspath to file"
-            for f in filenames:
-                filepath = os.path.join(root, f)
-                directory[dn].update({_default_shortcut(f): f})
+    def unwatch(self):
+        """Stop following filesystem changes started by :meth:`watch`."""
 
-                if auto_deposit:
-                    self.deposit(filepath, error=error)
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
 
-            # If it's a directory, go down a level and start over
-            if dirnames:
-                for d in dirnames:
-                    directory[dn].update(
-                        self.root_to_dict(os.path.join(root, d), error=error))
+    def watch(self, interval=None, backend=None):
+        """
+        Follow changes to the root from a background thread.
 
-            break  # We break here to stop the os.walk from doubling back
+        Files that are added, removed or renamed under the root are applied to
+        the shortcuts as they happen, without rescanning the whole tree.
 
-        return directory
+        Parameters
+        ----------
+        interval : float, (optional)
+            Seconds between checks when polling. Defaults to
+            ``fyda.options.WATCH_INTERVAL``.
+        backend : str, {'inotify', 'poll'}, (optional)
+            How to detect changes. If none is provided, inotify is used where
+            available, falling back to polling.
+
+        Returns
+        -------
+        self : DataBank
+        """
+
+        self.unwatch()
+        self._ensure_scanned()
+
+        if is_s3_url(self.root):  # Nothing to be notified by
+            if backend == 'inotify':
+                raise ValueError('S3 roots can only be watched by polling.')
+            backend = 'poll'
+
+        self._watcher = start_watcher(self, interval=interval,
+                                      backend=backend)
+        return self
 
     def withdraw(self, data_name, reader=None, kwarg_update_method='update',
+                 cache=True, stream=False, columns=None, filters=None,
                  **kwargs):
         """
         Automatically load data, given shortcut to file.
@@ -353,43 +1143,186 @@ class DataBank:
             A function that takes either a string or object with a "read"
             method.
         kwarg_update_method : str, optional {'update', 'overwrite', 'rc'}
+        cache : bool, optional
+            If False, bypass the result and disk caches.
+        stream : bool, optional
+            If True, return an iterator over chunks of the file instead of
+            loading it whole, so that memory use is bounded by the chunk
+            size. Passing a ``chunksize`` keyword argument implies it. See
+            Notes.
+        columns : list, optional
+            Columns to keep from tabular data, in order.
+        filters : list, optional
+            Rows to keep from tabular data, as ``(column, op, value)`` tuples
+            that must all hold, or a list of such lists of which any must
+            hold. ``op`` is one of ``==``, ``!=``, ``<``, ``<=``, ``>``,
+            ``>=``, ``in`` or ``not in``.
 
         Returns
         -------
         data
             Data as read by ``reader``.
+
+        Notes
+        -----
+        Chunks hold ``chunksize`` (by default
+        ``fyda.options.STREAM_CHUNKSIZE``) rows or lines. CSV and SAS files
+        are streamed by pandas as DataFrames, text files as lists of lines and
+        JSON Lines files as lists of parsed objects. Other readers are passed
+        the ``chunksize`` themselves. Streamed data is never cached.
+
+        ``columns`` and ``filters`` may also be given among the keyword
+        arguments of a shortcut in ``.fydarc``. Where the reader supports it
+        they are pushed down into it, so that only the data needed is parsed:
+        as ``usecols`` for CSV and Excel files, and as column selection and
+        row group pruning for Parquet, Feather and Arrow files. CSV files
+        being filtered and SAS files are read in chunks, each filtered as it
+        is read, so peak memory stays close to the size of the result.
+        Parquet files filtered by pyarrow get a fresh default index rather
+        than the row numbers of the whole file.
         """
 
-        filename = self._determine_path(data_name)
+        if columns is not None:
+            kwargs['columns'] = columns
+        if filters is not None:
+            kwargs['filters'] = filters
 
-        if kwarg_update_method != 'overwrite':
-            try:
-                rckwargs = _get_data_kwargs(data_name, load_config())
-            except (IndexError, KeyError):
-                rckwargs = {}
-            if kwarg_update_method == 'update':
-                kwargs.update(rckwargs)
-            elif kwarg_update_method == 'rc':
-                kwargs = rckwargs
+        filename, reader, kwargs = self._prepare(
+            data_name, reader, kwarg_update_method, kwargs)
 
-        if reader is None:
+        if stream and kwargs.get('chunksize') is None:
+            kwargs['chunksize'] = options.STREAM_CHUNKSIZE
+
+        return self._read(filename, reader, kwargs, cache)
+
+    def withdraw_many(self, data_names, executor='thread', max_workers=None,
+                      error='raise', reader=None,
+                      kwarg_update_method='update', cache=True, **kwargs):
+        """
+        Load several files concurrently.
+
+        All paths are resolved up front, then the files are read in a pool of
+        workers. A failure to load one file does not stop the others.
+
+        Parameters
+        ----------
+        data_names : iterable of str
+            Shortcuts or filenames.
+        executor : str, {'thread', 'process'}
+            Kind of worker pool. Threads suit readers that release the GIL
+            (most I/O, and the C parsers in pandas and NumPy); processes suit
+            readers doing pure Python work, but their results are pickled
+            back, the readers must be picklable and disk cache hits in the
+            workers are not counted by :meth:`cache_info`.
+        max_workers : int, (optional)
+            Size of the pool, defaulting to that of
+            :mod:`concurrent.futures`.
+        error : str, {'raise', 'ignore'}
+            Whether to raise a :class:`fyda.errorhandling.BatchLoadError`
+            once every file has been tried if any of them failed, or to
+            leave the failures out of the result.
+        reader, kwarg_update_method, cache, kwargs
+            As in :meth:`withdraw`, applied to every file.
+
+        Returns
+        -------
+        data : dict
+            Mapping of each name to its data, in the order given.
+        """
+
+        if executor not in ('thread', 'process'):
+            raise ValueError('Executor "{}" not understood.'.format(executor))
+
+        data_names = list(data_names)
+        results, errors, jobs = {}, {}, {}
+
+        for name in data_names:
+            if name in jobs or name in errors:
+                continue
             try:
-                reader = self.readers[data_name]
-            except KeyError:
-                reader = _pick_reader(filename)
+                jobs[name] = self._prepare(name, reader, kwarg_update_method,
+                                           dict(kwargs))
+            except Exception as e:
+                errors[name] = e
 
-        return _decode(reader, filename, **kwargs)
+        if executor == 'thread':
+            pool = ThreadPoolExecutor(max_workers)
+        else:
+            pool = ProcessPoolExecutor(max_workers)
+
+        with pool:
+            futures = {}
+            for name, (filename, rdr, kw) in jobs.items():
+                if executor == 'thread':
+                    futures[name] = (pool.submit(self._read, filename, rdr,
+                                                 kw, cache), None)
+                    continue
+                # The result cache lives in this process, so check it here
+                key = self._cache_key(filename, rdr, kw, cache)
+                if key is not None:
+                    found, data = self._cache.get(key)
+                    if found:
+                        results[name] = data
+                        continue
+                futures[name] = (pool.submit(
+                    _decode_cached, rdr, filename, kw,
+                    self._disk_cache if cache else None, self._schemas,
+                    self._etag(filename)), key)
+
+            for name, (future, key) in futures.items():
+                try:
+                    data = future.result()
+                except Exception as e:
+                    errors[name] = e
+                    continue
+                if key is not None:
+                    data = self._cache.put(key, data)
+                results[name] = data
+
+        results = {name: results[name] for name in data_names
+                   if name in results}
+
+        if errors and error == 'raise':
+            raise BatchLoadError(results, errors)
+
+        return results
 
 
 # -----------------------------------------------------------------------------
 # Module-level library
 # -----------------------------------------------------------------------------
+def _batches(items, size):
+    """Group an iterable into lists of ``size`` items."""
+
+    batch = []
+
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+def _closing(chunks, *files):
+    """Iterate through ``chunks``, then close ``files``."""
+
+    try:
+        for chunk in chunks:
+            yield chunk
+    finally:
+        for fileobj in files:
+            fileobj.close()
+
+
 def _check_bucket(bucket_name):
     """Sanity check on S3 bucket configuration."""
 
     if bucket_name is None:
         try:
-            pc = load_config()
+            pc = _cached_config()
             bucket_name = pc['directories']['s3_bucket'][LOCATION]
         except KeyError:
             msg = ("Can't determine s3 bucket name. Either pass the "
@@ -401,31 +1334,292 @@ def _check_bucket(bucket_name):
 
 
 def _decode(reader, filename, **kwargs):
-    """Successively try different methods to open ``filename`` with
-    ``reader``."""
+    """Open ``filename`` with ``reader``, passing it the path, an open file or
+    nothing according to :func:`fyda.readers.reader_mode`."""
 
-    try:  # First check if the reader is an open ``read`` method.
-        return reader(**kwargs)
-    except TypeError:
-        pass
+    if is_s3_url(filename):
+        bucket, key = split_url(filename)
+        return load_s3(key, bucket, reader, **kwargs)
+
+    if split_member(filename) is not None:
+        return _decode_member(reader, filename, kwargs)
+
+    codec = split_compression(filename)[1]
+    if codec is not None:
+        return _decode_compressed(reader, filename, filename, codec, kwargs)
+
+    mode = reader_mode(reader)
 
-    try:  # Next possibility is that the reader just needs a string reference
+    if mode == 'call':  # e.g. the ``read`` method of an open file
+        return reader(**kwargs)
+    if mode == 'path':
         return reader(filename, **kwargs)
-    except TypeError:
-        pass
+    if mode == 'binary':
+        with open(filename, 'rb') as fileobj:
+            return reader(fileobj, **kwargs)
 
-    try:  # Finally, check if we can open the string reference to read.
+    try:
         with open(filename, 'r') as fileobj:
-            return reader(fileobj, **kwargs)
+            data = reader(fileobj, **kwargs)
     except UnicodeDecodeError:
+        if mode == 'text':
+            raise
+        # Found out that the reader wants bytes, so skip the text attempt from
+        # now on
+        _remember_mode(reader, 'binary')
         with open(filename, 'rb') as fileobj:
             return reader(fileobj, **kwargs)
 
+    if mode == 'handle':
+        _remember_mode(reader, 'text')
+
+    return data
+
+
+def _decode_cached(reader, filename, kwargs, disk_cache=None, schemas=None,
+                   stamp=None):
+    """Load ``filename`` through ``disk_cache``, if given and it applies to
+    the file's format, and with the types learned in ``schemas`` for the
+    version ``stamp`` of the file (see :func:`_decode_schema`)."""
+
+    key = None
+    extension = os.path.splitext(split_compression(filename)[0])[-1].lower()
+
+    if disk_cache is not None and extension in options.DISK_CACHE_EXTENSIONS:
+        key = disk_key(filename, _reader_name(reader), kwargs)
+    if key is not None:
+        found, data = disk_cache.get(key)
+        if found:
+            return data
+
+    if schemas is None:
+        data = _decode_pushdown(reader, filename, kwargs)
+    else:
+        data = _decode_schema(reader, filename, kwargs, schemas, stamp)
+
+    if key is not None:
+        disk_cache.put(key, data)
+
+    return data
+
+
+def _decode_compressed(reader, source, filename, codec, kwargs):
+    """
+    Open a compressed file with ``reader``, decompressing it as it is read.
+
+    ``source`` is the path or a binary file object, and ``filename`` the name
+    of the file. The reader gets a file object, opened in text mode for text
+    readers.
+    """
+
+    mode = reader_mode(reader)
+
+    if mode == 'call':
+        return reader(**kwargs)
+
+    if reader is pd.read_sas:  # Can't be inferred without a file name
+        kwargs.setdefault('format', os.path.splitext(
+            split_compression(filename)[0])[-1][1:])
+
+    chunked = kwargs.get('chunksize') is not None or kwargs.get('iterator')
+    fileobj = open_compressed(source, codec,
+                              sequential=chunked or reader in _SEQUENTIAL)
+
+    if mode == 'text':
+        fileobj = io.TextIOWrapper(fileobj, encoding='utf-8')
+
+    try:
+        data = reader(fileobj, **kwargs)
+    except BaseException:
+        fileobj.close()
+        raise
+
+    if chunked:
+        return _closing(data, fileobj)
+
+    fileobj.close()
+
+    return data
+
+
+def _decode_member(reader, filename, kwargs):
+    """
+    Open a file inside an archive with ``reader``, reading it straight out of
+    the archive.
+
+    The reader gets a binary file object, or a text one for text readers, as
+    for S3 objects. Compressed members are decompressed as they are read.
+    """
+
+    mode = reader_mode(reader)
+
+    if mode == 'call':
+        return reader(**kwargs)
+
+    if reader is pd.read_sas:  # Can't be inferred without a file name
+        kwargs.setdefault('format', os.path.splitext(
+            split_compression(filename)[0])[-1][1:])
+
+    codec = split_compression(filename)[1]
+    chunked = kwargs.get('chunksize') is not None or kwargs.get('iterator')
+    member = open_member(filename, sequential=chunked or codec is not None
+                         or reader in _SEQUENTIAL)
+
+    try:
+        if codec is not None:
+            data = _decode_compressed(reader, member, filename, codec, kwargs)
+        elif mode == 'text':
+            data = reader(io.TextIOWrapper(member, encoding='utf-8'),
+                          **kwargs)
+        else:
+            data = reader(member, **kwargs)
+    except BaseException:
+        member.close()
+        raise
+
+    if chunked:
+        return _closing(data, member)
+
+    member.close()
+
+    return data
+
+
+def _decode_pushdown(reader, filename, kwargs):
+    """Load ``filename``, applying any ``columns`` and ``filters`` in
+    ``kwargs`` as described in :meth:`DataBank.withdraw`."""
+
+    kwargs, columns, filters = split_pushdown(kwargs)
+
+    if columns is None and filters is None:
+        return _decode(reader, filename, **kwargs)
+
+    kwargs, chunked = pushdown_kwargs(reader, kwargs, columns, filters)
+
+    if not chunked:
+        return apply_pushdown(_decode(reader, filename, **kwargs), columns,
+                              filters)
+
+    kwargs.setdefault('chunksize', options.STREAM_CHUNKSIZE)
+    chunks = [apply_pushdown(chunk, columns, filters)
+              for chunk in _decode(reader, filename, **kwargs)]
+
+    if not chunks:  # Empty file
+        return pd.DataFrame(columns=columns)
+
+    return pd.concat(chunks)
+
+
+def _decode_schema(reader, filename, kwargs, schemas, stamp=None):
+    """
+    Load a CSV file with the column types learned for it, learning them
+    on a first full load.
+
+    Schemas are tied to the version of the file they were learned on,
+    identified by ``stamp`` (an S3 object's ETag) or else by the file's
+    modification time and size, and relearned whenever it changes. Files
+    with no such stamp are loaded without one.
+    """
+
+    if reader not in (read_csv, pd.read_csv) or \
+            any(kwargs.get(k) is not None for k in _SCHEMA_EXCLUSIVE):
+        return _decode_pushdown(reader, filename, kwargs)
+
+    if stamp is None:
+        stamp = file_stamp(filename)
+    if stamp is None:
+        return _decode_pushdown(reader, filename, kwargs)
+
+    schema = schemas.get(filename, stamp)
+
+    if schema is not None:
+        try:
+            data = _decode_pushdown(reader, filename,
+                                    schema_kwargs(schema, kwargs))
+        except (ValueError, TypeError, OverflowError):
+            pass  # The file doesn't fit the schema after all
+        else:
+            return apply_schema(data, schema)
+
+    data = _decode_pushdown(reader, filename, kwargs)
+
+    if not isinstance(data, pd.DataFrame) or \
+            any(kwargs.get(k) is not None for k in _SCHEMA_PARTIAL):
+        return data
+
+    schema = learn_schema(data)
+    before = int(data.memory_usage(deep=True).sum())
+    data = apply_schema(data, schema)
+    schema['before'] = before
+    schema['after'] = int(data.memory_usage(deep=True).sum())
+    schemas.put(filename, stamp, schema)
+
+    return data
+
 
 def _default_shortcut(filepath):
-    """Get the default shortcut name for a file."""
+    """Get the default shortcut name for a file, without its extension and
+    any compression suffix."""
+
+    name = split_compression(os.path.basename(filepath))[0]
+
+    return os.path.splitext(name)[0]
+
+
+def _iter_lines(source):
+    """Lines of a text file given by path or binary file object, without
+    their line endings."""
+
+    if isinstance(source, str):
+        with open(source, 'r') as fileobj:
+            for line in fileobj:
+                yield line.rstrip('\r\n')
+    else:
+        for line in codecs.getreader('utf-8')(source):
+            yield line.rstrip('\r\n')
+
+
+def _member_tree(members):
+    """Nested dictionary of archive members, as in
+    :meth:`DataBank.root_to_dict`."""
+
+    tree = {}
+
+    for name in members:
+        *dirs, base = name.split('/')
+        node = tree
+        for d in dirs:
+            node = node.setdefault(d, {})
+        node[_default_shortcut(base)] = base
 
-    return os.path.splitext(os.path.basename(filepath))[0]
+    return tree
+
+
+def _collision_level(filepaths):
+    """
+    Smallest encoding level at which every file in a collision group gets a
+    unique shortcut.
+
+    Sorting the reversed path components puts the files sharing the longest
+    trailing portion of their paths next to each other, so only neighbours
+    need to be compared.
+    """
+
+    if len(filepaths) < 2:
+        return 0
+
+    keys = sorted(filepath.split(os.sep)[::-1] for filepath in filepaths)
+    shared = 0
+
+    for this, that in zip(keys, keys[1:]):
+        common = 0
+        for a, b in zip(this, that):
+            if a != b:
+                break
+            common += 1
+        shared = max(shared, common)
+
+    return shared + 1
 
 
 def _encode_shortcut(filepath, encoding_level=0):
@@ -456,6 +1650,114 @@ def _encode_shortcut(filepath, encoding_level=0):
     return shortcut
 
 
+def _shared_bank(root=None):
+    """
+    Get the process-wide :class:`DataBank` for ``root`` and the current
+    configuration file, building it on first use.
+
+    A bank is rebuilt when ``.fydarc`` is modified (which may move the root).
+    Scanned banks over local roots are refreshed on every use, which costs
+    one ``stat`` per directory, so files added anywhere in the tree update
+    the shortcuts they collide with. S3 banks, which would have to be listed
+    again, and lazy banks that haven't scanned their root are only refreshed
+    when the top level of the root changes, or by :func:`refresh`.
+    """
+
+    conf = _get_conf()
+    key = (None if root is None else _root_key(root), conf)
+
+    try:
+        stamp = os.stat(conf).st_mtime_ns
+    except OSError:
+        stamp = None
+
+    with _BANKS_LOCK:
+        db, bank_stamp, root_mtime = _BANKS.get(key, (None, None, None))
+
+        if db is None or bank_stamp != stamp:
+            db = DataBank(root)
+            root_mtime = _root_mtime(db.root)
+            _BANKS[key] = _BANKS[(_root_key(db.root), conf)] = \
+                (db, stamp, root_mtime)
+            return db
+
+        scanned = db._snapshot is not None and not is_s3_url(db.root)
+        if not scanned:
+            current = _root_mtime(db.root)
+            if current != root_mtime:
+                db.refresh()
+                _BANKS[key] = (db, stamp, current)
+
+    if scanned:
+        db.refresh()
+
+    return db
+
+
+def _root_join(root, relative):
+    """Absolute path or URL of ``relative`` under the data root."""
+
+    if is_s3_url(root):
+        return root + '/' + relative.replace(os.sep, '/').lstrip('/')
+
+    return os.path.abspath(os.path.join(root, relative))
+
+
+def _root_key(root):
+    """Normalized data root, identifying it in the index and among the
+    shared banks."""
+
+    if is_s3_url(root):
+        return root.rstrip('/')
+
+    return os.path.abspath(root)
+
+
+def _root_mtime(root):
+    """Modification time of the data root, or None if it can't be read."""
+
+    try:
+        return os.stat(root).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _root_path(setting):
+    """Data root given by the ``root`` setting in .fydarc, relative to the
+    file unless it is absolute or a URL."""
+
+    if is_s3_url(setting):
+        return setting
+
+    return os.path.abspath(os.path.join(os.path.dirname(_get_conf()),
+                                        setting))
+
+
+def _cached_config(filepath=None):
+    """Parsed configuration shared between callers; must not be modified.
+    See :func:`load_config`."""
+
+    if filepath is None:
+        filepath = _get_conf()
+
+    st = os.stat(filepath)
+    stamp = (st.st_mtime_ns, st.st_size)
+
+    try:
+        cached_stamp, conf = _CONFIG_CACHE[filepath]
+        if cached_stamp == stamp:
+            return conf
+    except KeyError:
+        pass
+
+    with open(filepath, 'r') as stream:
+        conf = yaml.load(stream, Loader=_YAML_LOADER)
+
+    _CONFIG_CACHE[filepath] = (stamp, conf)
+
+    return conf
+
+
 def _check_location(directory_container):
     """Decide between str and list operations"""
 
@@ -473,6 +1775,27 @@ def _get_directory(shortcut, config):
     return _check_location(config['directories'][shortcut])
 
 
+def _get_setting(name, default=None):
+    """Value of ``name`` under ``directories`` in .fydarc, or ``default`` if
+    it isn't set (or there is no .fydarc)."""
+
+    try:
+        return _cached_config()['directories'][name]
+    except (OSError, KeyError, TypeError):
+        return default
+
+
+def _disk_cache_dir(setting, default=None):
+    """Folder for the disk cache, given the ``disk_cache`` setting, or for
+    another cache whose folder defaults to ``default``."""
+
+    if setting is True:
+        setting = default or options.DISK_CACHE_DIR
+
+    return os.path.abspath(os.path.join(os.path.dirname(_get_conf()),
+                                        os.path.expanduser(setting)))
+
+
 def _get_data_location(shortcut, config):
     """Get the location of a data shortcut."""
 
@@ -498,42 +1821,173 @@ def _load_config(filepath=None):
     return load_config(filepath)
 
 
+def _object_cache():
+    """Local S3 object cache configured by .fydarc, or None if disabled."""
+
+    setting = _get_setting('s3_cache', options.S3_CACHE)
+    if not setting:
+        return None
+
+    directory = _disk_cache_dir(setting, options.S3_CACHE_DIR)
+    cache = _OBJECT_CACHES.get(directory)
+
+    if cache is None:
+        cache = _OBJECT_CACHES.setdefault(
+            directory, ObjectCache(directory, options.S3_CACHE_BYTES))
+
+    cache.max_bytes = int(_get_setting('s3_cache_bytes',
+                                       options.S3_CACHE_BYTES))
+    cache.ttl = float(_get_setting('s3_cache_ttl', options.S3_CACHE_TTL))
+
+    return cache
+
+
 def _pick_reader(filename, error='raise'):
     """Reader selection based on ``filename`` extension."""
 
-    extension = os.path.splitext(filename)[-1]
-
-    if extension in ['.xlsx']:
-        return pd.read_excel
-    if extension == '.csv':
-        return pd.read_csv
-    if extension in ['.pickle', '.pkl']:
-        return pickle.load
-    if extension in ['.npy', '.npz']:
-        return np.load
-    if extension == '.json':
-        return json.load
-    if extension in ['.sas7bdat', '.xport']:
-        return pd.read_sas
-    if extension in ['.yml', '.yaml']:
-        def open_reader(x):
-            with open(x, 'r') as fileobj:
-                return yaml.safe_load(fileobj)
-        return open_reader
-    if extension == '.txt':
-        def open_reader(x):
-            with open(x, 'r') as fileobj:
-                return fileobj.read()
-        return open_reader
-
-    if error == 'ignore':
-        return
+    reader = pick_reader(filename)
+
+    if reader is not None or error == 'ignore':
+        return reader
 
     # TODO sometimes incorrect shortcut settings get found here, saying
     #   "extension '' not implemented yet". This kind of error should be found
     #   earlier than here.
     raise NotImplementedError("Extension '%s' not implemented yet."
-                              % extension)
+                              % os.path.splitext(filename)[-1])
+
+
+def _read_json_lines(filename):
+    """Read a JSON Lines file into a list."""
+
+    return [json.loads(line) for line in _iter_lines(filename) if line]
+
+
+def _read_text(filename):
+    """Read a plain text file, given by path or binary file object, into a
+    string."""
+
+    if not isinstance(filename, str):
+        return filename.read().decode('utf-8')
+
+    with open(filename, 'r') as fileobj:
+        return fileobj.read()
+
+
+def _read_yaml(filename):
+    """Read a YAML file, given by path or file object."""
+
+    if not isinstance(filename, str):
+        return yaml.load(filename, Loader=_YAML_LOADER)
+
+    with open(filename, 'r') as fileobj:
+        return yaml.load(fileobj, Loader=_YAML_LOADER)
+
+
+def _reader_name(reader):
+    """Importable ``module:qualname`` reference to ``reader``, or None if it
+    cannot be imported by name (lambdas, closures, bound methods, ...)."""
+
+    if reader is None:
+        return None
+
+    name = '{}:{}'.format(getattr(reader, '__module__', None),
+                          getattr(reader, '__qualname__', None))
+
+    try:
+        if _resolve_reader(name) is reader:
+            return name
+    except (ImportError, AttributeError, ValueError):
+        pass
+
+    return None
+
+
+def _registry_picks():
+    """Names of the readers currently picked for each extension, to tell
+    whether stored reader choices are still valid."""
+
+    return {extension: _reader_name(reader)
+            for extension, reader in _picks().items()}
+
+
+def _resolve_reader(name):
+    """Import the reader referenced by :func:`_reader_name`."""
+
+    module, _, qualname = name.partition(':')
+    obj = importlib.import_module(module)
+
+    for attr in qualname.split('.'):
+        obj = getattr(obj, attr)
+
+    return obj
+
+
+def _s3_client():
+    """Pooled S3 client configured by .fydarc."""
+
+    return get_client(_get_setting('s3_profile'), _get_setting('s3_region'),
+                      _get_setting('s3_endpoint_url'))
+
+
+def _stream(reader, source, kwargs):
+    """
+    Iterator over chunks of ``source``, a path or a binary file object, as
+    described in :meth:`DataBank.withdraw`.
+    """
+
+    kwargs, columns, filters = split_pushdown(kwargs)
+
+    if columns is not None or filters is not None:
+        kwargs, _ = pushdown_kwargs(reader, kwargs, columns, filters)
+        return (apply_pushdown(chunk, columns, filters)
+                for chunk in _stream(reader, source, kwargs))
+
+    chunksize = kwargs.pop('chunksize')
+
+    if is_s3_url(source):
+        bucket, key = split_url(source)
+        return load_s3(key, bucket, reader, chunksize=chunksize, **kwargs)
+
+    member = split_member(source) is not None
+    codec = split_compression(source)[1] if isinstance(source, str) else None
+
+    if member or codec is not None:
+        if reader not in (_read_text, _read_json_lines):
+            return _decode(reader, source, chunksize=chunksize, **kwargs)
+        files = [open_member(source, sequential=True)] if member else []
+        if codec is not None:
+            files.append(open_compressed(files[-1] if member else source,
+                                         codec, sequential=True))
+        return _closing(_stream(reader, files[-1], dict(
+            kwargs, chunksize=chunksize)), *reversed(files))
+
+    if reader is _read_text:
+        return _batches(_iter_lines(source), chunksize)
+    if reader is _read_json_lines:
+        return _batches((json.loads(line) for line in _iter_lines(source)
+                         if line), chunksize)
+
+    if isinstance(source, str) and \
+            reader not in (read_csv, pd.read_csv, pd.read_sas):
+        return _decode(reader, source, chunksize=chunksize, **kwargs)
+
+    return reader(source, chunksize=chunksize, **kwargs)
+
+
+def _take_snapshot(root, workers, record=None):
+    """Scan ``root``, or rebuild its snapshot from an index ``record``, with
+    the S3 client configured in .fydarc for S3 roots."""
+
+    if not is_s3_url(root):
+        if record is None:
+            return DirectorySnapshot.scan(root, workers)
+        return DirectorySnapshot.from_dict(root, record, workers)
+
+    if record is None:
+        return S3Snapshot.scan(root, workers, _s3_client())
+
+    return S3Snapshot.from_dict(root, record, workers, _s3_client())
 
 
 def _write_config(config):
@@ -546,6 +2000,49 @@ def _write_config(config):
 # -----------------------------------------------------------------------------
 # Public library
 # -----------------------------------------------------------------------------
+async def aload(file_name, **kwargs):
+    """
+    Asynchronous version of :func:`load`, using
+    :meth:`DataBank.awithdraw`.
+    """
+
+    db = await run_blocking(_shared_bank)
+
+    try:
+        return await db.awithdraw(file_name, **kwargs)
+    except (NoShortcutError, FileNotFoundError):
+        if not await run_blocking(db.refresh):
+            raise
+
+    return await db.awithdraw(file_name, **kwargs)
+
+
+async def aload_s3(file_name, bucket_name=None, reader=None, **kwargs):
+    """
+    Asynchronous version of :func:`load_s3`.
+
+    Objects are downloaded in the event loop's default executor, at most
+    ``fyda.options.ASYNC_CONCURRENCY`` at once per loop. Concurrent requests
+    for the same object with the same reader and arguments share a single
+    download, each receiving its own copy of the data.
+    """
+
+    bucket_name = _check_bucket(bucket_name)
+
+    try:
+        key = ('s3', bucket_name, file_name, reader, _freeze(kwargs))
+        hash(key)
+    except TypeError:
+        key = None
+
+    if kwargs.get('stream') or kwargs.get('chunksize') is not None:
+        key = None  # Iterators can't be shared
+
+    return await run_coalesced(
+        key, functools.partial(load_s3, file_name, bucket_name, reader,
+                               **kwargs))
+
+
 def data_path(shortcut, root=None):
     """
     Return the absolute path to the file referenced by ``shortcut``.
@@ -563,18 +2060,28 @@ def data_path(shortcut, root=None):
         Absolute path to file.
     """
 
-    db = DataBank(root)
+    db = _shared_bank(root)
 
     # TODO all this logic should be inside the DataBank
-    if shortcut in db.shortcuts:
-        return os.path.abspath(db.shortcuts[shortcut])
-    else:
+    try:
+        return os.path.abspath(db._lookup(shortcut))
+    except KeyError:
+        pass
+
+    try:
+        return os.path.abspath(
+            os.path.join(db.root,
+                         _get_data_location(shortcut, _cached_config())))
+    except KeyError:
+        pass
+
+    if db.refresh():  # The file may be new since the bank was built
         try:
-            return os.path.abspath(
-                os.path.join(db.root,
-                             _get_data_location(shortcut, load_config())))
+            return os.path.abspath(db._lookup(shortcut))
         except KeyError:
-            raise NoShortcutError(shortcut)
+            pass
+
+    raise NoShortcutError(shortcut)
 
 
 def dir_path(shortcut, root=None):
@@ -594,8 +2101,8 @@ def dir_path(shortcut, root=None):
         Absolute path to directory.
     """
 
-    db = DataBank(root)
-    pc = load_config()
+    db = _shared_bank(root)
+    pc = _cached_config()
 
     path = _get_directory(shortcut, pc)
     if path[0] == '~':
@@ -604,6 +2111,29 @@ def dir_path(shortcut, root=None):
     return os.path.abspath(os.path.join(db.root, path))
 
 
+def invalidate(root=None):
+    """
+    Discard shared :class:`DataBank` objects so that the next call to
+    :func:`load`, :func:`data_path` or :func:`dir_path` rebuilds them.
+
+    Parameters
+    ----------
+    root : str, (optional)
+        Root directory of the bank to discard. If none is provided, every
+        shared bank is discarded.
+    """
+
+    with _BANKS_LOCK:
+        if root is None:
+            _BANKS.clear()
+            return
+
+        root = _root_key(root)
+        for key, (db, _, _) in list(_BANKS.items()):
+            if _root_key(db.root) == root:
+                del _BANKS[key]
+
+
 def load(file_name, **kwargs):
     """
     Load data intelligently.
@@ -614,23 +2144,78 @@ def load(file_name, **kwargs):
         Files to load. These can be shortcuts or file paths.
     """
 
-    db = DataBank()
+    db = _shared_bank()
+
+    try:
+        return db.withdraw(file_name, **kwargs)
+    except (NoShortcutError, FileNotFoundError):
+        # The file may have appeared where the shared bank doesn't look for
+        # changes on its own, see _shared_bank
+        if not db.refresh():
+            raise
+
     return db.withdraw(file_name, **kwargs)
 
 
-def load_config(filepath=None):
-    """Return fyda configuration file ('.fydarc') using YAML."""
+def load_many(file_names, executor='thread', max_workers=None, error='raise',
+              **kwargs):
+    """
+    Load several files concurrently.
 
-    if filepath is None:
-        filepath = _get_conf()
+    Parameters
+    ----------
+    file_names : iterable of str or path-like
+        Files to load. These can be shortcuts or file paths.
+    executor, max_workers, error, kwargs
+        As in :meth:`DataBank.withdraw_many`.
 
-    with open(filepath, 'r') as stream:
-        conf = yaml.safe_load(stream)
+    Returns
+    -------
+    data : dict
+        Mapping of each name to its data, in the order given.
+    """
 
-    return conf
+    db = _shared_bank()
+    file_names = list(file_names)
+
+    try:
+        return db.withdraw_many(file_names, executor, max_workers, **kwargs)
+    except BatchLoadError as e:
+        results, errors = e.results, e.errors
+
+    missing = [name for name, err in errors.items()
+               if isinstance(err, (NoShortcutError, FileNotFoundError))]
+
+    # The files may have appeared where the shared bank doesn't look for
+    # changes on its own, see _shared_bank
+    if missing and db.refresh():
+        retried = db.withdraw_many(missing, executor, max_workers,
+                                   error='ignore', **kwargs)
+        results.update(retried)
+        for name in retried:
+            del errors[name]
+
+    results = {name: results[name] for name in file_names if name in results}
+
+    if errors and error == 'raise':
+        raise BatchLoadError(results, errors)
+
+    return results
+
+
+def load_config(filepath=None):
+    """
+    Return fyda configuration file ('.fydarc') using YAML.
+
+    The parsed file is cached and only read again once its modification time
+    or size changes, so repeated calls cost a single ``stat``.
+    """
+
+    return copy.deepcopy(_cached_config(filepath))
 
 
-def load_s3(file_name, bucket_name=None, reader=None, **kwargs):
+def load_s3(file_name, bucket_name=None, reader=None, stream=False,
+            client=None, cache=True, **kwargs):
     """
     Read a file from S3.
 
@@ -644,6 +2229,17 @@ def load_s3(file_name, bucket_name=None, reader=None, **kwargs):
     reader : callable, (optional)
         Function capable of reading the file. If none is passed, one will be
         automatically assigned based on the file extension.
+    stream : bool, (optional)
+        If True, return an iterator over chunks read straight from the object
+        body as it downloads, as described in :meth:`DataBank.withdraw`.
+        Passing a ``chunksize`` keyword argument implies it.
+    client : botocore.client.S3, (optional)
+        Client to download with. If none is passed, a pooled client from
+        :func:`fyda.s3.get_client` is used, configured by ``s3_profile``,
+        ``s3_region`` and ``s3_endpoint_url`` under ``directories`` in
+        ``.fydarc`` or the matching ``fyda.options``.
+    cache : bool, (optional)
+        If False, bypass the local object cache.
     kwargs
         Additional keyword arguments to pass to file reader.
 
@@ -651,19 +2247,93 @@ def load_s3(file_name, bucket_name=None, reader=None, **kwargs):
     -------
     data
         As read by reader object
+
+    Notes
+    -----
+    Objects larger than ``fyda.options.S3_PART_SIZE`` are downloaded in
+    byte ranges, ``fyda.options.S3_CONCURRENCY`` at a time, as described in
+    :func:`fyda.s3.open_object`. Readers that parse their input front to
+    back, like those of CSV, JSON and pickle files, as well as streams,
+    start parsing as soon as the first part arrives. Other readers get the
+    whole object, held in memory or, above ``fyda.options.S3_SPILL_BYTES``,
+    in a temporary file.
+
+    Setting ``s3_cache`` under ``directories`` in ``.fydarc`` (or
+    ``fyda.options.S3_CACHE``) to True, or to a folder relative to
+    ``.fydarc``, keeps a local copy of every object read (see
+    :class:`fyda.s3.ObjectCache`). Readers are then given the path to the
+    copy, so memory-mapping readers map it rather than reading it. A copy is
+    reused as long as its ETag matches that of the object, which is checked
+    with a ``HEAD`` request unless the copy was checked less than
+    ``s3_cache_ttl`` seconds ago. ``s3_cache_bytes`` caps the size of the
+    folder, evicting the least recently used copies first.
     """
-    import boto3
     bucket_name = _check_bucket(bucket_name)
 
     if reader is None:
         reader = _pick_reader(file_name)
 
-    s3 = boto3.resource('s3')
-    bucket = s3.Bucket(bucket_name)
-
-    with BytesIO() as data:
-        bucket.download_fileobj(file_name, data)
-        data.seek(0)  # move back to the beginning after writing
+    if client is None:
+        client = _s3_client()
+
+    codec = split_compression(file_name)[1]
+    object_cache = _object_cache() if cache else None
+    path = first_part = None
+    if object_cache is not None:
+        path, first_part = object_cache.locate(client, bucket_name, file_name)
+
+    if stream or kwargs.get('chunksize') is not None:
+        if kwargs.get('chunksize') is None:
+            kwargs['chunksize'] = options.STREAM_CHUNKSIZE
+        if path is not None:
+            return _stream(reader, path, kwargs)
+        if reader is pd.read_sas:  # Can't be inferred without a file name
+            kwargs.setdefault('format', os.path.splitext(
+                split_compression(file_name)[0])[-1][1:])
+        files = [open_object(client, bucket_name, file_name,
+                             sequential=True, first_part=first_part)]
+        try:
+            if codec is not None:
+                files.append(open_compressed(files[0], codec,
+                                             sequential=True))
+            chunks = _stream(reader, files[-1], kwargs)
+        except BaseException:
+            for fileobj in reversed(files):
+                fileobj.close()
+            raise
+        return _closing(chunks, *reversed(files))
+
+    if path is not None:
+        return _decode(reader, path, **kwargs)
+
+    sequential = reader in _SEQUENTIAL
+
+    with open_object(client, bucket_name, file_name, sequential,
+                     first_part) as data:
+        if codec is not None:
+            return _decode_compressed(reader, data, file_name, codec, kwargs)
         obj = reader(data, **kwargs)
 
     return obj
+
+
+def refresh(root=None):
+    """
+    Update the shared :class:`DataBank` used by :func:`load`,
+    :func:`data_path` and :func:`dir_path` for files added or removed on disk.
+
+    Parameters
+    ----------
+    root : str, (optional)
+        Root directory of the bank to refresh. If none is provided, every
+        shared bank is refreshed.
+    """
+
+    with _BANKS_LOCK:
+        banks = {id(db): db for db, _, _ in _BANKS.values()
+                 if root is None
+                 or _root_key(db.root) == _root_key(root)}
+
+        for db in banks.values():
+            db.refresh()
+
@@ -0,0 +1,508 @@
+"""In-memory caching of loaded data."""
+import copy
+import hashlib
+import importlib.util
+import json
+import os
+import pickle
+import sys
+import tempfile
+import threading
+import warnings
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import pandas as pd
+
+from . import options
+from .archives import split_member
+
+
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+CacheInfo = namedtuple('CacheInfo',
+                       ['hits', 'misses', 'entries', 'nbytes', 'max_bytes'])
+
+_MODES = ('copy', 'readonly')
+
+# Sidecar formats, in the order they are looked up
+_PARQUET = '.parquet'
+_NPY = '.npy'
+_PICKLE = '.pkl'
+_SUFFIXES = (_PARQUET, _NPY, _PICKLE)
+
+
+# -----------------------------------------------------------------------------
+# Classes
+# -----------------------------------------------------------------------------
+class ResultCache:
+    """
+    Least-recently-used cache of loaded data, bounded by memory footprint.
+
+    Parameters
+    ----------
+    max_bytes : int
+        Memory budget. The least recently used entries are evicted once the
+        total size of the cached objects goes over it, and objects larger
+        than the whole budget are never stored.
+    mode : str, {'copy', 'readonly'}
+        How cached objects are protected from changes made by callers.
+        ``'copy'`` hands out a deep copy on every hit. ``'readonly'`` hands
+        out NumPy arrays flagged as non-writeable and shallow copies of pandas
+        objects, which are only protected when pandas' Copy-on-Write mode is
+        enabled; other objects are returned as is.
+    """
+
+    def __init__(self, max_bytes, mode='copy'):
+
+        if mode not in _MODES:
+            raise ValueError('Cache mode "{}" not understood.'.format(mode))
+
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self._entries = OrderedDict()  # key -> (value, nbytes)
+        self._nbytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Look up ``key``, counting a hit or miss.
+
+        Returns
+        -------
+        found : bool
+            Whether the key was cached.
+        value
+            Protected version of the cached object, or None.
+        """
+
+        with self._lock:
+            try:
+                value, _ = self._entries[key]
+            except KeyError:
+                self._misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self._hits += 1
+
+        return True, self._protect(value)
+
+    def put(self, key, value):
+        """Store ``value`` under ``key`` and return the version of it the
+        caller should use."""
+
+        if not _cacheable(value):
+            return value
+
+        nbytes = sizeof(value)
+
+        if nbytes > self.max_bytes:
+            return value
+
+        if self.mode == 'readonly' and isinstance(value, np.ndarray):
+            value.flags.writeable = False
+
+        with self._lock:
+            if key in self._entries:
+                self._nbytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, nbytes)
+            self._nbytes += nbytes
+            while self._nbytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._nbytes -= evicted
+
+        return self._protect(value)
+
+    def clear(self):
+        """Remove every entry and reset the statistics."""
+
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = self._hits = self._misses = 0
+
+    def info(self):
+        """Hit and miss statistics, as a :class:`CacheInfo`."""
+
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, len(self._entries),
+                             self._nbytes, self.max_bytes)
+
+    def _protect(self, value):
+        """Version of a cached object that is safe to hand out."""
+
+        return protect(value, self.mode)
+
+
+class DiskCache:
+    """
+    Directory of parsed data stored in fast binary formats, so that slow
+    parsers (CSV, Excel, SAS) only run once per version of a file.
+
+    DataFrames are stored as Parquet when pyarrow is installed, arrays as
+    ``.npy`` and anything else that can be pickled as a pickle. The cache
+    persists between sessions and may be shared by several processes.
+
+    Parameters
+    ----------
+    directory : str
+        Folder holding the sidecar files. It is created when first written to.
+    max_bytes : int
+        Size cap for the folder. The least recently read sidecars are deleted
+        once the total size goes over it.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):  # Sent along to worker processes
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Read the sidecar stored under ``key``, counting a hit or miss.
+
+        Returns
+        -------
+        found : bool
+            Whether a readable sidecar exists.
+        value
+            The stored data, or None.
+        """
+
+        for suffix in _SUFFIXES:
+            path = self._path(key, suffix)
+            try:
+                value = _read_sidecar(path, suffix)
+            except FileNotFoundError:
+                continue
+            except Exception:  # Corrupt or written by an incompatible version
+                _remove(path)
+                continue
+            try:
+                os.utime(path)  # Mark as recently used for eviction
+            except OSError:
+                pass
+            with self._lock:
+                self._hits += 1
+            return True, value
+
+        with self._lock:
+            self._misses += 1
+
+        return False, None
+
+    def put(self, key, value):
+        """Store ``value`` under ``key``, then evict old sidecars if the cache
+        is over its size cap. Failures are reported as warnings, since the
+        cache is only ever an optimization."""
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp')
+        except OSError as e:
+            _warn_write(self.directory, e)
+            return
+
+        try:
+            os.close(fd)
+            suffix = _write_sidecar(tmp, value)
+            if suffix is None:
+                _remove(tmp)
+                return
+            os.replace(tmp, self._path(key, suffix))
+        except Exception as e:
+            _remove(tmp)
+            _warn_write(self.directory, e)
+            return
+
+        self.evict()
+
+    def evict(self, max_bytes=None):
+        """Delete the least recently read sidecars until the cache fits in
+        ``max_bytes``, which defaults to the cache's size cap."""
+
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+
+        entries = []
+        total = 0
+
+        try:
+            for entry in os.scandir(self.directory):
+                if not entry.name.endswith(_SUFFIXES):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime_ns, st.st_size, entry.path))
+                total += st.st_size
+        except OSError:
+            return
+
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            _remove(path)
+            total -= size
+
+    def clear(self):
+        """Delete every sidecar and reset the statistics."""
+
+        self.evict(0)
+
+        with self._lock:
+            self._hits = self._misses = 0
+
+    def info(self):
+        """Hit and miss statistics, as a :class:`CacheInfo`."""
+
+        entries = nbytes = 0
+
+        try:
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(_SUFFIXES):
+                    try:
+                        nbytes += entry.stat().st_size
+                    except OSError:
+                        continue
+                    entries += 1
+        except OSError:
+            pass
+
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, entries, nbytes,
+                             self.max_bytes)
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, key + suffix)
+
+
+# -----------------------------------------------------------------------------
+# Module-level library
+# -----------------------------------------------------------------------------
+def _cacheable(obj):
+    """Whether ``obj`` can be kept in memory. Memory-mapped arrays and
+    objects holding open files are cheap to load again, and copying them
+    would defeat their purpose."""
+
+    return not (isinstance(obj, np.memmap) or hasattr(obj, 'close'))
+
+
+def _freeze(obj):
+    """Hashable version of keyword arguments."""
+
+    if isinstance(obj, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in obj.items()))
+    if isinstance(obj, (list, tuple)):
+        return tuple(_freeze(item) for item in obj)
+    if isinstance(obj, set):
+        return frozenset(_freeze(item) for item in obj)
+
+    return obj
+
+
+def _has_pyarrow():
+    """Whether Parquet files can be written."""
+
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def _read_sidecar(path, suffix):
+    """Load a sidecar written by :func:`_write_sidecar`."""
+
+    if suffix == _PARQUET:
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        return pd.read_parquet(path)
+    if suffix == _NPY:
+        return np.load(path, allow_pickle=False)
+
+    with open(path, 'rb') as fileobj:
+        return pickle.load(fileobj)
+
+
+def _stat(filename):
+    """``os.stat`` of ``filename``, or of the archive holding it, whose
+    modification time and size change along with any of its members."""
+
+    try:
+        return os.stat(filename)
+    except OSError:
+        found = split_member(filename)
+        if found is None:
+            raise
+        return os.stat(found[0])
+
+
+def _write_sidecar(path, value):
+    """
+    Write ``value`` to ``path`` in the fastest format able to hold it.
+
+    Returns
+    -------
+    suffix : str or None
+        Suffix identifying the format used, or None if the value can't be
+        stored.
+    """
+
+    if isinstance(value, pd.DataFrame) and _has_pyarrow():
+        try:
+            value.to_parquet(path)
+        except Exception:  # e.g. non-string column names, mixed object types
+            pass
+        else:
+            return _PARQUET
+
+    if isinstance(value, np.ndarray) and value.dtype != object:
+        with open(path, 'wb') as fileobj:
+            np.save(fileobj, value, allow_pickle=False)
+        return _NPY
+
+    try:
+        with open(path, 'wb') as fileobj:
+            pickle.dump(value, fileobj, protocol=pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, TypeError, AttributeError):
+        return None
+
+    return _PICKLE
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _warn_write(directory, error):
+    if options.SHOW_WARNINGS:
+        warnings.warn('Unable to write to disk cache "{}": {}'
+                      .format(directory, error))
+
+
+# -----------------------------------------------------------------------------
+# Public library
+# -----------------------------------------------------------------------------
+def disk_key(filename, reader_name, kwargs):
+    """
+    Name of the sidecar holding ``filename`` as loaded by the reader called
+    ``reader_name`` with ``kwargs``.
+
+    Unlike :func:`make_key`, the key has to identify the same data in another
+    session, so the reader is given by its importable name and the keyword
+    arguments must be JSON-serializable.
+
+    Returns
+    -------
+    key : str or None
+        Hex digest, or None if the result shouldn't be cached.
+    """
+
+    if reader_name is None:
+        return None
+
+    try:
+        st = _stat(filename)
+        spec = json.dumps([os.path.abspath(filename), st.st_mtime_ns,
+                           st.st_size, reader_name, kwargs], sort_keys=True)
+    except (OSError, TypeError, ValueError):
+        return None
+
+    return hashlib.sha1(spec.encode('utf-8')).hexdigest()
+
+
+def file_stamp(filename):
+    """``[mtime_ns, size]`` of a local file or archive member, changing
+    whenever the file does, or None if it can't be read."""
+
+    try:
+        st = _stat(filename)
+    except (OSError, TypeError, ValueError):
+        return None
+
+    return [st.st_mtime_ns, st.st_size]
+
+
+def make_key(filename, reader, kwargs):
+    """
+    Cache key for loading ``filename`` with ``reader`` and ``kwargs``.
+
+    The key includes the file's modification time and size, so a changed
+    file is never served from the cache.
+
+    Returns
+    -------
+    key : tuple or None
+        None if the file can't be found or the arguments aren't hashable,
+        in which case the result shouldn't be cached.
+    """
+
+    try:
+        st = _stat(filename)
+        key = (os.path.abspath(filename), st.st_mtime_ns, st.st_size,
+               reader, _freeze(kwargs))
+        hash(key)
+    except (OSError, TypeError, ValueError):
+        return None
+
+    return key
+
+
+def protect(value, mode='copy'):
+    """
+    Version of ``value`` that is safe to hand out to one of several callers
+    sharing it, as described for the modes of :class:`ResultCache`.
+
+    Memory-mapped arrays, objects holding open files and objects that can't
+    be copied are returned as is.
+    """
+
+    if not _cacheable(value):
+        return value
+
+    if mode == 'copy':
+        if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)):
+            return value.copy()
+        try:
+            return copy.deepcopy(value)
+        except (TypeError, copy.Error):
+            return value
+
+    if isinstance(value, np.ndarray):
+        return value.view()
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=False)
+
+    return value
+
+
+def sizeof(obj):
+    """Approximate memory footprint of a loaded object, in bytes."""
+
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(index=True, deep=True))
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(sizeof(k) + sizeof(v)
+                                        for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sys.getsizeof(obj) + sum(sizeof(item) for item in obj)
+
+    return sys.getsizeof(obj)
@@ -0,0 +1,243 @@
+"""Streaming decompression of compressed data files."""
+import bz2
+import gzip
+import importlib
+import io
+import lzma
+import os
+import queue
+import shutil
+import tempfile
+import threading
+
+from . import options
+
+
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+# Compression suffix -> codec name
+COMPRESSIONS = {
+    '.gz': 'gzip',
+    '.bz2': 'bz2',
+    '.xz': 'xz',
+    '.zst': 'zstd',
+}
+
+# Size of the blocks decompressed ahead of the reader
+_BLOCK_SIZE = 2 ** 20
+
+
+# -----------------------------------------------------------------------------
+# Classes
+# -----------------------------------------------------------------------------
+class ReadAhead(io.RawIOBase):
+    """
+    Read-only file decompressing another one in a background thread.
+
+    The codecs release the GIL while decompressing, so parsing one block
+    overlaps with decompressing the next ones. At most ``blocks`` blocks are
+    held ahead of the reader.
+
+    Parameters
+    ----------
+    fileobj : file-like
+        Decompressing file to read from. It is closed along with this one.
+    blocks : int
+        Number of blocks to decompress ahead.
+    """
+
+    def __init__(self, fileobj, blocks):
+        super().__init__()
+        self._fileobj = fileobj
+        self._blocks = queue.Queue(blocks)
+        self._buffer = memoryview(b'')
+        self._done = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._fill, daemon=True,
+                                        name='fyda-decompress')
+        self._thread.start()
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+
+        while not self._buffer:
+            if self._done:
+                return 0
+            block = self._blocks.get()
+            if isinstance(block, BaseException):
+                self._done = True
+                raise block
+            if not block:
+                self._done = True
+                return 0
+            self._buffer = memoryview(block)
+
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._stop.set()
+            try:  # Unblock the thread if it waits on a full queue
+                while True:
+                    self._blocks.get_nowait()
+            except queue.Empty:
+                pass
+            self._thread.join()
+            self._fileobj.close()
+        super().close()
+
+    def _fill(self):
+        """Decompress blocks into the queue until the end of the file."""
+
+        try:
+            while not self._stop.is_set():
+                block = self._fileobj.read(_BLOCK_SIZE)
+                self._put(block)
+                if not block:
+                    return
+        except BaseException as e:
+            self._put(e)
+
+    def _put(self, item):
+        """Queue ``item`` unless the reader is closed first."""
+
+        while not self._stop.is_set():
+            try:
+                self._blocks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+
+# -----------------------------------------------------------------------------
+# Module-level library
+# -----------------------------------------------------------------------------
+def _open_codec(codec, source):
+    """Decompressing file over ``source``, a path or binary file object."""
+
+    if codec == 'gzip':
+        return _open_gzip(source)
+    if codec == 'bz2':
+        return bz2.BZ2File(source, 'rb')
+    if codec == 'xz':
+        return lzma.LZMAFile(source, 'rb')
+    if codec == 'zstd':
+        return _open_zstd(source)
+
+    raise ValueError('Compression "{}" not understood.'.format(codec))
+
+
+def _open_gzip(source):
+    """Decompress gzip data, on several threads if python-isal is
+    installed."""
+
+    try:
+        from isal import igzip_threaded
+    except ImportError:
+        return gzip.open(source, 'rb')
+
+    return igzip_threaded.open(source, 'rb',
+                               threads=options.DECOMPRESS_THREADS)
+
+
+def _open_zstd(source):
+    """Decompress Zstandard data with the zstandard package."""
+
+    try:
+        zstandard = importlib.import_module('zstandard')
+    except ImportError:
+        raise ImportError('Reading .zst files requires the zstandard '
+                          'package: pip install zstandard')
+
+    owned = isinstance(source, (str, os.PathLike))
+    if owned:
+        source = open(source, 'rb')
+
+    return zstandard.ZstdDecompressor().stream_reader(source, closefd=owned)
+
+
+def _spool(fileobj):
+    """Copy the rest of ``fileobj`` to a seekable file, in memory unless it
+    is larger than ``fyda.options.DECOMPRESS_SPILL_BYTES``."""
+
+    spooled = tempfile.SpooledTemporaryFile(options.DECOMPRESS_SPILL_BYTES)
+    shutil.copyfileobj(fileobj, spooled, _BLOCK_SIZE)
+    spooled.seek(0)
+
+    return spooled
+
+
+# -----------------------------------------------------------------------------
+# Public library
+# -----------------------------------------------------------------------------
+def open_compressed(source, codec, sequential=False):
+    """
+    Open a compressed file for reading its decompressed content.
+
+    Parameters
+    ----------
+    source : str or file-like
+        Path to the file, or a binary file object positioned at its start.
+        A file object is left open for the caller to close after the
+        returned file.
+    codec : str
+        One of the values of :data:`COMPRESSIONS`.
+    sequential : bool, (optional)
+        Whether the caller reads the file from start to end without seeking.
+        If so, the file is decompressed as it is read, in a background thread
+        if ``fyda.options.DECOMPRESS_READAHEAD`` is set.
+
+    Returns
+    -------
+    fileobj : file-like
+        Binary file, to be closed by the caller. Unless ``sequential`` is
+        set, it can seek, albeit slowly: codecs that can't seek, such as
+        zstandard, are first decompressed in full to a spooled file.
+    """
+
+    fileobj = _open_codec(codec, source)
+
+    if sequential:
+        if options.DECOMPRESS_READAHEAD:
+            return io.BufferedReader(
+                ReadAhead(fileobj, options.DECOMPRESS_READAHEAD), _BLOCK_SIZE)
+        return fileobj
+
+    if not fileobj.seekable():  # e.g. zstandard's stream reader
+        try:
+            spooled = _spool(fileobj)
+        finally:
+            fileobj.close()
+        return spooled
+
+    return fileobj
+
+
+def split_compression(filename):
+    """
+    Separate the compression suffix from ``filename``.
+
+    Returns
+    -------
+    name : str
+        ``filename`` without the suffix, e.g. ``'sales.csv'`` for
+        ``'sales.csv.gz'``.
+    codec : str or None
+        Codec of the suffix, or None if the file isn't compressed.
+    """
+
+    filename = os.fspath(filename)
+    name, suffix = os.path.splitext(filename)
+    codec = COMPRESSIONS.get(suffix.lower())
+
+    if codec is None:
+        return filename, None
+
+    return name, codec
@@ -12,3 +12,29 @@ class NoShortcutError(Exception):
                'the file name you are trying to access and/or that the '
                'shortcut is configured in your .fydarc').format(shortcut)
         super().__init__(msg)
+
+
+class AmbiguousShortcutError(NoShortcutError):
+    """Raised when a shortcut searched for lazily matches several files."""
+    def __init__(self, shortcut, candidates):
+        Exception.__init__(
+            self,
+            ('The shortcut "{}" matches more than one file: {}. Use a longer '
+             'shortcut, such as one including the file extension or folder, '
+             'or configure it in your .fydarc').format(
+                 shortcut, ', '.join(candidates)))
+
+
+class BatchLoadError(Exception):
+    """Raised when some of the files loaded together could not be loaded.
+
+    The data that did load is kept in ``results``, and the exception raised
+    for each failed name in ``errors``."""
+    def __init__(self, results, errors):
+        self.results = results
+        self.errors = errors
+        super().__init__(
+            'Failed to load {} of {} files: {}'.format(
+                len(errors), len(errors) + len(results),
+                '; '.join('{}: {!r}'.format(name, err)
+                          for name, err in errors.items())))
@@ -0,0 +1,475 @@
+"""Persistent shortcut index for fyda."""
+import json
+import os
+import tempfile
+import time
+import warnings
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from . import options
+
+
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+INDEX_VERSION = 3
+
+# Directories modified this recently are rescanned on the next refresh, since
+# a change landing in the same timestamp tick as the scan would go unnoticed.
+_RACY_NS = 2 * 10 ** 9
+
+
+# -----------------------------------------------------------------------------
+# Classes
+# -----------------------------------------------------------------------------
+class DirectorySnapshot:
+    """
+    Record of every directory under a root, with its listing and mtime.
+
+    Parameters
+    ----------
+    root : str
+        Path to the root folder the snapshot describes.
+    dirs : dict, (optional)
+        Mapping of directory paths relative to ``root`` (the root itself is
+        ``''``) to ``{'mtime': int, 'files': list, 'dirs': list}`` records.
+    workers : int, (optional)
+        Number of threads listing directories concurrently when scanning.
+
+    Notes
+    -----
+    A directory's mtime changes whenever an entry is added, removed or renamed
+    inside of it, so comparing mtimes is enough to know which listings are
+    stale without reading any of them.
+    """
+
+    def __init__(self, root, dirs=None, workers=1):
+        self.root = root
+        self.dirs = {} if dirs is None else dirs
+        self.workers = workers
+        self._branches = {}  # Nested tree nodes, built on first use
+
+    @classmethod
+    def scan(cls, root, workers=1):
+        """Walk ``root`` and record every directory underneath it."""
+
+        snapshot = cls(root, workers=workers)
+        snapshot._scan_subtrees([('', None)])
+        # Listings complete in any order, so fix one for a deterministic merge
+        snapshot.dirs = dict(sorted(snapshot.dirs.items()))
+        return snapshot
+
+    @classmethod
+    def from_dict(cls, root, record, workers=1):
+        """Rebuild a snapshot from the output of :meth:`to_dict`."""
+
+        return cls(root, record, workers)
+
+    def to_dict(self):
+        """JSON-serializable form of the snapshot."""
+
+        return self.dirs
+
+    def files(self):
+        """Iterate through absolute paths of every file in the snapshot."""
+
+        for rel, record in self.dirs.items():
+            path = self._abspath(rel)
+            for f in record['files']:
+                yield os.path.join(path, f)
+
+    def tree(self):
+        """
+        Nested dictionary of the snapshot, as in
+        :meth:`fyda.DataBank.root_to_dict`.
+
+        The tree is built once and afterwards only the nodes of directories
+        that :meth:`refresh` found modified are rebuilt. The returned object is
+        shared and should not be modified.
+        """
+
+        if '' not in self._branches and '' in self.dirs:
+            self._build_branch('')
+
+        return {os.path.basename(self.root): self._branches.get('', {})}
+
+    def refresh(self, dirs=None):
+        """
+        Bring the snapshot up to date with the filesystem.
+
+        Every directory is checked with a single ``stat``; only the ones whose
+        mtime differs from the recorded one are listed again, and only new
+        subdirectories are walked.
+
+        Parameters
+        ----------
+        dirs : iterable, (optional)
+            Directories, relative to the root, known to have changed. If
+            provided, only these are listed again (regardless of their mtime)
+            and no other directory is checked.
+
+        Returns
+        -------
+        added : list
+            Absolute paths of files that appeared since the last scan.
+        removed : list
+            Absolute paths of files that are no longer present.
+        """
+
+        added, removed = [], []
+        changed = []
+
+        force = dirs is not None
+        rels = [rel for rel in (self.dirs if dirs is None else dirs)
+                if rel in self.dirs]
+        mtimes = self._map(self._stamp, [self._abspath(rel) for rel in rels])
+        stale = [(rel, mtime) for rel, mtime in zip(rels, mtimes)
+                 if force or mtime != self.dirs[rel]['mtime']]
+        listings = self._map(
+            lambda item: None if item[1] is None else
+            self._list(self._abspath(item[0]), item[1]), stale)
+
+        for (rel, mtime), listing in zip(stale, listings):
+
+            record = self.dirs.get(rel)
+            if record is None:  # Dropped along with a removed parent
+                continue
+
+            if listing is None:
+                removed.extend(self._drop_subtree(rel))
+                changed.append(os.path.dirname(rel) if rel else rel)
+                continue
+
+            old_files = set(record['files'])
+            old_dirs = set(record['dirs'])
+            record, subdirs = listing
+            self.dirs[rel] = record
+            path = self._abspath(rel)
+            changed.append(rel)
+
+            added.extend(os.path.join(path, f)
+                         for f in record['files'] if f not in old_files)
+            removed.extend(os.path.join(path, f)
+                           for f in old_files - set(record['files']))
+
+            for d in old_dirs - set(record['dirs']):
+                removed.extend(self._drop_subtree(os.path.join(rel, d)))
+
+            new = [(os.path.join(rel, d), subdirs.get(d))
+                   for d in record['dirs'] if d not in old_dirs]
+            if new:
+                added.extend(self._scan_subtrees(new))
+
+        if self._branches:
+            # Children first, so that rebuilt parents link to fresh nodes
+            for rel in sorted(set(changed), key=_depth, reverse=True):
+                if rel in self.dirs:
+                    self._build_branch(rel)
+
+        return added, removed
+
+    def _abspath(self, rel):
+        """Absolute path of a directory given relative to the root."""
+
+        return os.path.join(self.root, rel) if rel else self.root
+
+    def _list(self, path, mtime=None):
+        """List a single directory, as :func:`_list_dir`. Overridden for
+        other storage."""
+
+        return _list_dir(path, mtime)
+
+    def _map(self, func, items):
+        """Apply ``func`` to every item, concurrently if the snapshot has
+        more than one worker."""
+
+        if self.workers <= 1 or len(items) < 2:
+            return [func(item) for item in items]
+
+        with ThreadPoolExecutor(self.workers) as pool:
+            return list(pool.map(func, items))
+
+    def _stamp(self, path):
+        """Value that changes whenever the listing of a directory does; its
+        mtime for local folders."""
+
+        return _mtime(path)
+
+    def _scan_subtrees(self, tops):
+        """
+        Scan directories and everything below them, returning the absolute
+        paths of all files found.
+
+        Parameters
+        ----------
+        tops : list
+            ``(rel, mtime)`` pairs for the directories to scan, where the
+            mtime may be None if it isn't already known.
+        """
+
+        found = []
+
+        if self.workers <= 1:
+            pending = list(tops)
+            while pending:
+                rel, mtime = pending.pop()
+                pending.extend(self._store(
+                    rel, self._list(self._abspath(rel), mtime), found))
+            return found
+
+        # Listing directories is bound by latency on network filesystems, so
+        # keep a listing in flight for every worker. Only this thread touches
+        # the snapshot itself.
+        with ThreadPoolExecutor(self.workers) as pool:
+            pending = {pool.submit(self._list, self._abspath(rel), mtime):
+                       rel for rel, mtime in tops}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    rel = pending.pop(future)
+                    for child, mtime in self._store(rel, future.result(),
+                                                    found):
+                        pending[pool.submit(self._list, self._abspath(child),
+                                            mtime)] = child
+
+        return found
+
+    def _store(self, rel, listing, found):
+        """Record a directory listing, collecting its files into ``found``.
+        Returns ``(rel, mtime)`` pairs for its subdirectories."""
+
+        record, subdirs = listing
+        self.dirs[rel] = record
+        path = self._abspath(rel)
+        found.extend(os.path.join(path, f) for f in record['files'])
+
+        return [(os.path.join(rel, d), mtime) for d, mtime in subdirs.items()]
+
+    def _drop_subtree(self, rel):
+        """Forget a directory and everything below it, returning the absolute
+        paths of all files it held."""
+
+        prefix = os.path.join(rel, '')
+        dropped = []
+
+        for key in [k for k in self.dirs if k == rel or k.startswith(prefix)]:
+            path = self._abspath(key)
+            dropped.extend(os.path.join(path, f)
+                           for f in self.dirs.pop(key)['files'])
+            self._branches.pop(key, None)
+
+        return dropped
+
+    def _build_branch(self, rel):
+        """(Re)build the tree node for a directory, reusing the nodes already
+        built for its subdirectories, and link it into its parent."""
+
+        # Avoid a circular import at module level
+        from .base import _default_shortcut
+
+        record = self.dirs[rel]
+        branch = {_default_shortcut(f): f for f in record['files']}
+
+        for d in record['dirs']:
+            child = os.path.join(rel, d)
+            if child in self.dirs:
+                if child in self._branches:
+                    branch[d] = self._branches[child]
+                else:
+                    branch[d] = self._build_branch(child)
+
+        self._branches[rel] = branch
+
+        if rel:
+            parent = self._branches.get(os.path.dirname(rel))
+            if parent is not None:
+                parent[os.path.basename(rel)] = branch
+
+        return branch
+
+
+# -----------------------------------------------------------------------------
+# Module-level library
+# -----------------------------------------------------------------------------
+def _list_dir(path, mtime=None):
+    """
+    List a single directory.
+
+    ``mtime`` may be passed when the caller already has it, e.g. from the
+    parent's listing.
+
+    Returns
+    -------
+    record : dict
+        ``{'mtime': int, 'files': list, 'dirs': list}`` for the directory.
+    subdirs : dict
+        Mapping of subdirectory names to their mtimes, which
+        :func:`os.scandir` provides without a separate ``stat`` on some
+        platforms.
+    """
+
+    files, dirs = [], {}
+
+    try:
+        if mtime is None:
+            mtime = os.stat(path).st_mtime_ns
+        for entry in os.scandir(path):
+            try:
+                if entry.is_dir():
+                    dirs[entry.name] = entry.stat().st_mtime_ns
+                    continue
+            except OSError:
+                pass
+            files.append(entry.name)
+    except OSError:
+        mtime = None
+
+    if mtime is not None and time.time() * 1e9 - mtime < _RACY_NS:
+        mtime = None
+
+    return {'mtime': mtime, 'files': sorted(files), 'dirs': sorted(dirs)}, dirs
+
+
+def _mtime(path):
+    """Modification time of ``path`` in nanoseconds, or None if it can't be
+    read."""
+
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _depth(rel):
+    """Nesting level of a directory given relative to the root."""
+
+    return rel.count(os.sep) + 1 if rel else 0
+
+
+# -----------------------------------------------------------------------------
+# Public library
+# -----------------------------------------------------------------------------
+def find_files(root, match, max_depth=None):
+    """
+    Breadth-first search for files under ``root``.
+
+    Parameters
+    ----------
+    root : str
+        Folder to search.
+    match : callable
+        Takes the absolute path of a file and returns whether it is wanted.
+    max_depth : int, (optional)
+        Deepest folder level to search, where files directly in ``root`` are
+        at level 0. If none is provided, the search is unbounded.
+
+    Returns
+    -------
+    matches : list
+        Absolute paths of the matching files, shallowest first and sorted
+        within each level.
+    """
+
+    matches = []
+
+    level = [root]
+    depth = 0
+
+    while level and (max_depth is None or depth <= max_depth):
+
+        found, below = [], []
+
+        for path in level:
+            try:
+                entries = list(os.scandir(path))
+            except OSError:
+                continue
+
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        below.append(entry.path)
+                        continue
+                except OSError:
+                    pass
+                if match(entry.path):
+                    found.append(entry.path)
+
+        matches.extend(sorted(found))
+        level = sorted(below)
+        depth += 1
+
+    return matches
+
+
+def index_path(config_path):
+    """Location of the shortcut index belonging to ``config_path``."""
+
+    return os.path.join(os.path.dirname(os.path.abspath(config_path)),
+                        options.INDEX_NAME)
+
+
+def read_index(path, root):
+    """
+    Read the stored index entry for ``root``.
+
+    Parameters
+    ----------
+    path : str
+        Location of the index file.
+    root : str
+        Absolute path to the data root.
+
+    Returns
+    -------
+    entry : dict or None
+        The stored entry, or None if the file is missing, unreadable, written
+        by an incompatible version of fyda, or has no entry for ``root``.
+    """
+
+    try:
+        with open(path, 'r') as fileobj:
+            content = json.load(fileobj)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(content, dict) or \
+            content.get('version') != INDEX_VERSION:
+        return None
+
+    return content.get('roots', {}).get(root)
+
+
+def write_index(path, root, entry):
+    """
+    Store the index entry for ``root``, leaving other roots untouched.
+
+    The file is replaced atomically so that concurrent readers never see a
+    partial index. Failure to write is reported as a warning, since the index
+    is only ever an optimization.
+    """
+
+    try:
+        with open(path, 'r') as fileobj:
+            content = json.load(fileobj)
+        if content.get('version') != INDEX_VERSION:
+            raise ValueError
+    except (OSError, ValueError, AttributeError):
+        content = {'version': INDEX_VERSION, 'roots': {}}
+
+    content['roots'][root] = entry
+
+    try:
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path),
+                                   prefix=os.path.basename(path))
+        try:
+            with os.fdopen(fd, 'w') as fileobj:
+                json.dump(content, fileobj)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+    except OSError as e:
+        if options.SHOW_WARNINGS:
+            warnings.warn('Unable to write shortcut index "{}": {}'
+                          .format(path, e))
@@ -1,3 +1,4 @@
+import functools
 import os
 import os.path as op
 
@@ -7,11 +8,47 @@ import os.path as op
 # -----------------------------------------------------------------------------
 SHOW_WARNINGS = True
 CONFIG_LOCATION = None
+USE_INDEX = True            # Persist DataBank shortcuts between sessions
+INDEX_NAME = '.fydarc.index'
+WATCH_INTERVAL = 1.0        # Seconds between polls for DataBank.watch()
+LAZY = False                # Resolve shortcuts on demand instead of scanning
+LAZY_SEARCH_DEPTH = None    # Deepest folder level searched by lazy lookups
+ARCHIVES = False            # Give members of zip/tar files shortcuts
+SCAN_WORKERS = 1            # Threads listing directories during scans
+CACHE_BYTES = 0             # Memory budget for withdraw() results; 0 = off
+CACHE_MODE = 'copy'         # 'copy' or 'readonly' protection of cached data
+DISK_CACHE = False          # Keep parsed data in binary sidecar files
+DISK_CACHE_DIR = '.fydacache'   # Relative to .fydarc
+DISK_CACHE_BYTES = 2 ** 32  # Size cap for the sidecar folder
+DISK_CACHE_EXTENSIONS = ('.csv', '.xls', '.xlsx', '.sas7bdat', '.xport')
+ASYNC_CONCURRENCY = 16      # Loads running at once per asyncio event loop
+STREAM_CHUNKSIZE = 100000   # Rows or lines per chunk when streaming
+MMAP_MODE = None            # e.g. 'r' to memory-map .npy and .npz files
+CSV_ENGINE = None           # 'pyarrow' to parse CSV files with pyarrow
+LEARN_SCHEMAS = False       # Learn compact column types for CSV files
+SCHEMA_NAME = '.fydarc.schemas'
+SCHEMA_CATEGORY_RATIO = 0.5  # Most distinct/total values for a category
+S3_PROFILE = None           # AWS profile for S3 clients
+S3_REGION = None
+S3_ENDPOINT_URL = None      # e.g. a MinIO server
+S3_MAX_POOL_CONNECTIONS = 32  # Connections kept open per S3 client
+S3_PART_SIZE = 8 * 2 ** 20  # Bytes per ranged request for large objects
+S3_CONCURRENCY = 8          # Ranged requests in flight per object
+S3_SPILL_BYTES = 2 ** 30    # Larger objects are downloaded to a temp file
+S3_SCAN_WORKERS = 16        # Threads listing prefixes of S3 data roots
+S3_CACHE = False            # Keep local copies of S3 objects
+S3_CACHE_DIR = '.fydas3cache'  # Relative to .fydarc
+S3_CACHE_BYTES = 2 ** 33    # Size cap for the local copies
+S3_CACHE_TTL = 0            # Seconds a copy is trusted without asking S3
+DECOMPRESS_READAHEAD = 0    # MiB decompressed ahead of parsers, in a thread
+DECOMPRESS_THREADS = 4      # Threads decoding gzip files, with python-isal
+DECOMPRESS_SPILL_BYTES = 2 ** 30  # Larger spooled files go to a temp file
 
 
 # -----------------------------------------------------------------------------
 # Variables
 # -----------------------------------------------------------------------------
+@functools.lru_cache(maxsize=None)
 def locate_config(config_name='.fydarc', sysvar='FYDA_HOME'):
     """
     Locate the configuration file following a prioritized hierarchy.
@@ -40,6 +77,11 @@ def locate_config(config_name='.fydarc', sysvar='FYDA_HOME'):
     3. Install location
     4. User home
     5. (System level)
+
+    The result is memoized, since probing each location costs a filesystem
+    call. Use ``locate_config.cache_clear()`` after changing the working
+    directory or creating a new configuration file, or set
+    ``CONFIG_LOCATION`` explicitly.
     """
 
     # If a config is in the current working directory, prioritize it
@@ -0,0 +1,170 @@
+"""Column projection and row filters, pushed down into readers."""
+import operator
+
+import pandas as pd
+
+from .readers import read_arrow, read_csv
+
+
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+_OPS = {
+    '==': operator.eq,
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda series, value: series.isin(value),
+    'not in': lambda series, value: ~series.isin(value),
+}
+
+# Readers filtering rows chunk by chunk, to bound memory by the chunk size
+_CHUNKED = (read_csv, pd.read_csv, pd.read_sas)
+
+
+# -----------------------------------------------------------------------------
+# Module-level library
+# -----------------------------------------------------------------------------
+def _normalize(filters):
+    """Filters in disjunctive normal form: a list of lists of
+    ``(column, op, value)`` tuples, the inner lists being ANDed and the
+    outer one ORed."""
+
+    if not filters:
+        return None
+
+    if isinstance(filters[0], (list, tuple)) and filters[0] and \
+            isinstance(filters[0][0], (list, tuple)):
+        groups = filters
+    else:
+        groups = [filters]
+
+    normalized = []
+
+    for group in groups:
+        conditions = []
+        for condition in group:
+            column, op, value = condition
+            if op not in _OPS:
+                raise ValueError('Filter operator "{}" not understood.'
+                                 .format(op))
+            conditions.append((column, op, value))
+        normalized.append(conditions)
+
+    return normalized
+
+
+def _needed(columns, filters):
+    """Columns to read: the requested ones plus those filtered on."""
+
+    if columns is None:
+        return None
+
+    needed = list(columns)
+
+    for group in filters or []:
+        for column, _, _ in group:
+            if column not in needed:
+                needed.append(column)
+
+    return needed
+
+
+# -----------------------------------------------------------------------------
+# Public library
+# -----------------------------------------------------------------------------
+def apply_pushdown(frame, columns, filters):
+    """
+    Filter the rows and select the columns of ``frame``.
+
+    Parameters
+    ----------
+    frame : DataFrame
+        Data to filter.
+    columns : list or None
+        Columns to keep, in order.
+    filters : list or None
+        Filters as returned by :func:`split_pushdown`.
+    """
+
+    if not isinstance(frame, pd.DataFrame):
+        raise TypeError('columns and filters only apply to tabular data, not '
+                        '{}'.format(type(frame).__name__))
+
+    if filters:
+        mask = None
+        for group in filters:
+            group_mask = None
+            for column, op, value in group:
+                condition = _OPS[op](frame[column], value)
+                group_mask = condition if group_mask is None \
+                    else group_mask & condition
+            mask = group_mask if mask is None else mask | group_mask
+        frame = frame[mask]
+
+    if columns is not None:
+        frame = frame[list(columns)]
+
+    return frame
+
+
+def pushdown_kwargs(reader, kwargs, columns, filters):
+    """
+    Translate ``columns`` and ``filters`` into the native arguments of
+    ``reader``.
+
+    Returns
+    -------
+    kwargs : dict
+        Updated keyword arguments for the reader.
+    chunked : bool
+        Whether the reader should be run in chunks, each one filtered with
+        :func:`apply_pushdown` as it is read.
+    """
+
+    kwargs = dict(kwargs)
+    needed = _needed(columns, filters)
+
+    if reader in (read_csv, pd.read_csv, pd.read_excel):
+        if needed is not None:
+            kwargs.setdefault('usecols', needed)
+    elif reader is pd.read_parquet:
+        if needed is not None:
+            kwargs.setdefault('columns', needed)
+        if filters:  # Lets pyarrow skip row groups by their statistics
+            kwargs.setdefault('filters', [list(g) for g in filters])
+    elif reader in (pd.read_feather, read_arrow):
+        if needed is not None:
+            kwargs.setdefault('columns', needed)
+
+    chunked = reader in _CHUNKED and (reader is pd.read_sas or bool(filters))
+
+    return kwargs, chunked
+
+
+def split_pushdown(kwargs):
+    """
+    Separate the ``columns`` and ``filters`` arguments, as accepted by
+    :meth:`fyda.DataBank.withdraw`, from other keyword arguments.
+
+    Returns
+    -------
+    kwargs : dict
+        Remaining keyword arguments.
+    columns : list or None
+        Columns to keep.
+    filters : list or None
+        Row filters in disjunctive normal form.
+    """
+
+    kwargs = dict(kwargs)
+    columns = kwargs.pop('columns', None)
+    filters = _normalize(kwargs.pop('filters', None))
+
+    if isinstance(columns, str):
+        columns = [columns]
+
+    return kwargs, columns, filters
@@ -0,0 +1,374 @@
+"""Registry of file readers, chosen by file extension."""
+import importlib.util
+import inspect
+import itertools
+import json
+import os
+import pickle
+import threading
+import warnings
+import weakref
+
+import pandas as pd
+
+from . import options
+from .compression import split_compression
+
+
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+ENTRY_POINT_GROUP = 'fyda.readers'
+
+# Extension -> [(priority, serial, reader), ...]
+_REGISTRY = {}
+_SERIAL = itertools.count()
+_LOCK = threading.RLock()
+_LOADED = False
+
+# How each reader takes its input, declared or detected on first use
+MODES = ('path', 'text', 'binary', 'call')
+_MODES = weakref.WeakKeyDictionary()
+
+# First parameter names of readers taking an open file rather than a path
+_HANDLE_NAMES = ('f', 'fh', 'fp', 'fileobj', 'fobj', 'stream', 'buf',
+                 'buffer', 'handle')
+
+# Options the pyarrow engine of pandas.read_csv does not accept
+_ARROW_CSV_UNSUPPORTED = ('chunksize', 'iterator', 'nrows', 'skipfooter',
+                          'converters', 'low_memory', 'memory_map',
+                          'dialect', 'on_bad_lines', 'float_precision')
+
+
+# -----------------------------------------------------------------------------
+# Module-level library
+# -----------------------------------------------------------------------------
+def _ensure_loaded():
+    """Register the built-in readers, then those of installed plugins, the
+    first time the registry is used."""
+
+    global _LOADED
+
+    with _LOCK:
+        if _LOADED:
+            return
+        _LOADED = True
+        _register_builtins()
+        _load_plugins()
+
+
+def _detect_mode(reader):
+    """
+    Guess how ``reader`` takes its input from its signature.
+
+    Readers without a required positional parameter are called without one
+    (like the ``read`` method of an open file). Readers whose first parameter
+    is named like a file handle get ``'handle'``, meaning an open file in a
+    yet unknown mode. Everything else is passed the path.
+    """
+
+    try:
+        params = list(inspect.signature(reader).parameters.values())
+    except (TypeError, ValueError):  # Some built-ins have no signature
+        return 'path'
+
+    positional = [p for p in params
+                  if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD,
+                                p.VAR_POSITIONAL)]
+
+    if not positional:
+        return 'call'
+
+    first = positional[0]
+
+    if first.kind != first.VAR_POSITIONAL and first.default is not first.empty:
+        return 'call'
+    if first.name in _HANDLE_NAMES:
+        return 'handle'
+
+    return 'path'
+
+
+def _entry_points():
+    """Entry points advertised in the ``fyda.readers`` group."""
+
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:  # Python < 3.8
+        return []
+
+    eps = entry_points()
+
+    if hasattr(eps, 'select'):
+        return list(eps.select(group=ENTRY_POINT_GROUP))
+
+    return list(eps.get(ENTRY_POINT_GROUP, []))
+
+
+def _extensions(filename):
+    """Every suffix of ``filename`` that could be a (multi-part) extension,
+    longest first. ``'a.tar.gz'`` gives ``['.tar.gz', '.gz']``."""
+
+    name = os.path.basename(os.fspath(filename)).lower()
+    parts = name.split('.')[1:]
+
+    return ['.' + '.'.join(parts[i:]) for i in range(len(parts))]
+
+
+def _has_pyarrow():
+    """Whether the pyarrow readers can be used."""
+
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def _load_plugins():
+    """Call the registration hook of every installed plugin."""
+
+    for ep in _entry_points():
+        try:
+            ep.load()()
+        except Exception as e:  # A broken plugin shouldn't break fyda
+            if options.SHOW_WARNINGS:
+                warnings.warn('Unable to load fyda reader plugin "{}": {}'
+                              .format(ep.name, e))
+
+
+def _normalize(extension):
+    """Lowercase ``extension``, with its leading dot."""
+
+    extension = extension.lower()
+    return extension if extension.startswith('.') else '.' + extension
+
+
+def _register_builtins():
+    """Register the readers fyda ships with."""
+
+    # Avoid a circular import at module level
+    from .arrays import read_numpy
+    from .base import _read_json_lines, _read_text, _read_yaml
+
+    for extensions, reader, mode in [
+            (['.csv'], read_csv, 'path'),
+            (['.xlsx', '.xls'], pd.read_excel, 'path'),
+            (['.pickle', '.pkl'], pickle.load, 'binary'),
+            (['.npy', '.npz'], read_numpy, 'path'),
+            (['.json'], json.load, 'text'),
+            (['.jsonl', '.ndjson'], _read_json_lines, 'path'),
+            (['.sas7bdat', '.xport'], pd.read_sas, 'path'),
+            (['.yml', '.yaml'], _read_yaml, 'path'),
+            (['.txt'], _read_text, 'path'),
+            (['.parquet', '.pq'], pd.read_parquet, 'path'),
+            (['.feather'], pd.read_feather, 'path'),
+            (['.arrow', '.arrows', '.ipc'], read_arrow, 'path')]:
+        _register(extensions, reader, 0, mode)
+
+
+def _remember_mode(reader, mode):
+    """Cache the mode of ``reader``, if it can be weakly referenced."""
+
+    try:
+        _MODES[reader] = mode
+    except TypeError:  # Looked up again on every call instead
+        pass
+
+
+def _picks():
+    """Reader picked for each registered extension."""
+
+    _ensure_loaded()
+
+    with _LOCK:
+        return {extension: max(candidates, key=lambda c: c[:2])[2]
+                for extension, candidates in _REGISTRY.items() if candidates}
+
+
+def _register(extensions, reader, priority, mode=None):
+    """Add ``reader`` to the registry without loading it first."""
+
+    if isinstance(extensions, str):
+        extensions = [extensions]
+
+    with _LOCK:
+        if mode is not None:
+            set_reader_mode(reader, mode)
+        for extension in extensions:
+            _REGISTRY.setdefault(_normalize(extension), []).append(
+                (priority, next(_SERIAL), reader))
+
+
+# -----------------------------------------------------------------------------
+# Public library
+# -----------------------------------------------------------------------------
+def pick_reader(filename):
+    """
+    Reader registered for the extension of ``filename``.
+
+    The longest matching extension wins, so a reader for ``.csv.gz`` is
+    preferred over one for ``.gz``. Among readers for the same extension, the
+    one with the highest priority wins, and then the most recently
+    registered. Compressed files without a reader of their own (see
+    :data:`fyda.compression.COMPRESSIONS`) get the reader of the file
+    inside, which is decompressed as it is read.
+
+    Returns
+    -------
+    reader : callable or None
+        None if no reader is registered for the file.
+    """
+
+    _ensure_loaded()
+
+    with _LOCK:
+        for extension in _extensions(filename):
+            candidates = _REGISTRY.get(extension)
+            if candidates:
+                return max(candidates, key=lambda c: c[:2])[2]
+
+    name, codec = split_compression(filename)
+    if codec is not None:
+        return pick_reader(name)
+
+    return None
+
+
+def read_arrow(filename, columns=None, **kwargs):
+    """Read an Arrow IPC file, in either the file or the stream format, into
+    a DataFrame, keeping only ``columns`` if given. Files given by path are
+    memory-mapped."""
+
+    import pyarrow as pa
+    from pyarrow import ipc
+
+    if isinstance(filename, (str, os.PathLike)):
+        source = pa.memory_map(os.fspath(filename), 'r')
+    else:
+        source = pa.BufferReader(filename.read())
+
+    with source:
+        try:
+            table = ipc.open_file(source).read_all()
+        except pa.ArrowInvalid:
+            source.seek(0)
+            table = ipc.open_stream(source).read_all()
+
+    if columns is not None:
+        table = table.select(columns)
+
+    return table.to_pandas(**kwargs)
+
+
+def read_csv(filename, **kwargs):
+    """
+    Read a CSV file with :func:`pandas.read_csv`.
+
+    If ``fyda.options.CSV_ENGINE`` is ``'pyarrow'`` and pyarrow is installed,
+    the multithreaded pyarrow parser is used, unless an ``engine`` is passed
+    or another argument requires the default parser.
+    """
+
+    if options.CSV_ENGINE == 'pyarrow' and 'engine' not in kwargs and \
+            not any(k in kwargs for k in _ARROW_CSV_UNSUPPORTED) and \
+            _has_pyarrow():
+        kwargs['engine'] = 'pyarrow'
+
+    return pd.read_csv(filename, **kwargs)
+
+
+def reader_mode(reader):
+    """
+    How ``reader`` takes its input: one of :data:`MODES`, or ``'handle'``
+    for a reader taking an open file whose mode has not been established
+    yet.
+
+    The mode is, in order of precedence, the one given to
+    :func:`set_reader_mode` or :func:`register_reader`, the reader's
+    ``fyda_mode`` attribute, or one detected from its signature. It is
+    looked up once per reader.
+    """
+
+    _ensure_loaded()  # The built-in readers declare their modes
+
+    try:
+        return _MODES[reader]
+    except (KeyError, TypeError):
+        pass
+
+    mode = getattr(reader, 'fyda_mode', None) or _detect_mode(reader)
+    _remember_mode(reader, mode)
+
+    return mode
+
+
+def register_reader(extensions, reader=None, priority=0, mode=None):
+    """
+    Register a reader for files with the given extensions.
+
+    Installed packages can register readers too, by advertising a function
+    in the ``fyda.readers`` entry point group. It is called without
+    arguments the first time a reader is picked, and should call this
+    function.
+
+    Parameters
+    ----------
+    extensions : str or list of str
+        Extensions handled by the reader, which may have several parts like
+        ``'.csv.gz'``. Matching is case-insensitive.
+    reader : callable, (optional)
+        Function taking a file name and keyword arguments. If none is passed,
+        a decorator registering the decorated function is returned.
+    priority : int, (optional)
+        Readers with a higher priority take precedence over others for the
+        same extension. The built-in readers have priority 0; among equal
+        priorities the most recently registered reader wins.
+    mode : str, {'path', 'text', 'binary', 'call'}, (optional)
+        Whether the reader takes the path to the file, a file opened in text
+        or binary mode, or no argument at all. If none is passed, it is
+        detected as described in :func:`reader_mode`.
+
+    Examples
+    --------
+    >>> @fyda.register_reader('.h5', priority=1)
+    ... def read_hdf(filename, **kwargs):
+    ...     return pd.read_hdf(filename, **kwargs)
+    """
+
+    if reader is None:
+        def decorator(func):
+            register_reader(extensions, func, priority, mode)
+            return func
+        return decorator
+
+    _ensure_loaded()
+    _register(extensions, reader, priority, mode)
+
+    return reader
+
+
+def set_reader_mode(reader, mode):
+    """Declare how ``reader`` takes its input; see :func:`register_reader`.
+    """
+
+    if mode not in MODES:
+        raise ValueError('Reader mode "{}" not understood.'.format(mode))
+
+    try:
+        _MODES[reader] = mode
+    except TypeError:
+        raise TypeError('Reader modes can only be declared for readers that '
+                        'can be weakly referenced; set a fyda_mode attribute '
+                        'instead.')
+
+
+def unregister_reader(extensions, reader):
+    """Remove ``reader`` from the given extensions."""
+
+    _ensure_loaded()
+
+    if isinstance(extensions, str):
+        extensions = [extensions]
+
+    with _LOCK:
+        for extension in extensions:
+            extension = _normalize(extension)
+            _REGISTRY[extension] = [c for c in _REGISTRY.get(extension, [])
+                                    if c[2] is not reader]
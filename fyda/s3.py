@@ -0,0 +1,717 @@
+"""Shared S3 clients, parallel downloads, bucket listings and a local
+object cache."""
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import warnings
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from . import options
+from .cache import CacheInfo
+from .index import DirectorySnapshot
+
+
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+# Clients by (process, profile, region, endpoint, pool size). Clients are
+# thread-safe, but must not be shared with forked processes.
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+
+_CONTENT_RANGE = re.compile(r'bytes \d+-\d+/(\d+)')
+
+_SCHEME = 's3://'
+
+_META = '.meta'  # Suffix of the ETag records of cached objects
+_TMP = '.tmp'    # Prefix of downloads in progress
+
+
+# -----------------------------------------------------------------------------
+# Classes
+# -----------------------------------------------------------------------------
+class RangedReader(io.RawIOBase):
+    """
+    Read-only file over an S3 object, downloading byte ranges ahead of the
+    reader in parallel.
+
+    At most ``concurrency`` parts are held or in flight at any time, so
+    memory use is bounded by ``concurrency * part_size`` however large the
+    object is. Wrap it in :class:`io.BufferedReader` for efficient small
+    reads.
+
+    Parameters
+    ----------
+    client : botocore.client.S3
+        Client to download with.
+    bucket, key : str
+        Location of the object.
+    size : int
+        Size of the object in bytes.
+    part_size : int
+        Size of each ranged request.
+    concurrency : int
+        Number of parts downloaded at once.
+    first : bytes, (optional)
+        Content of the first part, if already downloaded.
+    etag : str, (optional)
+        ETag the parts must match, so that an object replaced during the
+        download fails the read instead of mixing two versions.
+    """
+
+    def __init__(self, client, bucket, key, size, part_size, concurrency,
+                 first=None, etag=None):
+        super().__init__()
+        self._fetch = (client, bucket, key)
+        self._etag = etag
+        self._size = size
+        self._part_size = part_size
+        self._pool = ThreadPoolExecutor(concurrency)
+        self._concurrency = concurrency
+        self._parts = deque()
+        self._offset = 0  # Start of the next part to request
+        self._buffer = memoryview(b'')
+
+        if first is not None:
+            self._buffer = memoryview(first)
+            self._offset = len(first)
+
+        self._schedule()
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+
+        while not self._buffer:
+            if not self._parts:
+                return 0
+            self._buffer = memoryview(self._parts.popleft().result())
+            self._schedule()
+
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+
+        return n
+
+    def close(self):
+        if not self.closed:
+            for future in self._parts:
+                future.cancel()
+            self._pool.shutdown(wait=False)
+        super().close()
+
+    def _schedule(self):
+        """Keep ``concurrency`` parts in flight."""
+
+        while len(self._parts) < self._concurrency and \
+                self._offset < self._size:
+            end = min(self._offset + self._part_size, self._size)
+            self._parts.append(self._pool.submit(
+                _get_range, *self._fetch, self._offset, end, self._etag))
+            self._offset = end
+
+
+class S3Snapshot(DirectorySnapshot):
+    """
+    Record of every "directory" under an S3 prefix, with the ETag of every
+    object in it.
+
+    Keys are split into directories on ``/``. Each directory is listed with
+    paginated ``list_objects_v2`` requests, and the listings of sibling
+    prefixes run concurrently on ``workers`` threads.
+
+    Parameters
+    ----------
+    root : str
+        URL of the prefix, like ``'s3://bucket/prefix'``.
+    dirs : dict, (optional)
+        As for :class:`fyda.index.DirectorySnapshot`, the records holding a
+        digest of the listing in place of the mtime, and an ``'etags'``
+        mapping of file names to ETags.
+    workers : int, (optional)
+        Number of threads listing prefixes concurrently.
+    client : botocore.client.S3, (optional)
+        Client to list with. Defaults to :func:`get_client`.
+
+    Notes
+    -----
+    S3 has no cheap equivalent of a directory mtime, so :meth:`refresh` lists
+    every prefix again. Only the records of prefixes whose listing changed
+    are replaced, though, and the listings are made in parallel.
+    """
+
+    def __init__(self, root, dirs=None, workers=1, client=None):
+        super().__init__(root.rstrip('/'), dirs, workers)
+        self.client = client
+        self._listings = {}  # Made while checking stamps, reused by _list
+        self._listings_lock = threading.Lock()
+
+    @classmethod
+    def scan(cls, root, workers=1, client=None):
+        """List every object under ``root``."""
+
+        snapshot = cls(root, workers=workers, client=client)
+        snapshot._scan_subtrees([('', None)])
+        snapshot.dirs = dict(sorted(snapshot.dirs.items()))
+        return snapshot
+
+    @classmethod
+    def from_dict(cls, root, record, workers=1, client=None):
+        """Rebuild a snapshot from the output of :meth:`to_dict`."""
+
+        return cls(root, record, workers, client)
+
+    def etag(self, url):
+        """ETag of the object at ``url`` when it was last listed, or None."""
+
+        rel, _, name = url[len(self.root) + 1:].rpartition('/')
+        record = self.dirs.get(rel)
+
+        return None if record is None else record['etags'].get(name)
+
+    def refresh(self, dirs=None):
+        """List the prefixes again, returning ``(added, removed)`` as
+        :meth:`fyda.index.DirectorySnapshot.refresh` does."""
+
+        try:
+            return super().refresh(dirs)
+        finally:
+            with self._listings_lock:
+                self._listings.clear()
+
+    def _abspath(self, rel):
+        return self.root + '/' + rel if rel else self.root
+
+    def _list(self, path, mtime=None):
+
+        with self._listings_lock:
+            listing = self._listings.pop(path, None)
+
+        if listing is None:
+            listing = _list_prefix(self.client or get_client(), path)
+
+        return listing
+
+    def _stamp(self, path):
+
+        listing = _list_prefix(self.client or get_client(), path)
+
+        if listing is None:
+            return None
+
+        with self._listings_lock:
+            self._listings[path] = listing
+
+        return listing[0]['mtime']
+
+
+class ObjectCache:
+    """
+    Local copies of S3 objects, so that unchanged objects are downloaded
+    once.
+
+    Before a copy is used, the ETag it was downloaded with is compared to
+    that of the object with a ``HEAD`` request, unless the copy was checked
+    less than ``ttl`` seconds ago. Copies are written to a temporary file and
+    moved into place, so several processes can share the folder. Each copy
+    is named after the ETag of its content, so a record of the current ETag
+    can never be paired with the bytes of another version.
+
+    Parameters
+    ----------
+    directory : str
+        Folder holding the copies. It is created when first written to.
+    max_bytes : int
+        Size cap for the folder. The least recently used copies are deleted
+        to make room for new ones, and objects larger than the whole cap are
+        not cached.
+    ttl : float, (optional)
+        Seconds a copy is trusted after it was last checked. The default of 0
+        checks on every use.
+    """
+
+    def __init__(self, directory, max_bytes, ttl=0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):  # Sent along to worker processes
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def fetch(self, client, bucket, key):
+        """
+        Path to an up-to-date copy of an object, downloading it if needed.
+
+        Returns
+        -------
+        path : str or None
+            None if the object is too large for the cache or the copy
+            couldn't be written, in which case it should be read from S3.
+        """
+
+        return self.locate(client, bucket, key)[0]
+
+    def locate(self, client, bucket, key):
+        """
+        As :meth:`fetch`, also returning what was already downloaded of an
+        object that couldn't be cached.
+
+        Returns
+        -------
+        path : str or None
+            As for :meth:`fetch`.
+        first_part : tuple or None
+            If ``path`` is None, the first part of the object, to be passed
+            on to :func:`open_object`.
+        """
+
+        record = self._record(bucket, key)
+        meta = _read_meta(record)
+        path = None if meta is None else self._path(bucket, key, meta['etag'])
+
+        if path is not None and os.path.exists(path):
+            fresh = time.time() - meta['checked'] < self.ttl
+            if not fresh and client.head_object(
+                    Bucket=bucket, Key=key).get('ETag') == meta['etag']:
+                meta['checked'] = time.time()
+                _write_meta(record, meta)
+                fresh = True
+            if fresh:
+                try:
+                    os.utime(path)  # Mark as recently used for eviction
+                except OSError:
+                    pass
+                with self._lock:
+                    self._hits += 1
+                return path, None
+
+        with self._lock:
+            self._misses += 1
+
+        first_part = _first_part(client, bucket, key)
+        first, size, etag = first_part
+        path = self._path(bucket, key, etag)
+
+        if size > self.max_bytes:
+            return None, first_part
+
+        if not os.path.exists(path):  # Or another process downloaded it
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=_TMP)
+            except OSError as e:
+                _warn_write(self.directory, e)
+                return None, first_part
+
+            try:
+                with os.fdopen(fd, 'w+b') as fileobj:
+                    _download(client, bucket, key, size,
+                              options.S3_PART_SIZE, options.S3_CONCURRENCY,
+                              first, fileobj, etag)
+                self.evict(self.max_bytes - size)
+                os.replace(tmp, path)
+            except OSError as e:
+                _remove(tmp)
+                _warn_write(self.directory, e)
+                return None, first_part
+            except BaseException:
+                _remove(tmp)
+                raise
+
+        _write_meta(record, {'bucket': bucket, 'key': key, 'etag': etag,
+                             'checked': time.time()})
+
+        return path, None
+
+    def evict(self, max_bytes=None):
+        """Delete the least recently used copies until the cache fits in
+        ``max_bytes``, which defaults to the cache's size cap."""
+
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+
+        entries = []
+        total = 0
+
+        try:
+            for entry in os.scandir(self.directory):
+                if entry.name.startswith(_TMP) or \
+                        entry.name.endswith(_META):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime_ns, st.st_size, entry.path))
+                total += st.st_size
+        except OSError:
+            return
+
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            _remove(path)
+            total -= size
+
+    def clear(self):
+        """Delete every copy and reset the statistics."""
+
+        self.evict(0)
+
+        with self._lock:
+            self._hits = self._misses = 0
+
+    def info(self):
+        """Hit and miss statistics, as a :class:`fyda.cache.CacheInfo`."""
+
+        entries = nbytes = 0
+
+        try:
+            for entry in os.scandir(self.directory):
+                if entry.name.startswith(_TMP) or \
+                        entry.name.endswith(_META):
+                    continue
+                try:
+                    nbytes += entry.stat().st_size
+                except OSError:
+                    continue
+                entries += 1
+        except OSError:
+            pass
+
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, entries, nbytes,
+                             self.max_bytes)
+
+    def _path(self, bucket, key, etag):
+        """Location of the copy of the version ``etag`` of an object,
+        keeping its extension for readers that look at it."""
+
+        name = key.rpartition('/')[2]
+        extension = name[name.index('.'):] if '.' in name[1:] else ''
+        digest = hashlib.sha1('{}/{}\0{}'.format(bucket, key, etag)
+                              .encode('utf-8'))
+
+        return os.path.join(self.directory, digest.hexdigest() + extension)
+
+    def _record(self, bucket, key):
+        """Location of the record of the ETag of the current copy of an
+        object."""
+
+        digest = hashlib.sha1('{}/{}'.format(bucket, key).encode('utf-8'))
+
+        return os.path.join(self.directory, digest.hexdigest() + _META)
+
+
+# -----------------------------------------------------------------------------
+# Module-level library
+# -----------------------------------------------------------------------------
+def _download(client, bucket, key, size, part_size, concurrency, first,
+              fileobj, etag=None):
+    """Download the object into the seekable ``fileobj``, ``concurrency``
+    parts at a time, each written as soon as it arrives."""
+
+    lock = threading.Lock()
+
+    def fetch(start):
+        data = _get_range(client, bucket, key, start,
+                          min(start + part_size, size), etag)
+        with lock:
+            fileobj.seek(start)
+            fileobj.write(data)
+
+    fileobj.write(first)
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        for future in [pool.submit(fetch, start)
+                       for start in range(len(first), size, part_size)]:
+            future.result()
+
+    fileobj.seek(0)
+
+
+def _error_code(error):
+    """Error code of a failed S3 request, or None."""
+
+    return getattr(error, 'response', {}).get('Error', {}).get('Code')
+
+
+def _first_part(client, bucket, key):
+    """
+    First ``fyda.options.S3_PART_SIZE`` bytes of an object.
+
+    Returns
+    -------
+    first : bytes
+    size : int
+        Size of the whole object.
+    etag : str or None
+    """
+
+    try:
+        response = client.get_object(
+            Bucket=bucket, Key=key,
+            Range='bytes=0-{}'.format(options.S3_PART_SIZE - 1))
+    except Exception as e:
+        if _error_code(e) != 'InvalidRange':
+            raise
+        response = client.get_object(Bucket=bucket, Key=key)  # Empty object
+
+    first = response['Body'].read()
+    match = _CONTENT_RANGE.match(response.get('ContentRange') or '')
+    size = int(match.group(1)) if match else len(first)
+
+    return first, size, response.get('ETag')
+
+
+def _get_range(client, bucket, key, start, end, etag=None):
+    """Bytes ``start`` up to ``end`` of the object, which must still have
+    ``etag`` if one is given."""
+
+    kwargs = {} if etag is None else {'IfMatch': etag}
+    response = client.get_object(Bucket=bucket, Key=key,
+                                 Range='bytes={}-{}'.format(start, end - 1),
+                                 **kwargs)
+
+    return response['Body'].read()
+
+
+def _list_prefix(client, url):
+    """
+    List the objects and common prefixes directly under ``url``.
+
+    Returns
+    -------
+    listing : tuple or None
+        ``(record, subdirs)`` as returned by :func:`fyda.index._list_dir`,
+        the record's ``'mtime'`` being a digest of the names and ETags, or
+        None if nothing is stored under a prefix other than the bucket.
+    """
+
+    bucket, prefix = split_url(url)
+    if prefix:
+        prefix += '/'
+
+    etags, dirs = {}, []
+    pages = client.get_paginator('list_objects_v2').paginate(
+        Bucket=bucket, Prefix=prefix, Delimiter='/')
+
+    for page in pages:
+        for obj in page.get('Contents', []):
+            name = obj['Key'][len(prefix):]
+            if name:  # Skip the marker object of a "folder"
+                etags[name] = obj.get('ETag')
+        dirs.extend(p['Prefix'][len(prefix):-1]
+                    for p in page.get('CommonPrefixes', []))
+
+    if prefix and not etags and not dirs:
+        return None
+
+    record = {'files': sorted(etags), 'dirs': sorted(dirs), 'etags': etags}
+    record['mtime'] = hashlib.sha1(
+        json.dumps(record, sort_keys=True).encode('utf-8')).hexdigest()
+
+    return record, dict.fromkeys(dirs)
+
+
+def _read_meta(path):
+    """ETag record of a cached object, or None if there is none."""
+
+    try:
+        with open(path, 'r') as fileobj:
+            meta = json.load(fileobj)
+        meta['etag'], meta['checked']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+    return meta
+
+
+def _remove(path):
+    """Delete ``path`` if it exists."""
+
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _warn_write(directory, error):
+    """Report a failure to write to the object cache."""
+
+    if options.SHOW_WARNINGS:
+        warnings.warn('Unable to write to S3 object cache "{}": {}'
+                      .format(directory, error))
+
+
+def _write_meta(path, meta):
+    """Replace the ETag record of a cached object atomically."""
+
+    directory = os.path.dirname(path)
+
+    try:
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=_TMP)
+        try:
+            with os.fdopen(fd, 'w') as fileobj:
+                json.dump(meta, fileobj)
+            os.replace(tmp, path)
+        except BaseException:
+            _remove(tmp)
+            raise
+    except OSError as e:
+        _warn_write(directory, e)
+
+
+# -----------------------------------------------------------------------------
+# Public library
+# -----------------------------------------------------------------------------
+def clear_clients():
+    """Discard every pooled client, e.g. after credentials changed."""
+
+    with _CLIENTS_LOCK:
+        _CLIENTS.clear()
+
+
+def get_client(profile=None, region=None, endpoint_url=None,
+               max_pool_connections=None):
+    """
+    Pooled S3 client for the given settings.
+
+    Creating a client resolves credentials and opens new connections, which
+    can take longer than fetching a small object. Clients are therefore
+    created once per combination of settings and reused, along with their
+    warm connections, from any thread.
+
+    Parameters
+    ----------
+    profile : str, (optional)
+        AWS profile to take credentials from. Defaults to
+        ``fyda.options.S3_PROFILE``, then the default credential chain.
+    region : str, (optional)
+        Region of the buckets. Defaults to ``fyda.options.S3_REGION``.
+    endpoint_url : str, (optional)
+        URL of an S3-compatible service, such as MinIO. Defaults to
+        ``fyda.options.S3_ENDPOINT_URL``.
+    max_pool_connections : int, (optional)
+        Most connections kept open by the client, which bounds how many
+        requests it can run at once. Defaults to
+        ``fyda.options.S3_MAX_POOL_CONNECTIONS``.
+
+    Returns
+    -------
+    client : botocore.client.S3
+    """
+
+    import boto3
+    from botocore.config import Config
+
+    profile = profile or options.S3_PROFILE
+    region = region or options.S3_REGION
+    endpoint_url = endpoint_url or options.S3_ENDPOINT_URL
+    max_pool_connections = max_pool_connections or \
+        options.S3_MAX_POOL_CONNECTIONS
+
+    key = (os.getpid(), profile, region, endpoint_url, max_pool_connections)
+
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            session = boto3.session.Session(profile_name=profile,
+                                            region_name=region)
+            client = _CLIENTS[key] = session.client(
+                's3', endpoint_url=endpoint_url,
+                config=Config(max_pool_connections=max_pool_connections))
+
+    return client
+
+
+def is_s3_url(path):
+    """Whether ``path`` is an ``s3://`` URL."""
+
+    return isinstance(path, str) and path.startswith(_SCHEME)
+
+
+def open_object(client, bucket, key, sequential=False, first_part=None):
+    """
+    Open an S3 object for reading, downloading large objects in parallel
+    byte ranges.
+
+    The first ``fyda.options.S3_PART_SIZE`` bytes are requested on their
+    own, which also tells the size of the object; smaller objects are done
+    after that single request. For larger ones, the remaining parts are
+    downloaded ``fyda.options.S3_CONCURRENCY`` at a time.
+
+    Parameters
+    ----------
+    client : botocore.client.S3
+        Client to download with.
+    bucket, key : str
+        Location of the object.
+    sequential : bool, (optional)
+        Whether the caller reads the object from start to end without
+        seeking. If so, a :class:`RangedReader` is returned, so reading can
+        start before the download finishes. Otherwise the object is
+        assembled in memory or, above ``fyda.options.S3_SPILL_BYTES``, in a
+        temporary file.
+    first_part : tuple, (optional)
+        First part of the object if it was already requested, as returned
+        by :meth:`ObjectCache.locate`.
+
+    Returns
+    -------
+    fileobj : file-like
+        Binary file positioned at the start of the object, to be closed by
+        the caller.
+    """
+
+    part_size = options.S3_PART_SIZE
+    concurrency = options.S3_CONCURRENCY
+    first, size, etag = first_part or _first_part(client, bucket, key)
+
+    if size <= len(first):
+        return io.BytesIO(first)
+
+    if sequential:
+        return io.BufferedReader(
+            RangedReader(client, bucket, key, size, part_size, concurrency,
+                         first, etag), part_size)
+
+    if size > options.S3_SPILL_BYTES:
+        fileobj = tempfile.TemporaryFile()
+    else:
+        fileobj = io.BytesIO()
+
+    try:
+        _download(client, bucket, key, size, part_size, concurrency, first,
+                  fileobj, etag)
+    except BaseException:
+        fileobj.close()
+        raise
+
+    return fileobj
+
+
+def split_url(url):
+    """Bucket and key of an ``s3://bucket/key`` URL; the key may be
+    empty."""
+
+    bucket, _, key = url[len(_SCHEME):].partition('/')
+
+    return bucket, key.strip('/')
@@ -0,0 +1,262 @@
+"""Learned column types for CSV files."""
+import json
+import os
+import re
+import tempfile
+import threading
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from . import options
+
+
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+SCHEMA_VERSION = 2
+
+# Strings that parse unambiguously as ISO 8601 dates or timestamps
+_ISO_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}'
+                       r'([ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?$')
+
+
+# -----------------------------------------------------------------------------
+# Classes
+# -----------------------------------------------------------------------------
+class SchemaStore:
+    """
+    Learned schemas of files, keyed by absolute path, each valid for the
+    version of its file given by a stamp.
+
+    Parameters
+    ----------
+    path : str, (optional)
+        JSON file to persist the schemas in. If none is provided, schemas
+        only live as long as the store.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._schemas = None  # Read on first use
+        self._lock = threading.Lock()
+
+    def __getstate__(self):  # Sent along to worker processes
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def get(self, filename, stamp):
+        """Schema learned for the version ``stamp`` of ``filename``, or
+        None."""
+
+        with self._lock:
+            schema = self._load().get(_key(filename))
+
+        if schema is None or schema.get('stamp') != stamp:
+            return None
+
+        return schema
+
+    def items(self):
+        """List of ``(path, schema)`` pairs."""
+
+        with self._lock:
+            return list(self._load().items())
+
+    def put(self, filename, stamp, schema):
+        """Store the schema of the version ``stamp`` of ``filename``,
+        persisting it if the store has a path."""
+
+        schema = dict(schema, stamp=stamp)
+
+        with self._lock:
+            self._load()[_key(filename)] = schema
+            if self.path is not None:
+                self._write()
+
+    def _load(self):
+        """Schemas by path, read from the file on first use."""
+
+        if self._schemas is None:
+            self._schemas = {}
+            if self.path is not None:
+                self._schemas.update(_read_file(self.path))
+
+        return self._schemas
+
+    def _write(self):
+        """Merge the schemas into the file, replacing it atomically."""
+
+        schemas = _read_file(self.path)
+        schemas.update(self._schemas)
+        content = {'version': SCHEMA_VERSION, 'schemas': schemas}
+
+        try:
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path),
+                                       prefix=os.path.basename(self.path))
+            try:
+                with os.fdopen(fd, 'w') as fileobj:
+                    json.dump(content, fileobj)
+                os.replace(tmp, self.path)
+            except BaseException:
+                os.remove(tmp)
+                raise
+        except OSError as e:
+            if options.SHOW_WARNINGS:
+                warnings.warn('Unable to write schemas "{}": {}'
+                              .format(self.path, e))
+
+
+# -----------------------------------------------------------------------------
+# Module-level library
+# -----------------------------------------------------------------------------
+def _is_dates(series):
+    """Whether every value in ``series`` is an ISO 8601 date string."""
+
+    values = series.dropna()
+
+    return len(values) > 0 and bool(values.map(type).eq(str).all()) and \
+        bool(values.str.match(_ISO_DATE).all())
+
+
+def _is_integer(dtype):
+    """Whether ``dtype`` is a NumPy integer type."""
+
+    return pd.api.types.is_integer_dtype(dtype) and \
+        not pd.api.types.is_bool_dtype(dtype)
+
+
+def _key(filename):
+    """Absolute path of ``filename``, or the URL itself for remote files."""
+
+    return filename if '://' in filename else os.path.abspath(filename)
+
+
+def _read_file(path):
+    """Schemas stored in ``path``, or an empty dict if there are none."""
+
+    try:
+        with open(path, 'r') as fileobj:
+            content = json.load(fileobj)
+    except (OSError, ValueError):
+        return {}
+
+    if not isinstance(content, dict) or \
+            content.get('version') != SCHEMA_VERSION:
+        return {}
+
+    return content.get('schemas', {})
+
+
+# -----------------------------------------------------------------------------
+# Public library
+# -----------------------------------------------------------------------------
+def apply_schema(frame, schema):
+    """
+    Convert the columns of ``frame`` to the types in ``schema``.
+
+    Integers are only narrowed if all their values fit the narrower type,
+    and columns that don't parse as dates are left as they are and dropped
+    from ``schema['parse_dates']``.
+    """
+
+    types = {}
+
+    for column, dtype in schema['dtype'].items():
+        if column not in frame.columns:
+            continue
+        series = frame[column]
+        if not _is_integer(dtype):
+            types[column] = dtype
+        elif _is_integer(series.dtype) and (series.empty or (
+                np.iinfo(dtype).min <= series.min() and
+                series.max() <= np.iinfo(dtype).max)):
+            types[column] = dtype
+
+    frame = frame.astype(types)
+
+    for column in list(schema['parse_dates']):
+        if column not in frame.columns:
+            continue
+        try:
+            frame[column] = pd.to_datetime(frame[column])
+        except (ValueError, TypeError, OverflowError):
+            schema['parse_dates'].remove(column)
+
+    return frame
+
+
+def learn_schema(frame):
+    """
+    Compact column types for ``frame``.
+
+    Strings with few distinct values become categories, ISO 8601 date
+    strings become timestamps and integers are downcast to the smallest type
+    holding them. Floats are left alone, since narrowing them would lose
+    precision.
+
+    Returns
+    -------
+    schema : dict
+        ``{'dtype': {column: type}, 'parse_dates': [column, ...]}``, usable
+        as arguments to :func:`pandas.read_csv`.
+    """
+
+    dtype, parse_dates = {}, []
+
+    for column in frame.columns:
+
+        series = frame[column]
+
+        if series.dtype == object or \
+                pd.api.types.is_string_dtype(series.dtype):
+            if _is_dates(series):
+                parse_dates.append(column)
+            elif series.map(type).eq(str).sum() == series.count() and \
+                    series.nunique() <= options.SCHEMA_CATEGORY_RATIO * \
+                    max(len(series), 1):
+                dtype[column] = 'category'
+        elif _is_integer(series.dtype):
+            dtype[column] = str(pd.to_numeric(series,
+                                              downcast='integer').dtype)
+
+    return {'dtype': dtype, 'parse_dates': parse_dates}
+
+
+def schema_kwargs(schema, kwargs):
+    """
+    Arguments for :func:`pandas.read_csv` applying ``schema`` on top of
+    ``kwargs``.
+
+    Integers are parsed as 64-bit, since pandas wraps values overflowing a
+    narrower type; :func:`apply_schema` narrows them afterwards.
+    """
+
+    kwargs = dict(kwargs)
+    parse_dates = schema['parse_dates']
+    usecols = kwargs.get('usecols', kwargs.get('columns'))
+
+    if usecols is not None and not callable(usecols):
+        parse_dates = [c for c in parse_dates if c in usecols]
+
+    kwargs['dtype'] = {
+        column: ('uint64' if dtype.startswith('uint') else 'int64')
+        if _is_integer(dtype) else dtype
+        for column, dtype in schema['dtype'].items()}
+    if parse_dates:
+        kwargs['parse_dates'] = parse_dates
+
+    return kwargs
+
+
+def schema_path(config_path):
+    """Location of the learned schemas belonging to ``config_path``."""
+
+    return os.path.join(os.path.dirname(os.path.abspath(config_path)),
+                        options.SCHEMA_NAME)
@@ -0,0 +1,294 @@
+"""Filesystem watchers that keep a DataBank in step with its root."""
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import warnings
+
+from . import options
+
+
+# -----------------------------------------------------------------------------
+# Constants
+# -----------------------------------------------------------------------------
+# Event flags from <sys/inotify.h>
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+
+_WATCH_MASK = (IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+               | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+# -----------------------------------------------------------------------------
+# Classes
+# -----------------------------------------------------------------------------
+class PollingWatcher(threading.Thread):
+    """
+    Periodically refresh a :class:`fyda.DataBank` from a background thread.
+
+    Each poll costs one ``stat`` per directory; only modified directories are
+    listed again.
+
+    Parameters
+    ----------
+    bank : DataBank
+        Bank to keep up to date.
+    interval : float
+        Seconds between polls.
+    """
+
+    def __init__(self, bank, interval):
+        super().__init__(name='fyda-poll-watcher', daemon=True)
+        self.bank = bank
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.bank._apply_changes()
+            except Exception as e:  # Keep watching through transient errors
+                _warn(e)
+
+    def stop(self):
+        """Stop watching and wait for the thread to finish."""
+
+        self._stopped.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join()
+
+
+class InotifyWatcher(threading.Thread):
+    """
+    Apply changes to a :class:`fyda.DataBank` as inotify reports them.
+
+    Only the directories named in the events are listed again, so the cost of
+    an update is independent of the size of the root.
+
+    Parameters
+    ----------
+    bank : DataBank
+        Bank to keep up to date.
+
+    Raises
+    ------
+    OSError
+        If inotify is not available on this platform, or the system limit on
+        watches is reached.
+    """
+
+    def __init__(self, bank):
+        super().__init__(name='fyda-inotify-watcher', daemon=True)
+        self.bank = bank
+        self._libc = _load_libc()
+        self._fd = self._libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if self._fd < 0:
+            _raise_errno()
+        self._wake_r, self._wake_w = os.pipe()
+        self._watches = {}  # Watch descriptor -> relative directory
+        self._stopped = False
+        self._closed = False
+        self._close_lock = threading.Lock()
+
+        try:
+            self._sync_watches(initial=True)
+        except OSError:
+            self._close()
+            raise
+
+    def run(self):
+        try:
+            while not self._stopped:
+                ready, _, _ = select.select([self._fd, self._wake_r], [], [])
+                if self._stopped:
+                    break
+                if self._fd in ready:
+                    self._handle(self._read_events())
+        except Exception as e:
+            _warn(e)
+        finally:
+            self._close()
+
+    def stop(self):
+        """Stop watching and wait for the thread to finish."""
+
+        self._stopped = True
+        with self._close_lock:
+            if not self._closed:
+                os.write(self._wake_w, b'\0')
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join()
+
+    def _close(self):
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            for fd in (self._fd, self._wake_r, self._wake_w):
+                os.close(fd)
+
+    def _read_events(self):
+        """Read all pending events as (watch descriptor, mask) pairs."""
+
+        events = []
+
+        while True:
+            try:
+                buf = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return events
+
+            offset = 0
+            while offset < len(buf):
+                wd, mask, _, length = _EVENT_HEADER.unpack_from(buf, offset)
+                offset += _EVENT_HEADER.size + length
+                events.append((wd, mask))
+
+    def _handle(self, events):
+        """Apply a batch of events to the bank."""
+
+        dirs = set()
+
+        for wd, mask in events:
+            if mask & IN_Q_OVERFLOW:  # Events were lost, so check everything
+                self.bank._apply_changes()
+                self._sync_watches()
+                return
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            if wd in self._watches:
+                dirs.add(self._watches[wd])
+
+        if dirs:
+            self.bank._apply_changes(dirs)
+            self._sync_watches()
+
+    def _sync_watches(self, initial=False):
+        """Watch every directory in the bank's snapshot. Directories that
+        appear while being watched are rescanned, since files may have been
+        created in them before their watch was in place."""
+
+        skipped = set()
+        new = self._unwatched()
+
+        while new:
+            for rel in new:
+                path = self.bank._snapshot._abspath(rel)
+                wd = self._libc.inotify_add_watch(
+                    self._fd, os.fsencode(path), _WATCH_MASK)
+                if wd < 0:
+                    if ctypes.get_errno() not in (errno.ENOENT,
+                                                  errno.ENOTDIR):
+                        _raise_errno()
+                    skipped.add(rel)  # Already gone again
+                    continue
+                self._watches[wd] = rel
+
+            if initial:  # Catch anything that changed since the last scan
+                self.bank._apply_changes()
+                initial = False
+            else:
+                self.bank._apply_changes(new)
+
+            new = [rel for rel in self._unwatched() if rel not in skipped]
+
+    def _unwatched(self):
+        """Directories in the bank's snapshot that have no watch yet."""
+
+        watched = set(self._watches.values())
+        return [rel for rel in list(self.bank._snapshot.dirs)
+                if rel not in watched]
+
+
+# -----------------------------------------------------------------------------
+# Module-level library
+# -----------------------------------------------------------------------------
+def _load_libc():
+    """Load the C library, checking that it provides inotify."""
+
+    if not sys.platform.startswith('linux'):
+        raise OSError('inotify is only available on Linux')
+
+    libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                       use_errno=True)
+
+    if not hasattr(libc, 'inotify_init1'):
+        raise OSError('The C library does not provide inotify')
+
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p,
+                                       ctypes.c_uint32]
+
+    return libc
+
+
+def _raise_errno():
+    """Raise the pending C library error as an OSError."""
+
+    err = ctypes.get_errno()
+    raise OSError(err, os.strerror(err))
+
+
+def _warn(error):
+    """Report an error in a watcher thread."""
+
+    if options.SHOW_WARNINGS:
+        warnings.warn('fyda watcher error: {}'.format(error))
+
+
+# -----------------------------------------------------------------------------
+# Public library
+# -----------------------------------------------------------------------------
+def start_watcher(bank, interval=None, backend=None):
+    """
+    Start watching the root of ``bank`` for changes.
+
+    Parameters
+    ----------
+    bank : DataBank
+        Bank to keep up to date.
+    interval : float, (optional)
+        Seconds between polls when polling. Defaults to
+        ``fyda.options.WATCH_INTERVAL``.
+    backend : str, {'inotify', 'poll'}, (optional)
+        Backend to use. If none is provided, inotify is used where available
+        and polling otherwise.
+
+    Returns
+    -------
+    watcher : InotifyWatcher or PollingWatcher
+        The running watcher thread.
+    """
+
+    if interval is None:
+        interval = options.WATCH_INTERVAL
+
+    if backend not in (None, 'inotify', 'poll'):
+        raise ValueError('Watch backend "{}" not understood.'.format(backend))
+
+    watcher = None
+
+    if backend in (None, 'inotify'):
+        try:
+            watcher = InotifyWatcher(bank)
+        except OSError:
+            if backend == 'inotify':
+                raise
+
+    if watcher is None:
+        watcher = PollingWatcher(bank, interval)
+
+    watcher.start()
+    return watcher
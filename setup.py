@@ -25,6 +25,11 @@ setup(
         'boto3',
         'pyyaml',
     ],
+    extras_require={
+        'parquet': ['pyarrow'],
+        'zstd': ['zstandard'],
+        'isal': ['isal'],
+    },
     classifiers=[
         'Development Status :: 3 - Alpha',
         'Intended Audience :: Developers',
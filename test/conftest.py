@@ -0,0 +1,69 @@
+"""Fixtures shared by the test suite."""
+import os
+
+import pytest
+import yaml
+
+import fyda
+from fyda import options
+
+
+@pytest.fixture
+def data_root(tmp_path, monkeypatch):
+    """Empty data root, with a fresh ``.fydarc`` next to it that fyda is
+    pointed at."""
+
+    root = tmp_path / 'data'
+    root.mkdir()
+    config = tmp_path / '.fydarc'
+    config.write_text(yaml.safe_dump({'directories': {'root': str(root)},
+                                      'data': {}}))
+    monkeypatch.setattr(options, 'CONFIG_LOCATION', str(config))
+
+    yield str(root)
+
+    fyda.invalidate()
+
+
+@pytest.fixture
+def write(data_root):
+    """Function creating files under the data root, given their paths
+    relative to it, and returning their absolute paths."""
+
+    def write(*relpaths, content='a,b\n1,2\n'):
+        paths = []
+        for relpath in relpaths:
+            path = os.path.join(data_root, *relpath.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as fileobj:
+                fileobj.write(content)
+            paths.append(path)
+        return paths
+
+    return write
+
+
+@pytest.fixture
+def s3(monkeypatch, tmp_path):
+    """S3 client talking to a mocked S3, with a ``bucket`` bucket, pooled
+    clients cleared before and after."""
+
+    moto = pytest.importorskip('moto')
+    from fyda.s3 import clear_clients, get_client
+
+    config = tmp_path / 'aws_config'
+    config.write_text('[default]\n[profile other]\n')
+    monkeypatch.setenv('AWS_CONFIG_FILE', str(config))
+    monkeypatch.setenv('AWS_SHARED_CREDENTIALS_FILE',
+                       str(tmp_path / 'aws_credentials'))
+    for variable in ('AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY'):
+        monkeypatch.setenv(variable, 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.delenv('AWS_PROFILE', raising=False)
+
+    clear_clients()
+    with moto.mock_aws():
+        client = get_client()
+        client.create_bucket(Bucket='bucket')
+        yield client
+    clear_clients()
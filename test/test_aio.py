@@ -0,0 +1,65 @@
+"""Tests for the asyncio variants of the loaders."""
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from fyda.base import DataBank
+
+
+class _SlowReader:
+    """Reader counting its calls, slow enough for requests to overlap."""
+
+    def __init__(self, make):
+        self.make = make
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, filename):
+        with self._lock:
+            self.calls += 1
+        time.sleep(0.2)
+        return self.make()
+
+
+def _gather(db, name, reader, count=20):
+    async def main():
+        return await asyncio.gather(*[db.awithdraw(name, reader=reader)
+                                      for _ in range(count)])
+    return asyncio.run(main())
+
+
+def test_coalesced_callers_get_copies(data_root, write):
+    write('u.csv')
+    reader = _SlowReader(lambda: pd.DataFrame({'a': [1, 2, 3]}))
+
+    results = _gather(DataBank(index=False), 'u', reader)
+
+    assert reader.calls == 1
+    assert len({id(r) for r in results}) == len(results)
+
+    results[0].loc[0, 'a'] = 100
+    assert all(r.loc[0, 'a'] == 1 for r in results[1:])
+
+
+def test_coalesced_readonly_mode(data_root, write):
+    write('u.csv')
+    reader = _SlowReader(lambda: np.arange(3))
+
+    results = _gather(DataBank(index=False, cache_bytes=2 ** 20,
+                               cache_mode='readonly'), 'u', reader)
+
+    assert reader.calls == 1
+    assert not any(r.flags.writeable for r in results)
+
+
+def test_single_caller(data_root, write):
+    write('u.csv')
+    reader = _SlowReader(lambda: {'a': [1]})
+
+    result, = _gather(DataBank(index=False), 'u', reader, count=1)
+
+    assert result == {'a': [1]}
+    assert reader.calls == 1
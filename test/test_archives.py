@@ -0,0 +1,135 @@
+"""Tests for reading files inside zip and tar archives."""
+import io
+import os
+import struct
+import tarfile
+import zipfile
+
+import pytest
+
+from fyda import archives, options
+from fyda.archives import list_members, member_path, open_member
+from fyda.base import DataBank
+
+# Large enough to span several chunks of the inflater
+_BIG = b'a,b\n' + b''.join(b'%d,%d\n' % (i, i * i) for i in range(20000))
+
+
+def _zip(path, members, compress_type=zipfile.ZIP_DEFLATED):
+    with zipfile.ZipFile(path, 'w') as archive:
+        for name, data in members.items():
+            archive.writestr(name, data, compress_type=compress_type)
+    return path
+
+
+def _tar(path, members, mode='w'):
+    with tarfile.open(path, mode) as archive:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return path
+
+
+def _read(archive, name, **kwargs):
+    with open_member(member_path(archive, name), **kwargs) as fileobj:
+        return fileobj.read()
+
+
+@pytest.mark.parametrize('compress_type', [zipfile.ZIP_STORED,
+                                           zipfile.ZIP_DEFLATED])
+def test_zip_members(data_root, compress_type):
+    path = _zip(os.path.join(data_root, 'a.zip'),
+                {'small.csv': b'a\n1\n', 'sub/big.csv': _BIG},
+                compress_type)
+
+    assert list_members(path)['sub/big.csv'][0] == 'zip'
+    assert _read(path, 'small.csv') == b'a\n1\n'
+    assert _read(path, 'sub/big.csv') == _BIG
+    assert _read(path, 'sub/big.csv', sequential=True) == _BIG
+
+    with open_member(member_path(path, 'sub/big.csv')) as fileobj:
+        assert fileobj.seekable()
+        fileobj.seek(4)
+        assert fileobj.read(4) == b'0,0\n'
+
+
+@pytest.mark.parametrize('name, mode, kind', [
+    ('a.tar', 'w', 'tar'), ('a.tar.gz', 'w:gz', 'tarstream'),
+    ('a.tbz2', 'w:bz2', 'tarstream')])
+def test_tar_members(data_root, name, mode, kind):
+    path = _tar(os.path.join(data_root, name),
+                {'small.csv': b'a\n1\n', 'sub/big.csv': _BIG}, mode)
+
+    assert list_members(path)['small.csv'][0] == kind
+    assert _read(path, 'small.csv') == b'a\n1\n'
+    assert _read(path, 'sub/big.csv') == _BIG
+    assert _read(path, 'sub/big.csv', sequential=True) == _BIG
+
+    with pytest.raises(FileNotFoundError):
+        open_member(member_path(path, 'missing.csv'))
+
+
+def test_bad_crc(data_root):
+    path = _zip(os.path.join(data_root, 'a.zip'), {'t.csv': _BIG})
+    crc = struct.pack('<I', zipfile.ZipFile(path).getinfo('t.csv').CRC)
+
+    with open(path, 'rb') as fileobj:
+        data = fileobj.read()
+    bad = struct.pack('<I', struct.unpack('<I', crc)[0] ^ 1)
+    with open(path, 'wb') as fileobj:
+        fileobj.write(data.replace(crc, bad))
+
+    with pytest.raises(zipfile.BadZipFile):
+        _read(path, 't.csv', sequential=True)
+
+
+def test_names_outside_the_archive_are_skipped(data_root):
+    members = {'ok.csv': b'a\n1\n', '../up.csv': b'a\n2\n',
+               '/abs.csv': b'a\n3\n', 'sub/../../up2.csv': b'a\n4\n'}
+    zipped = _zip(os.path.join(data_root, 'a.zip'), members)
+    tarred = _tar(os.path.join(data_root, 'b.tar'), members)
+
+    assert list(list_members(zipped)) == ['ok.csv']
+    assert list(list_members(tarred)) == ['ok.csv']
+    with pytest.raises(FileNotFoundError):
+        open_member(member_path(zipped, '../up.csv'))
+
+
+@pytest.mark.parametrize('name, make', [
+    ('a.zip', _zip), ('a.tar.gz', lambda p, m: _tar(p, m, 'w:gz'))])
+def test_spill_to_disk(data_root, monkeypatch, name, make):
+    path = make(os.path.join(data_root, name), {'t.csv': _BIG})
+    monkeypatch.setattr(options, 'DECOMPRESS_SPILL_BYTES', 1024)
+
+    with open_member(member_path(path, 't.csv')) as fileobj:
+        assert fileobj._rolled
+        assert fileobj.read() == _BIG
+
+    monkeypatch.setattr(options, 'DECOMPRESS_SPILL_BYTES', 2 ** 30)
+    with open_member(member_path(path, 't.csv')) as fileobj:
+        assert not fileobj._rolled
+
+
+def test_withdraw_members(data_root, write):
+    write('plain.csv')
+    _zip(os.path.join(data_root, 'a.zip'), {'z.csv': b'a\n1\n',
+                                            'sub/y.json': b'{"x": 1}'})
+    _tar(os.path.join(data_root, 'b.tar.gz'), {'t.csv': b'a\n2\n'}, 'w:gz')
+    db = DataBank(index=False, archives=True)
+
+    assert sorted(db.shortcuts) == ['plain', 't', 'y', 'z']
+    assert db.withdraw('z')['a'].tolist() == [1]
+    assert db.withdraw('y') == {'x': 1}
+    assert db.withdraw('t')['a'].tolist() == [2]
+    assert sum(len(chunk) for chunk in db.withdraw('z', chunksize=1)) == 1
+
+
+def test_listings_follow_the_archive(data_root):
+    path = _zip(os.path.join(data_root, 'a.zip'), {'t.csv': b'a\n1\n'})
+    assert list(list_members(path)) == ['t.csv']
+
+    _zip(path, {'u.csv': b'a\n1\n', 'v.csv': b'a\n2\n'})
+    os.utime(path, ns=(0, 0))  # A different stamp even if written quickly
+    assert sorted(list_members(path)) == ['u.csv', 'v.csv']
+    assert archives._LISTINGS[path][1] is list_members(path)
@@ -0,0 +1,77 @@
+"""Tests for reading compressed files."""
+import io
+
+import pytest
+
+from fyda import compression, options
+from fyda.base import DataBank
+
+
+class _Unseekable(io.RawIOBase):
+    """Stand-in for a decompressing stream that can't seek, such as
+    zstandard's, passing the data through as is."""
+
+    opened = []
+
+    def __init__(self, source):
+        self._owned = not hasattr(source, 'read')
+        self._source = open(source, 'rb') if self._owned else source
+        _Unseekable.opened.append(self)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._source.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if self._owned and not self.closed:
+            self._source.close()
+        super().close()
+
+
+@pytest.fixture
+def unseekable(monkeypatch):
+    """Make .zst files decompress through :class:`_Unseekable`, returning
+    the streams opened."""
+
+    _Unseekable.opened = []
+    monkeypatch.setattr(compression, '_open_zstd', _Unseekable)
+
+    return _Unseekable.opened
+
+
+def test_sequential_reads_are_streamed(tmp_path, unseekable, monkeypatch):
+    path = tmp_path / 't.csv.zst'
+    path.write_bytes(b'a\n1\n')
+    monkeypatch.setattr(compression, '_spool', None)  # Must not be called
+
+    with compression.open_compressed(str(path), 'zstd',
+                                     sequential=True) as fileobj:
+        assert fileobj is unseekable[0]
+        assert fileobj.read() == b'a\n1\n'
+
+
+def test_other_reads_are_spooled(tmp_path, unseekable, monkeypatch):
+    path = tmp_path / 't.csv.zst'
+    path.write_bytes(b'a\n1\n' * 10)
+    monkeypatch.setattr(options, 'DECOMPRESS_SPILL_BYTES', 8)
+    monkeypatch.setattr(options, 'S3_SPILL_BYTES', 2 ** 30)
+
+    with compression.open_compressed(str(path), 'zstd') as fileobj:
+        assert fileobj.seekable()
+        assert fileobj._rolled  # Spilled to disk past the local limit
+        fileobj.seek(4)
+        assert fileobj.read() == b'a\n1\n' * 9
+    assert unseekable[0].closed
+
+
+def test_withdraw_streams_csv(data_root, write, unseekable):
+    write('t.csv.zst', content='a,b\n' + '1,2\n' * 5)
+    db = DataBank(index=False)
+
+    assert db.withdraw('t')['a'].tolist() == [1] * 5
+    assert sum(len(chunk) for chunk in db.withdraw('t', chunksize=2)) == 5
+    assert unseekable and all(stream.closed for stream in unseekable)
@@ -0,0 +1,64 @@
+"""Tests for the shortcut index kept next to .fydarc."""
+import os
+
+from fyda import base, options
+from fyda.base import DataBank
+
+
+def _spy_snapshots(monkeypatch):
+    """Record whether each snapshot taken was rebuilt from an index."""
+
+    calls = []
+    take = base._take_snapshot
+
+    def spy(root, workers, record=None):
+        calls.append(record is not None)
+        return take(root, workers, record)
+
+    monkeypatch.setattr(base, '_take_snapshot', spy)
+
+    return calls
+
+
+def test_index_is_written(data_root, write):
+    write('a.csv', 'sub/b.csv')
+    DataBank(index=True)
+    assert os.path.exists(os.path.join(os.path.dirname(data_root),
+                                        options.INDEX_NAME))
+
+
+def test_warm_start_picks_up_changes(data_root, write, monkeypatch):
+    a, _ = write('a.csv', 'sub/b.csv')
+    DataBank(index=True)
+
+    os.remove(a)
+    write('sub/deeper/c.csv', 'd.json')
+    calls = _spy_snapshots(monkeypatch)
+    db = DataBank(index=True)
+
+    assert calls == [True]  # Restored, not scanned from scratch
+    assert sorted(db.shortcuts) == ['b', 'c', 'd']
+    assert db.shortcuts == DataBank(index=False).shortcuts
+
+
+def test_warm_start_rebases_collisions(data_root, write):
+    write('x/t.csv')
+    DataBank(index=True)
+
+    write('y/t.csv')
+    db = DataBank(index=True)
+
+    assert sorted(db.shortcuts) == ['x/t.csv', 'y/t.csv']
+
+
+def test_no_index_without_config(data_root, write, tmp_path, monkeypatch):
+    elsewhere = tmp_path / 'elsewhere'
+    elsewhere.mkdir()
+    monkeypatch.setattr(options, 'CONFIG_LOCATION',
+                        str(elsewhere / '.fydarc'))
+    write('a.csv')
+
+    db = DataBank(root=data_root, index=True)
+
+    assert list(db.shortcuts) == ['a']
+    assert os.listdir(str(elsewhere)) == []
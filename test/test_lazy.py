@@ -0,0 +1,71 @@
+"""Tests for lazy DataBanks, which resolve shortcuts on demand."""
+import os
+import random
+
+import pytest
+
+from fyda import options
+from fyda.base import DataBank, _default_shortcut
+from fyda.errorhandling import NoShortcutError
+
+
+def _resolve(db, name):
+    """Path ``name`` resolves to, or the type of error it raises."""
+
+    try:
+        return db._determine_path(name)
+    except NoShortcutError as e:
+        return NoShortcutError if type(e) is NoShortcutError else type(e)
+
+
+def test_deeper_collision_is_not_hidden(data_root, write):
+    deep, shallow = write('a/b/t.csv', 'c/t.csv')
+
+    with pytest.raises(NoShortcutError):
+        DataBank().withdraw('t')
+    with pytest.raises(NoShortcutError):
+        DataBank(lazy=True).withdraw('t')
+
+    lazy = DataBank(lazy=True)
+    assert lazy._determine_path('b/t.csv') == deep
+    assert lazy._determine_path('c/t.csv') == shallow
+
+
+def test_unique_name(data_root, write):
+    path, = write('a/b/c/unique.csv')
+    write('a/other.csv')
+
+    assert DataBank(lazy=True)._determine_path('unique') == path
+
+
+def test_relative_path(data_root, write):
+    path, _ = write('a/t.csv', 'b/t.csv')
+
+    assert DataBank(lazy=True)._determine_path('a/t.csv') == path
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_matches_eager_bank(data_root, write, seed):
+    rng = random.Random(seed)
+    folders = ['', 'a', 'b', 'a/b', 'b/a', 'a/b/c', 'c/a/b']
+    names = ['t', 'u', 'v', 'w.x']
+    relpaths = {'{}/{}{}'.format(rng.choice(folders), rng.choice(names),
+                                 rng.choice(['.csv', '.json'])).lstrip('/')
+                for _ in range(25)}
+    write(*relpaths)
+
+    eager = DataBank(index=False)
+    candidates = set(eager.shortcuts) | {_default_shortcut(p)
+                                         for p in relpaths} | relpaths
+
+    for name in sorted(candidates):
+        lazy = DataBank(index=False, lazy=True)
+        assert _resolve(lazy, name) == _resolve(eager, name), name
+
+
+def test_search_depth(data_root, write, monkeypatch):
+    write('t.csv', 'a/b/t.csv')
+    monkeypatch.setattr(options, 'LAZY_SEARCH_DEPTH', 1)
+
+    assert DataBank(lazy=True)._determine_path('t') == \
+        os.path.join(data_root, 't.csv')
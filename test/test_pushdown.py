@@ -0,0 +1,131 @@
+"""Tests for pushing columns and filters down into readers."""
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from fyda.base import DataBank
+from fyda.pushdown import apply_pushdown, pushdown_kwargs, split_pushdown
+from fyda.readers import read_arrow, read_csv
+
+_FRAME = pd.DataFrame({'a': [1, 2, 3, 4], 'b': list('wxyz'),
+                       'c': [0.5, 1.5, 2.5, 3.5]})
+
+
+@pytest.fixture
+def bank(data_root):
+    _FRAME.to_csv(os.path.join(data_root, 'frame.csv'), index=False)
+    _FRAME.to_pickle(os.path.join(data_root, 'pickled.pkl'))
+    with open(os.path.join(data_root, 'doc.json'), 'w') as fileobj:
+        json.dump({'a': [1, 2]}, fileobj)
+    return DataBank(index=False)
+
+
+def test_split_pushdown():
+    kwargs, columns, filters = split_pushdown(
+        {'sep': ';', 'columns': 'a', 'filters': [('a', '>', 1)]})
+
+    assert kwargs == {'sep': ';'}
+    assert columns == ['a']
+    assert filters == [[('a', '>', 1)]]
+    assert split_pushdown({})[1:] == (None, None)
+    assert split_pushdown({'filters': [[('a', '>', 1)], [('b', '==', 'x')]]})[
+        2] == [[('a', '>', 1)], [('b', '==', 'x')]]
+
+
+@pytest.mark.parametrize('op', ['~', 'like', '<>', None])
+def test_unsupported_operators(bank, op):
+    with pytest.raises(ValueError, match='not understood'):
+        split_pushdown({'filters': [('a', op, 1)]})
+    with pytest.raises(ValueError, match='not understood'):
+        bank.withdraw('frame', filters=[('a', op, 1)])
+
+
+def test_csv_arguments():
+    kwargs, chunked = pushdown_kwargs(
+        read_csv, {'sep': ','}, ['b'], [[('a', '>', 1)]])
+    assert kwargs == {'sep': ',', 'usecols': ['b', 'a']}
+    assert chunked
+
+    kwargs, chunked = pushdown_kwargs(read_csv, {'usecols': ['c']}, ['b'],
+                                      None)
+    assert kwargs == {'usecols': ['c']}  # Explicit arguments win
+    assert not chunked
+
+
+def test_parquet_arguments():
+    filters = [[('a', '>', 1)], [('b', 'in', ['w'])]]
+    kwargs, chunked = pushdown_kwargs(pd.read_parquet, {}, ['c'], filters)
+
+    assert kwargs == {'columns': ['c', 'a', 'b'],
+                      'filters': [[('a', '>', 1)], [('b', 'in', ['w'])]]}
+    assert not chunked
+
+
+@pytest.mark.parametrize('reader', [pd.read_feather, read_arrow])
+def test_arrow_arguments(reader):
+    assert pushdown_kwargs(reader, {}, ['c'], [[('a', '>', 1)]]) == \
+        ({'columns': ['c', 'a']}, False)
+
+
+@pytest.mark.parametrize('reader', [json.load, pd.read_json, None])
+def test_readers_without_pushdown(reader):
+    assert pushdown_kwargs(reader, {'x': 1}, ['c'], [[('a', '>', 1)]]) == \
+        ({'x': 1}, False)
+
+
+def test_filter_on_a_column_not_kept():
+    frame = apply_pushdown(_FRAME, ['b'], [[('a', '>=', 3)]])
+    assert frame.to_dict('list') == {'b': ['y', 'z']}
+
+
+def test_filter_groups():
+    frame = apply_pushdown(_FRAME, None, [[('a', '>', 1), ('a', '<', 4)],
+                                          [('b', 'in', ['w'])]])
+    assert frame['a'].tolist() == [1, 2, 3]
+    assert apply_pushdown(_FRAME, None, [[('b', 'not in', ['w', 'x'])]])[
+        'b'].tolist() == ['y', 'z']
+
+
+def test_non_tabular_data():
+    with pytest.raises(TypeError, match='tabular'):
+        apply_pushdown({'a': [1]}, ['a'], None)
+
+
+def test_withdraw_csv(bank):
+    frame = bank.withdraw('frame', columns=['b'], filters=[('a', '>', 2)])
+    assert frame.to_dict('list') == {'b': ['y', 'z']}
+    assert bank.withdraw('frame', columns=['c', 'a']).columns.tolist() == \
+        ['c', 'a']
+    assert bank.withdraw('frame', filters=[('b', '==', 'q')]).empty
+
+
+def test_withdraw_without_native_pushdown(bank):
+    frame = bank.withdraw('pickled', columns=['b'], filters=[('a', '<', 3)])
+    assert frame.to_dict('list') == {'b': ['w', 'x']}
+
+    with pytest.raises(TypeError, match='tabular'):
+        bank.withdraw('doc', columns=['a'])
+
+
+def test_withdraw_empty_csv(data_root):
+    with open(os.path.join(data_root, 'empty.csv'), 'w') as fileobj:
+        fileobj.write('a,b\n')
+    db = DataBank(index=False)
+
+    frame = db.withdraw('empty', filters=[('a', '>', 1)])
+    assert frame.empty and frame.columns.tolist() == ['a', 'b']
+    assert db.withdraw('empty', columns=['b'], filters=[('a', '>', 1)])[
+        'b'].tolist() == []
+
+
+def test_withdraw_parquet(data_root):
+    pytest.importorskip('pyarrow')
+    _FRAME.to_parquet(os.path.join(data_root, 'frame.parquet'),
+                      row_group_size=2)
+    db = DataBank(index=False)
+
+    frame = db.withdraw('frame', columns=['b'],
+                        filters=[[('a', '>', 3)], [('c', '<', 1)]])
+    assert frame.to_dict('list') == {'b': ['w', 'z']}
@@ -0,0 +1,46 @@
+"""Tests for the reader registry."""
+import pickle
+import weakref
+
+import numpy as np
+import pytest
+
+from fyda import readers
+from fyda.base import DataBank
+
+
+@pytest.fixture
+def fresh_registry(monkeypatch):
+    """Registry as in a new process, before anything used it."""
+
+    monkeypatch.setattr(readers, '_REGISTRY', {})
+    monkeypatch.setattr(readers, '_LOADED', False)
+    monkeypatch.setattr(readers, '_MODES', weakref.WeakKeyDictionary())
+
+
+def test_explicit_builtin_readers(data_root, fresh_registry):
+    with open(data_root + '/obj.pkl', 'wb') as fileobj:
+        pickle.dump({'x': [1, 2]}, fileobj)
+    np.save(data_root + '/arr.npy', np.arange(3))
+    db = DataBank(index=False, lazy=True)  # Picks no readers up front
+
+    assert db.withdraw('obj', reader=pickle.load) == {'x': [1, 2]}
+    assert db.withdraw('arr', reader=np.load).tolist() == [0, 1, 2]
+    assert readers.reader_mode(pickle.load) == 'binary'
+
+
+def test_builtin_modes_before_registry_use(fresh_registry):
+    assert readers.reader_mode(pickle.load) == 'binary'
+
+
+def test_declared_modes(fresh_registry):
+    def read(filename):
+        pass
+
+    def load(fh):
+        pass
+
+    assert readers.reader_mode(read) == 'path'
+    readers.set_reader_mode(read, 'text')
+    assert readers.reader_mode(read) == 'text'
+    assert readers.reader_mode(load) == 'handle'
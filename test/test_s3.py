@@ -0,0 +1,225 @@
+"""Tests for the pooled S3 clients."""
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from fyda import base, options
+from fyda import s3 as fyda_s3
+from fyda.s3 import clear_clients, get_client
+
+
+def test_clients_are_reused(s3):
+    assert get_client() is s3
+    assert get_client(profile=None, region=None) is s3
+    assert s3.list_objects_v2(Bucket='bucket')['KeyCount'] == 0
+
+
+def test_clients_per_settings(s3):
+    clients = [get_client(),
+               get_client(profile='other'),
+               get_client(region='eu-west-1'),
+               get_client(endpoint_url='http://localhost:9000')]
+
+    assert len({id(client) for client in clients}) == len(clients)
+    assert [get_client(),
+            get_client(profile='other'),
+            get_client(region='eu-west-1'),
+            get_client(endpoint_url='http://localhost:9000')] == clients
+    assert clients[2].meta.region_name == 'eu-west-1'
+    assert clients[3].meta.endpoint_url == 'http://localhost:9000'
+
+
+def test_clients_follow_options(s3, monkeypatch):
+    monkeypatch.setattr(fyda_s3.options, 'S3_REGION', 'eu-west-1')
+    client = get_client()
+
+    assert client is not s3
+    assert client is get_client(region='eu-west-1')
+
+
+def test_clients_are_rebuilt_after_fork(s3):
+    read, write = os.pipe()
+    pid = os.fork()
+
+    if pid == 0:  # Child: a fresh client, which works
+        try:
+            client = get_client()
+            ok = client is not s3 and client is get_client() and \
+                client.list_objects_v2(Bucket='bucket')['KeyCount'] == 0
+            os.write(write, b'1' if ok else b'0')
+        finally:
+            os._exit(0)
+
+    os.close(write)
+    with os.fdopen(read, 'rb') as fileobj:
+        result = fileobj.read()
+    os.waitpid(pid, 0)
+
+    assert result == b'1'
+    assert get_client() is s3
+
+
+def test_clear_clients(s3):
+    clear_clients()
+    client = get_client()
+
+    assert client is not s3
+    assert client is get_client()
+    assert client.list_objects_v2(Bucket='bucket')['KeyCount'] == 0
+
+
+def _spy_bodies(monkeypatch):
+    """Record the objects opened by load_s3."""
+
+    bodies = []
+    open_object = base.open_object
+
+    def spy(*args, **kwargs):
+        bodies.append(open_object(*args, **kwargs))
+        return bodies[-1]
+
+    monkeypatch.setattr(base, 'open_object', spy)
+
+    return bodies
+
+
+def test_streams_close_their_object(s3, monkeypatch):
+    monkeypatch.setattr(options, 'S3_PART_SIZE', 16)  # Ranged reads
+    s3.put_object(Bucket='bucket', Key='t.csv',
+                  Body=b'a,b\n' + b'1,2\n' * 20)
+    bodies = _spy_bodies(monkeypatch)
+
+    chunks = base.load_s3('t.csv', 'bucket', chunksize=8, client=s3)
+    assert sum(len(chunk) for chunk in chunks) == 20
+    assert len(bodies) == 1 and bodies[0].closed
+
+
+def test_failed_streams_close_their_object(s3, monkeypatch):
+    monkeypatch.setattr(options, 'S3_PART_SIZE', 16)
+    s3.put_object(Bucket='bucket', Key='t.csv', Body=b'a,b\n' * 20)
+    bodies = _spy_bodies(monkeypatch)
+
+    with pytest.raises(ValueError):
+        base.load_s3('t.csv', 'bucket', chunksize=8, client=s3,
+                     reader=pd.read_csv, usecols=['missing'])
+    assert len(bodies) == 1 and bodies[0].closed
+
+
+def _count_gets(client, monkeypatch):
+    """Record the keys of the GET requests made with ``client``."""
+
+    keys = []
+    get_object = client.get_object
+
+    def spy(**kwargs):
+        keys.append(kwargs['Key'])
+        return get_object(**kwargs)
+
+    monkeypatch.setattr(client, 'get_object', spy)
+
+    return keys
+
+
+def _read(path):
+    with open(path, 'rb') as fileobj:
+        return fileobj.read()
+
+
+def test_object_cache_hits(s3, tmp_path, monkeypatch):
+    s3.put_object(Bucket='bucket', Key='t.csv', Body=b'a\n1\n')
+    cache = fyda_s3.ObjectCache(str(tmp_path / 'cache'), 2 ** 20)
+    gets = _count_gets(s3, monkeypatch)
+
+    path = cache.fetch(s3, 'bucket', 't.csv')
+    assert path.endswith('.csv') and _read(path) == b'a\n1\n'
+    assert cache.fetch(s3, 'bucket', 't.csv') == path
+    assert gets == ['t.csv']
+    assert cache.info()[:4] == (1, 1, 1, 4)
+
+
+def test_object_cache_follows_etags(s3, tmp_path):
+    s3.put_object(Bucket='bucket', Key='t.csv', Body=b'a\n1\n')
+    cache = fyda_s3.ObjectCache(str(tmp_path / 'cache'), 2 ** 20)
+    old = cache.fetch(s3, 'bucket', 't.csv')
+
+    s3.put_object(Bucket='bucket', Key='t.csv', Body=b'a\n22\n')
+    new = cache.fetch(s3, 'bucket', 't.csv')
+
+    assert new != old and _read(new) == b'a\n22\n'
+    assert _read(old) == b'a\n1\n'  # Left for eviction, never served
+    assert cache.fetch(s3, 'bucket', 't.csv') == new
+    assert cache.info()[:2] == (1, 2)
+
+
+def test_object_cache_trusts_copies_for_ttl(s3, tmp_path):
+    s3.put_object(Bucket='bucket', Key='t.csv', Body=b'a\n1\n')
+    cache = fyda_s3.ObjectCache(str(tmp_path / 'cache'), 2 ** 20, ttl=60)
+    path = cache.fetch(s3, 'bucket', 't.csv')
+
+    s3.put_object(Bucket='bucket', Key='t.csv', Body=b'a\n22\n')
+    assert cache.fetch(s3, 'bucket', 't.csv') == path
+
+
+def test_object_cache_never_pairs_a_record_with_other_bytes(s3, tmp_path):
+    s3.put_object(Bucket='bucket', Key='t.csv', Body=b'a\n1\n')
+    cache = fyda_s3.ObjectCache(str(tmp_path / 'cache'), 2 ** 20, ttl=60)
+    cache.fetch(s3, 'bucket', 't.csv')
+
+    # Another process recorded a new version, but its copy isn't in place
+    s3.put_object(Bucket='bucket', Key='t.csv', Body=b'a\n22\n')
+    etag = s3.head_object(Bucket='bucket', Key='t.csv')['ETag']
+    fyda_s3._write_meta(cache._record('bucket', 't.csv'), {
+        'bucket': 'bucket', 'key': 't.csv', 'etag': etag,
+        'checked': time.time()})
+
+    assert _read(cache.fetch(s3, 'bucket', 't.csv')) == b'a\n22\n'
+
+
+def test_object_cache_evicts_least_recently_used(s3, tmp_path):
+    for name in 'abc':
+        s3.put_object(Bucket='bucket', Key=name + '.bin', Body=b'x' * 100)
+    cache = fyda_s3.ObjectCache(str(tmp_path / 'cache'), 250)
+
+    a = cache.fetch(s3, 'bucket', 'a.bin')
+    b = cache.fetch(s3, 'bucket', 'b.bin')
+    os.utime(b, ns=(1, 1))
+    os.utime(a, ns=(2, 2))
+    cache.fetch(s3, 'bucket', 'a.bin')  # Used again, so kept
+    c = cache.fetch(s3, 'bucket', 'c.bin')
+
+    assert os.path.exists(a) and os.path.exists(c)
+    assert not os.path.exists(b)
+    assert cache.info()[2:4] == (2, 200)
+
+    cache.clear()
+    assert cache.info()[:4] == (0, 0, 0, 0)
+
+
+def test_object_cache_skips_large_objects(s3, tmp_path, monkeypatch):
+    s3.put_object(Bucket='bucket', Key='t.csv', Body=b'a\n' + b'1\n' * 100)
+    cache = fyda_s3.ObjectCache(str(tmp_path / 'cache'), 100)
+
+    path, first_part = cache.locate(s3, 'bucket', 't.csv')
+    assert path is None and first_part[1] == 202
+    assert cache.info()[2] == 0
+
+    gets = _count_gets(s3, monkeypatch)
+    with fyda_s3.open_object(s3, 'bucket', 't.csv',
+                             first_part=first_part) as fileobj:
+        assert fileobj.read() == b'a\n' + b'1\n' * 100
+    assert gets == []
+
+
+def test_load_s3_requests_large_objects_once(data_root, s3, monkeypatch):
+    monkeypatch.setattr(options, 'S3_CACHE', True)
+    monkeypatch.setattr(options, 'S3_CACHE_BYTES', 100)
+    s3.put_object(Bucket='bucket', Key='t.csv', Body=b'a\n' + b'1\n' * 100)
+    gets = _count_gets(s3, monkeypatch)
+
+    assert len(base.load_s3('t.csv', 'bucket', client=s3)) == 100
+    assert len(gets) == 1
+    assert sum(len(chunk) for chunk in base.load_s3(
+        't.csv', 'bucket', client=s3, chunksize=30)) == 100
+    assert len(gets) == 2
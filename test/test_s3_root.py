@@ -0,0 +1,81 @@
+"""Tests for DataBanks with an S3 data root."""
+import os
+
+import pandas as pd
+
+from fyda.base import DataBank
+
+ROOT = 's3://bucket/data'
+
+
+def _put(client, *relpaths, content=b'a,b\n1,2\n'):
+    for relpath in relpaths:
+        client.put_object(Bucket='bucket', Key='data/' + relpath,
+                          Body=content)
+
+
+def _bank(**kwargs):
+    return DataBank(root=ROOT, index=False, **kwargs)
+
+
+def test_listing_is_paginated(data_root, s3):
+    names = ['many/f{:04d}.csv'.format(i) for i in range(1100)]
+    _put(s3, *names)
+    _put(s3, 'top.csv')
+
+    db = _bank()
+
+    assert len(db.shortcuts) == 1101
+    assert db.shortcuts['f1099'] == ROOT + '/many/f1099.csv'
+    assert len(db.tree['data']['many']) == 1100
+
+
+def test_same_shortcuts_and_tree_as_a_local_root(data_root, write, s3):
+    relpaths = ['t.csv', 'a/t.csv', 'a/b/t.csv', 'b/t.json', 'u.csv',
+                'a/b/c/v.txt', 'x.y.csv', 'x/y.csv']
+    write(*relpaths)
+    _put(s3, *relpaths)
+
+    local = DataBank(root=data_root, index=False)
+    remote = _bank()
+
+    assert remote.tree == local.tree
+    assert {k: os.path.relpath(v, data_root).replace(os.sep, '/')
+            for k, v in local.shortcuts.items()} == \
+        {k: v[len(ROOT) + 1:] for k, v in remote.shortcuts.items()}
+
+
+def test_refresh_follows_etags(data_root, s3):
+    _put(s3, 't.csv', 'gone.csv')
+    db = _bank(cache_bytes=2 ** 20)
+    etag = db._etag(ROOT + '/t.csv')
+    assert db.withdraw('t')['a'].tolist() == [1]
+
+    _put(s3, 't.csv', content=b'a,b\n3,4\n')
+    _put(s3, 'new.csv')
+    s3.delete_object(Bucket='bucket', Key='data/gone.csv')
+    assert db.withdraw('t')['a'].tolist() == [1]  # Cached until refreshed
+
+    assert db.refresh()
+    assert db._etag(ROOT + '/t.csv') not in (None, etag)
+    assert db.withdraw('t')['a'].tolist() == [3]
+    assert 'new' in db.shortcuts and 'gone' not in db.shortcuts
+
+    _put(s3, 't.csv', content=b'a,b\n5,6\n')
+    assert not db.refresh()  # Nothing added or removed
+    assert db.withdraw('t')['a'].tolist() == [5]
+
+
+def test_withdraw(data_root, s3):
+    frame = pd.DataFrame({'a': range(5), 'b': list('vwxyz')})
+    _put(s3, 'sub/frame.csv', content=frame.to_csv(index=False).encode())
+    _put(s3, 'sub/doc.json', content=b'{"x": 1}')
+
+    db = _bank()
+
+    pd.testing.assert_frame_equal(db.withdraw('frame'), frame)
+    pd.testing.assert_frame_equal(db.withdraw('sub/frame.csv'), frame)
+    assert db.withdraw('doc') == {'x': 1}
+    assert db.withdraw('frame', columns=['a'])['a'].tolist() == \
+        list(range(5))
+    assert sum(len(chunk) for chunk in db.withdraw('frame', chunksize=2)) == 5
@@ -0,0 +1,66 @@
+"""Tests for the column types learned for CSV files."""
+import os
+
+import pandas as pd
+
+from fyda import options
+from fyda.base import DataBank
+
+
+def _bank():
+    return DataBank(learn_schemas=True)
+
+
+def test_schema_is_applied(data_root, write):
+    write('t.csv', content='a,b\n' + ''.join('{},x\n'.format(i)
+                                             for i in range(1, 5)))
+    _bank().withdraw('t')
+
+    data = _bank().withdraw('t')
+    assert data['a'].dtype == 'int8'
+    assert data['b'].dtype == 'category'
+    assert os.path.exists(os.path.join(os.path.dirname(data_root),
+                                       options.SCHEMA_NAME))
+
+
+def test_schema_is_relearned_when_the_file_changes(data_root, write):
+    path, = write('t.csv', content='a\n1\n2\n3\n4\n')
+    assert _bank().withdraw('t')['a'].dtype == 'int8'
+
+    with open(path, 'a') as fileobj:
+        fileobj.write('300\n')
+
+    data = _bank().withdraw('t')
+    assert data['a'].tolist() == [1, 2, 3, 4, 300]
+    assert _bank().withdraw('t')['a'].tolist() == [1, 2, 3, 4, 300]
+
+
+def test_integers_are_not_narrowed_past_their_range(data_root, write):
+    path, = write('t.csv', content='a\n10\n20\n30\n40\n')
+    _bank().withdraw('t')
+    stat = os.stat(path)
+
+    # Same size and modification time, so the schema still applies
+    with open(path, 'w') as fileobj:
+        fileobj.write('a\n1\n2\n3\n40000\n')
+    assert os.path.getsize(path) == stat.st_size
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    assert _bank().withdraw('t')['a'].tolist() == [1, 2, 3, 40000]
+
+
+def test_dates_after_the_first_hundred_values(data_root, write):
+    content = 'd\n' + '2020-01-01\n' * 150 + 'unknown\n'
+    write('t.csv', content=content)
+
+    data = _bank().withdraw('t')
+    expected = DataBank().withdraw('t')
+    pd.testing.assert_frame_equal(data.astype(object), expected.astype(object))
+    pd.testing.assert_frame_equal(_bank().withdraw('t').astype(object),
+                                  expected.astype(object))
+
+
+def test_dates_are_parsed(data_root, write):
+    write('t.csv', content='d\n2020-01-01\n2020-01-02\n')
+    _bank().withdraw('t')
+    assert pd.api.types.is_datetime64_any_dtype(_bank().withdraw('t')['d'])
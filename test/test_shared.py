@@ -0,0 +1,57 @@
+"""Tests for the DataBanks shared by the module-level helpers."""
+import os
+
+import pytest
+import yaml
+
+import fyda
+from fyda import base
+from fyda.errorhandling import NoShortcutError
+
+
+def test_one_bank_per_root(data_root, write):
+    write('t.csv')
+    fyda.load('t')
+
+    assert base._shared_bank() is base._shared_bank()
+    assert base._shared_bank(data_root) is base._shared_bank()
+
+
+def test_nested_collisions_replace_shortcuts(data_root, write):
+    write('a/t.csv', content='a\n1\n')
+    write('b/c/other.csv')
+    assert fyda.load('t')['a'].tolist() == [1]
+
+    write('b/c/t.csv', content='a\n2\n')  # The root itself is unchanged
+    with pytest.raises(NoShortcutError):
+        fyda.load('t')
+    assert fyda.load('a/t.csv')['a'].tolist() == [1]
+    assert fyda.load('c/t.csv')['a'].tolist() == [2]
+
+    os.remove(os.path.join(data_root, 'b', 'c', 't.csv'))
+    assert fyda.load('t')['a'].tolist() == [1]
+
+
+def test_nested_files_are_found(data_root, write):
+    write('a/t.csv')
+    fyda.load('t')
+
+    path, = write('a/b/u.csv')
+    assert fyda.data_path('u') == path
+
+
+def test_config_changes_rebuild_the_bank(data_root, write, tmp_path):
+    write('t.csv')
+    db = base._shared_bank()
+
+    other = tmp_path / 'other'
+    other.mkdir()
+    (other / 'v.csv').write_text('a\n3\n')
+    config = tmp_path / '.fydarc'
+    config.write_text(yaml.safe_dump({'directories': {'root': str(other)},
+                                      'data': {}}))
+    stat = os.stat(str(config))
+    os.utime(str(config), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    assert base._shared_bank() is not db
+    assert fyda.load('v')['a'].tolist() == [3]
@@ -0,0 +1,151 @@
+"""Tests for shortcut assignment and collision handling."""
+import os
+import random
+
+import pytest
+
+from fyda.base import DataBank, _default_shortcut, _encode_shortcut
+
+
+# -----------------------------------------------------------------------------
+# Classes
+# -----------------------------------------------------------------------------
+class _Rebasing:
+    """The original shortcut assignment, depositing files one at a time and
+    raising a collision group one encoding level at a time until the newcomer
+    fits, kept as a reference for :meth:`DataBank.deposit_many`."""
+
+    def __init__(self):
+        self.data = {}
+        self.forbid = {}
+
+    def deposit(self, filepath):
+
+        shortcut, rebase = self.determine_shortcut(filepath)
+        while rebase:
+            self.rebase_shortcuts(filepath)
+            shortcut, rebase = self.determine_shortcut(filepath)
+
+        default = _default_shortcut(filepath)
+        if default in self.forbid:
+            users = self.forbid[default]['in_use'] + [shortcut]
+            level = self.forbid[default]['encode_level']
+        else:
+            users, level = [shortcut], 0
+
+        self.forbid[default] = {'encode_level': level, 'in_use': users}
+        self.data[shortcut] = filepath
+
+    def determine_shortcut(self, filepath):
+
+        default = _default_shortcut(filepath)
+        if default not in self.forbid:
+            return default, False
+
+        level = self.forbid[default]['encode_level']
+        shortcut = _encode_shortcut(filepath, level)
+        if shortcut not in self.forbid[default]['in_use']:
+            return shortcut, False
+
+        return default, True
+
+    def rebase_shortcuts(self, filepath):
+
+        default = _default_shortcut(filepath)
+        level = self.forbid[default]['encode_level']
+        users = self.forbid[default]['in_use']
+        shortcut = _encode_shortcut(filepath, level)
+        conflict = shortcut in users
+
+        while conflict:
+            level += 1
+            self.forbid[default]['encode_level'] = level
+            for user in users:
+                path = self.data.pop(user)
+                new = _encode_shortcut(path, level)
+                self.data[new] = path
+                users = list(set(users) - {user}) + [new]
+            conflict = shortcut in users
+
+        self.forbid[default]['in_use'] = users
+
+
+# -----------------------------------------------------------------------------
+# Module-level library
+# -----------------------------------------------------------------------------
+def _random_paths(root, rng, count):
+    """Absolute paths of ``count`` files with heavily colliding names."""
+
+    folders = ['a', 'b', 'c']
+    paths = set()
+
+    while len(paths) < count:
+        depth = rng.randint(0, 4)
+        parts = [rng.choice(folders) for _ in range(depth)]
+        name = rng.choice(['t', 'u', 'v']) + rng.choice(['.csv', '.json'])
+        paths.add(os.path.join(root, *(parts + [name])))
+
+    paths = sorted(paths)
+    rng.shuffle(paths)
+
+    return paths
+
+
+def _reference(paths):
+    """Shortcuts the original one-at-a-time assignment gives ``paths``."""
+
+    bank = _Rebasing()
+    for path in paths:
+        bank.deposit(path)
+
+    return bank.data
+
+
+# -----------------------------------------------------------------------------
+# Tests
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize('seed', range(20))
+def test_deposit_many_matches_rebasing(data_root, seed):
+    paths = _random_paths(data_root, random.Random(seed), 60)
+
+    db = DataBank(index=False)
+    db.deposit_many(paths, error='ignore')
+
+    assert db.shortcuts == _reference(paths)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_deposit_matches_rebasing(data_root, seed):
+    paths = _random_paths(data_root, random.Random(seed), 60)
+
+    db = DataBank(index=False)
+    for path in paths:
+        db.deposit(path, error='ignore')
+
+    assert db.shortcuts == _reference(paths)
+
+
+def test_deposit_many_in_batches(data_root):
+    paths = _random_paths(data_root, random.Random(0), 60)
+
+    db = DataBank(index=False)
+    for i in range(0, len(paths), 7):
+        db.deposit_many(paths[i:i + 7], error='ignore')
+
+    assert db.shortcuts == _reference(paths)
+
+
+def test_scan_shortcuts(data_root, write):
+    write('t.csv', 'a/t.csv', 'a/b/t.csv', 'c/b/t.json', 'u.txt')
+
+    assert sorted(DataBank(index=False).shortcuts) == \
+        ['a/t.csv', 'b/t.csv', 'b/t.json', 'data/t.csv', 'u']
+
+
+def test_forget_rebases_down(data_root, write):
+    a, b = write('x/t.csv', 'y/t.csv')
+    db = DataBank(index=False)
+
+    db._forget(b)
+
+    assert db.shortcuts == {'t': a}
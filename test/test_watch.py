@@ -0,0 +1,102 @@
+"""Tests for keeping a DataBank in step with its root while watching."""
+import os
+import shutil
+import time
+
+import pytest
+
+from fyda import watch
+from fyda.base import DataBank
+
+
+def _wait_for(condition, timeout=5):
+    """Wait until ``condition()`` is true, returning whether it became so."""
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+@pytest.fixture(params=['poll', 'inotify'])
+def watched(request, data_root, write):
+    """Bank over the data root watched by each backend, with a file
+    ``a.csv`` in it."""
+
+    write('a.csv')
+    db = DataBank(index=False)
+
+    try:
+        db.watch(interval=0.05, backend=request.param)
+    except OSError:
+        pytest.skip('inotify is not available')
+
+    yield db
+
+    db.unwatch()
+
+
+def test_backends(watched, request):
+    backend = request.node.callspec.params['watched']
+    kind = watch.PollingWatcher if backend == 'poll' else \
+        watch.InotifyWatcher
+    assert isinstance(watched._watcher, kind)
+
+
+def test_created_files(watched, write):
+    write('b.csv', 'new/deeper/c.csv')
+    assert _wait_for(lambda: {'b', 'c'} <= set(watched.shortcuts))
+    assert watched.shortcuts['c'].endswith(
+        os.path.join('new', 'deeper', 'c.csv'))
+    assert watched.withdraw('c')['a'].tolist() == [1]
+
+
+def test_many_files_at_once(watched, write):
+    names = ['bulk/f{}.csv'.format(i) for i in range(50)]
+    write(*names)
+    assert _wait_for(lambda: all('f{}'.format(i) in watched.shortcuts
+                                 for i in range(50)))
+
+
+def test_deleted_files(watched, write, data_root):
+    write('sub/b.csv', 'sub/c.csv')
+    assert _wait_for(lambda: 'c' in watched.shortcuts)
+
+    os.remove(os.path.join(data_root, 'a.csv'))
+    shutil.rmtree(os.path.join(data_root, 'sub'))
+    assert _wait_for(lambda: not watched.shortcuts)
+
+
+def test_moved_files(watched, data_root):
+    os.makedirs(os.path.join(data_root, 'sub'))
+    os.rename(os.path.join(data_root, 'a.csv'),
+              os.path.join(data_root, 'sub', 'b.csv'))
+    assert _wait_for(lambda: set(watched.shortcuts) == {'b'})
+
+    os.rename(os.path.join(data_root, 'sub'),
+              os.path.join(data_root, 'moved'))
+    assert _wait_for(lambda: watched.shortcuts.get('b') == os.path.join(
+        data_root, 'moved', 'b.csv'))
+
+
+def test_collisions_are_rebased(watched, write, data_root):
+    write('sub/a.csv')
+    assert _wait_for(lambda: 'a' not in watched.shortcuts and
+                     len(watched.shortcuts) == 2)
+    expected = DataBank(index=False).shortcuts
+    assert watched.shortcuts == expected
+
+    os.remove(os.path.join(data_root, 'sub', 'a.csv'))
+    assert _wait_for(lambda: set(watched.shortcuts) == {'a'})
+
+
+def test_unwatch(watched, write):
+    watched.unwatch()
+    assert watched._watcher is None
+
+    write('b.csv')
+    time.sleep(0.3)
+    assert 'b' not in watched._data
+    assert watched.refresh() and 'b' in watched.shortcuts